@@ -55,6 +55,9 @@ class AgentJinjaTemplater(object):
              'haproxy_cmd': CONF.haproxy_amphora.haproxy_cmd,
              'heartbeat_interval': CONF.health_manager.heartbeat_interval,
              'heartbeat_key': CONF.health_manager.heartbeat_key,
+             'heartbeat_version': CONF.health_manager.heartbeat_version,
+             'heartbeat_snapshot_interval':
+                 CONF.health_manager.heartbeat_snapshot_interval,
              'use_upstart': CONF.haproxy_amphora.use_upstart,
              'respawn_count': CONF.haproxy_amphora.respawn_count,
              'respawn_interval': CONF.haproxy_amphora.respawn_interval})
@@ -91,10 +91,165 @@ def get_haproxy_config(listener_id):
 
 
 def upload_haproxy_config(amphora_id, listener_id):
+    # A conditional upload of the config the listener already runs with
+    # changes nothing, so haproxy does not need to be reloaded
+    etag = flask.request.headers.get('If-None-Match')
+    if etag:
+        md5 = _running_config_md5(listener_id)
+        if etag.strip('"') == md5:
+            res = flask.make_response('', 304)
+            res.headers['ETag'] = md5
+            return res
+
     stream = Wrapped(flask.request.stream)
+    peer_name = _peer_name(amphora_id)
+    name = _write_haproxy_config(listener_id, stream)
+
+    error = _check_haproxy_config(name, peer_name)
+    if error:
+        os.remove(name)  # delete file
+        return error
+
+    # file ok - move it
+    os.rename(name, util.config_path(listener_id))
+
+    error = _install_init_script(listener_id, peer_name)
+    if error:
+        return error
+
+    res = flask.make_response(flask.jsonify({
+        'message': 'OK'}), 202)
+    res.headers['ETag'] = stream.get_md5()
+    return res
+
+
+"""Upload the haproxy configs of several listeners and apply them
+
+Each file of the multipart request is the haproxy config of the listener
+named by the file field. The listeners that already run with their config
+are left alone. Every other config is checked before any of them is
+installed, then each listener is reloaded, or started if it is not running.
+
+:param amphora_id: The id of the amphora to update
+"""
+
+
+def upload_haproxy_configs(amphora_id):
+    files = flask.request.files
+    if not files:
+        return flask.make_response(flask.jsonify(dict(
+            message='Invalid request',
+            details='No listener configuration uploaded')), 400)
+    listener_ids = list(files.keys())
+    for listener_id in listener_ids:
+        if not re.match(r'^[\w-]+$', listener_id):
+            return flask.make_response(flask.jsonify(dict(
+                message='Invalid request',
+                details='Invalid listener id: {0}'.format(listener_id))),
+                400)
+
+    peer_name = _peer_name(amphora_id)
+    md5sums = {}
+    names = {}
+    for listener_id in listener_ids:
+        stream = Wrapped(files[listener_id].stream)
+        name = _write_haproxy_config(listener_id, stream)
+        md5sums[listener_id] = stream.get_md5()
+        if md5sums[listener_id] == _running_config_md5(listener_id):
+            os.remove(name)
+        else:
+            names[listener_id] = name
+
+    listener_ids = [l_id for l_id in listener_ids if l_id in names]
+    for listener_id in listener_ids:
+        error = _check_haproxy_config(names[listener_id], peer_name)
+        if error:
+            for name in names.values():
+                os.remove(name)
+            return error
+
+    # The init scripts are installed first so a failure leaves every
+    # running config as it was
+    for listener_id in listener_ids:
+        error = _install_init_script(listener_id, peer_name)
+        if error:
+            for name in names.values():
+                os.remove(name)
+            return error
+
+    for listener_id in listener_ids:
+        os.rename(names[listener_id], util.config_path(listener_id))
+
+    if listener_ids and os.path.exists(util.keepalived_check_script_path()):
+        vrrp_check_script_update(listener_ids[0], 'start')
+    for listener_id in listener_ids:
+        if _check_listener_status(listener_id) == consts.ACTIVE:
+            action = 'reload'
+        else:
+            action = 'start'
+        error = _haproxy_service(listener_id, action)
+        if error:
+            return error
+
+    return flask.make_response(flask.jsonify(dict(
+        message='OK', listeners=md5sums)), 202)
+
+
+def _running_config_md5(listener_id):
+    """Gets the md5 of the config of a listener, if haproxy runs with it
+
+    Installing a config does not apply it, so the md5 is only trusted when
+    the last successful start or reload recorded it, and the installed
+    config and certificates haproxy would be restarted with are still the
+    ones that were recorded. The certificates are part of the record as a
+    renewed certificate keeps its file name and leaves the config as is.
+    """
+    if (not os.path.exists(util.applied_config_md5_path(listener_id)) or
+            _check_listener_status(listener_id) != consts.ACTIVE):
+        return None
+    with open(util.applied_config_md5_path(listener_id), 'r') as file:
+        applied = file.read().strip()
+    if applied != _applied_state(listener_id):
+        return None
+    return applied.split()[0]
+
+
+def _applied_state(listener_id):
+    """Gets the md5 of the config and of the certificates of a listener"""
+    with open(util.config_path(listener_id), 'r') as file:
+        config_md5 = hashlib.md5(six.b(file.read())).hexdigest()
+    certificates = hashlib.md5()
+    for filename, md5 in sorted(
+            six.iteritems(_certificates_manifest(listener_id))):
+        certificates.update(six.b('{0} {1}\n'.format(filename, md5)))
+    return '{0} {1}'.format(config_md5, certificates.hexdigest())
+
+
+def _record_applied_config(listener_id):
+    """Records the config and certificates haproxy was (re)started with"""
+    name = util.applied_config_md5_path(listener_id)
+    try:
+        state = _applied_state(listener_id)
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+        # mode 00600
+        mode = stat.S_IRUSR | stat.S_IWUSR
+        with os.fdopen(os.open(name + '.new', flags, mode), 'w') as file:
+            file.write(state)
+        os.rename(name + '.new', name)
+    except (IOError, OSError) as e:
+        # Without a record the next upload of the config is applied again
+        LOG.warning("Failed to record the applied haproxy config of "
+                    "%(listener_id)s: %(err)s",
+                    {'listener_id': listener_id, 'err': e})
+
+
+def _peer_name(amphora_id):
     # We have to hash here because HAProxy has a string length limitation
     # in the configuration file "peer <peername>" lines
-    peer_name = octavia_utils.base64_sha1_string(amphora_id).rstrip('=')
+    return octavia_utils.base64_sha1_string(amphora_id).rstrip('=')
+
+
+def _write_haproxy_config(listener_id, stream):
     if not os.path.exists(util.haproxy_dir(listener_id)):
         os.makedirs(util.haproxy_dir(listener_id))
 
@@ -107,7 +262,10 @@ def upload_haproxy_config(amphora_id, listener_id):
         while (b):
             file.write(b)
             b = stream.read(BUFFER)
+    return name
 
+
+def _check_haproxy_config(name, peer_name):
     # use haproxy to check the config
     cmd = "haproxy -c -L {peer} -f {config_file}".format(config_file=name,
                                                          peer=peer_name)
@@ -116,16 +274,15 @@ def upload_haproxy_config(amphora_id, listener_id):
         subprocess.check_output(cmd.split(), stderr=subprocess.STDOUT)
     except subprocess.CalledProcessError as e:
         LOG.debug("Failed to verify haproxy file: %s", e)
-        os.remove(name)  # delete file
         return flask.make_response(flask.jsonify(dict(
             message="Invalid request",
             details=e.output)), 400)
 
-    # file ok - move it
-    os.rename(name, util.config_path(listener_id))
 
+def _install_init_script(listener_id, peer_name):
     use_upstart = util.CONF.haproxy_amphora.use_upstart
     file = util.init_path(listener_id)
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
     # mode 00755
     mode = (stat.S_IRWXU | stat.S_IRGRP | stat.S_IXGRP |
             stat.S_IROTH | stat.S_IXOTH)
@@ -155,10 +312,23 @@ def upload_haproxy_config(amphora_id, listener_id):
                 message="Error making file {0} executable".format(file),
                 details=e.output)), 500)
 
-    res = flask.make_response(flask.jsonify({
-        'message': 'OK'}), 202)
-    res.headers['ETag'] = stream.get_md5()
-    return res
+
+def _haproxy_service(listener_id, action):
+    cmd = ("/usr/sbin/service haproxy-{listener_id} {action}".format(
+        listener_id=listener_id, action=action))
+
+    try:
+        subprocess.check_output(cmd.split(), stderr=subprocess.STDOUT)
+    except subprocess.CalledProcessError as e:
+        if 'Job is already running' not in e.output:
+            LOG.debug("Failed to %(action)s HAProxy service: %(err)s",
+                      {'action': action, 'err': e})
+            return flask.make_response(flask.jsonify(dict(
+                message="Error {0}ing haproxy".format(action),
+                details=e.output)), 500)
+    else:
+        if action in ['start', 'reload']:
+            _record_applied_config(listener_id)
 
 
 def start_stop_listener(listener_id, action):
@@ -176,18 +346,9 @@ def start_stop_listener(listener_id, action):
     if os.path.exists(util.keepalived_check_script_path()):
         vrrp_check_script_update(listener_id, action)
 
-    cmd = ("/usr/sbin/service haproxy-{listener_id} {action}".format(
-        listener_id=listener_id, action=action))
-
-    try:
-        subprocess.check_output(cmd.split(), stderr=subprocess.STDOUT)
-    except subprocess.CalledProcessError as e:
-        if 'Job is already running' not in e.output:
-            LOG.debug("Failed to %(action)s HAProxy service: %(err)s",
-                      {'action': action, 'err': e})
-            return flask.make_response(flask.jsonify(dict(
-                message="Error {0}ing haproxy".format(action),
-                details=e.output)), 500)
+    error = _haproxy_service(listener_id, action)
+    if error:
+        return error
     if action in ['stop', 'reload']:
         return flask.make_response(flask.jsonify(
             dict(message='OK',
@@ -364,6 +525,63 @@ def delete_certificate(listener_id, filename):
     return flask.jsonify(dict(message='OK'))
 
 
+def get_certificates_md5(listener_id):
+    """Gets the MD5 sum of every certificate of a listener"""
+    return flask.jsonify(dict(
+        certificates=_certificates_manifest(listener_id)))
+
+
+def _certificates_manifest(listener_id):
+    manifest = {}
+    if os.path.exists(_cert_dir(listener_id)):
+        for filename in os.listdir(_cert_dir(listener_id)):
+            if not filename.endswith('.pem'):
+                continue
+            with open(_cert_file_path(listener_id, filename), 'r') as file:
+                manifest[filename] = hashlib.md5(
+                    six.b(file.read())).hexdigest()
+    return manifest
+
+
+def update_certificates(listener_id):
+    """Uploads and deletes certificates of a listener in one request
+
+    Each file of the multipart request is a certificate to write, named by
+    the file field, and the delete form field lists the certificates to
+    remove. Certificates that do not exist are ignored on delete.
+    """
+    files = flask.request.files
+    deletes = flask.request.form.getlist('delete')
+    for filename in list(files.keys()) + deletes:
+        _check_ssl_filename_format(filename)
+        if os.path.basename(filename) != filename:
+            return flask.make_response(flask.jsonify(dict(
+                message='Filename has wrong format')), 400)
+
+    if files and not os.path.exists(_cert_dir(listener_id)):
+        os.makedirs(_cert_dir(listener_id))
+
+    md5sums = {}
+    # mode 00600
+    flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+    mode = stat.S_IRUSR | stat.S_IWUSR
+    for filename in files:
+        stream = Wrapped(files[filename].stream)
+        path = _cert_file_path(listener_id, filename)
+        with os.fdopen(os.open(path, flags, mode), 'w') as crt_file:
+            b = stream.read(BUFFER)
+            while (b):
+                crt_file.write(b)
+                b = stream.read(BUFFER)
+        md5sums[filename] = stream.get_md5()
+
+    for filename in deletes:
+        if os.path.exists(_cert_file_path(listener_id, filename)):
+            os.remove(_cert_file_path(listener_id, filename))
+
+    return flask.jsonify(dict(message='OK', certificates=md5sums))
+
+
 def _check_listener_status(listener_id):
     if os.path.exists(util.pid_path(listener_id)):
         if os.path.exists(
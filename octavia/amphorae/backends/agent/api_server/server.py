@@ -47,6 +47,12 @@ def upload_haproxy_config(amphora_id, listener_id):
     return listener.upload_haproxy_config(amphora_id, listener_id)
 
 
+@app.route('/' + api_server.VERSION + '/haproxy/<amphora_id>',
+           methods=['PUT'])
+def upload_haproxy_configs(amphora_id):
+    return listener.upload_haproxy_configs(amphora_id)
+
+
 @app.route('/' + api_server.VERSION + '/listeners/<listener_id>/haproxy',
            methods=['GET'])
 def get_haproxy_config(listener_id):
@@ -108,6 +114,18 @@ def delete_certificate(listener_id, filename):
     return listener.delete_certificate(listener_id, filename)
 
 
+@app.route('/' + api_server.VERSION + '/certificates/<listener_id>',
+           methods=['GET'])
+def get_certificates_md5(listener_id):
+    return listener.get_certificates_md5(listener_id)
+
+
+@app.route('/' + api_server.VERSION + '/certificates/<listener_id>',
+           methods=['PUT'])
+def update_certificates(listener_id):
+    return listener.update_certificates(listener_id)
+
+
 @app.route('/' + api_server.VERSION + '/plug/vip/<vip>', methods=['POST'])
 def plug_vip(vip):
     # Catch any issues with the subnet info json
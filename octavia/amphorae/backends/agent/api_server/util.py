@@ -45,6 +45,10 @@ def config_path(listener_id):
     return os.path.join(haproxy_dir(listener_id), 'haproxy.cfg')
 
 
+def applied_config_md5_path(listener_id):
+    return os.path.join(haproxy_dir(listener_id), 'haproxy.cfg.md5')
+
+
 def get_haproxy_pid(listener_id):
     with open(pid_path(listener_id), 'r') as f:
         return f.readline().rstrip()
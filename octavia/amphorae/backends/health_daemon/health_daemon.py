@@ -23,7 +23,9 @@ import six
 
 from octavia.amphorae.backends.agent.api_server import util
 from octavia.amphorae.backends.health_daemon import health_sender
+from octavia.amphorae.backends.health_daemon import status_message
 from octavia.amphorae.backends.utils import haproxy_query
+from octavia.common import constants
 from octavia.i18n import _LI
 
 if six.PY2:
@@ -50,12 +52,94 @@ def list_sock_stat_files(hadir=None):
     return stat_sock_files
 
 
+class DeltaBuilder(object):
+    """Replaces the full status messages with deltas between snapshots
+
+    A full snapshot is sent every ``interval`` messages, or sooner when a
+    controller asks for one. The messages in between keep all of the
+    listeners, their stats and the pool statuses, but only the members
+    whose status changed since the last snapshot, including those that
+    changed back to their snapshot status. Members that are DOWN are
+    always kept, as the health manager derives the pool and load balancer
+    statuses from them.
+
+    Deltas are relative to the snapshot, not to the previous message, so a
+    lost delta loses nothing and the deltas can be spread across the
+    controllers.
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self.snapshot = None
+        self.count = 0
+        self.snapshot_requested = False
+        # The (pool_id, member_id) of the members whose status changed
+        # since the snapshot. A member that changes back keeps being sent
+        # so that the health manager does not keep the intermediate status
+        self.changed = set()
+
+    def request_snapshot(self):
+        self.snapshot_requested = True
+
+    def build(self, msg):
+        """Return the message to send for a full status message
+
+        :param msg: A full status message, see build_stats_message
+        :returns: msg when it is due as a snapshot, else its delta
+        """
+        if (self.snapshot is None or self.snapshot_requested or
+                self.count >= self.interval):
+            self.snapshot = msg
+            self.count = 1
+            self.snapshot_requested = False
+            self.changed = set()
+            return msg
+        self.count += 1
+        delta = {'id': msg['id'], 'seq': msg['seq'],
+                 status_message.DELTA_KEY: self.snapshot['seq'],
+                 'listeners': {}}
+        snapshot_listeners = self.snapshot['listeners']
+        for listener_id, listener in six.iteritems(msg['listeners']):
+            snapshot_pools = snapshot_listeners.get(
+                listener_id, {}).get('pools', {})
+            pools = {}
+            for pool_id, pool in six.iteritems(listener['pools']):
+                snapshot_members = snapshot_pools.get(
+                    pool_id, {}).get('members', {})
+                members = {}
+                for member_id, status in six.iteritems(pool['members']):
+                    if snapshot_members.get(member_id) != status:
+                        self.changed.add((pool_id, member_id))
+                    elif (status != constants.DOWN and
+                          (pool_id, member_id) not in self.changed):
+                        continue
+                    members[member_id] = status
+                pools[pool_id] = {'status': pool['status'],
+                                  'members': members}
+            delta['listeners'][listener_id] = {'status': listener['status'],
+                                               'stats': listener['stats'],
+                                               'pools': pools}
+        return delta
+
+
 def run_sender(cmd_queue):
     LOG.info(_LI('Health Manager Sender starting.'))
     sender = health_sender.UDPStatusSender()
+    delta_builder = None
+    if CONF.health_manager.heartbeat_snapshot_interval > 0:
+        delta_builder = DeltaBuilder(
+            CONF.health_manager.heartbeat_snapshot_interval)
     while True:
         message = build_stats_message()
-        sender.dosend(message)
+        if delta_builder is None:
+            sender.dosend(message)
+        else:
+            if sender.snapshot_requested():
+                delta_builder.request_snapshot()
+            message = delta_builder.build(message)
+            # Every controller needs the snapshots the deltas refer to
+            sender.dosend(
+                message,
+                to_all=status_message.DELTA_KEY not in message)
         try:
             cmd = cmd_queue.get_nowait()
             if cmd is 'reload':
@@ -12,17 +12,23 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import select
 import socket
 
 from oslo_config import cfg
 from oslo_log import log as logging
 
 from octavia.amphorae.backends.health_daemon import status_message
+from octavia.common import exceptions
 from octavia.i18n import _LE
 
 CONF = cfg.CONF
+CONF.import_group('amphora_agent', 'octavia.common.config')
 CONF.import_group('health_manager', 'octavia.common.config')
 LOG = logging.getLogger(__name__)
+UDP_MAX_SIZE = 64 * 1024
+# Upper bound of the replies read from the controllers per heartbeat
+MAX_REPLIES = 16
 
 
 def round_robin_addr(addrinfo_list):
@@ -51,24 +57,62 @@ class UDPStatusSender(object):
             self.dests.append(addr)  # Just grab the first match
             break
 
-    def dosend(self, obj):
-        envelope_str = status_message.wrap_envelope(obj, self.key)
-        addrinfo = round_robin_addr(self.dests)
+    def dosend(self, obj, to_all=False):
+        """Send a heartbeat to the next controller, or to all of them
+
+        :param obj: The heartbeat message
+        :param to_all: Send the heartbeat to every controller instead of
+                       the next one in the round robin
+        """
+        envelope_str = status_message.wrap_envelope(
+            obj, self.key, CONF.health_manager.heartbeat_version)
+        if to_all:
+            addrinfos = list(self.dests)
+        else:
+            addrinfos = [round_robin_addr(self.dests)]
         # dest = (family, socktype, proto, canonname, sockaddr)
         # e.g. 0 = sock family, 4 = sockaddr - what we actually need
-        if addrinfo is None:
+        if not addrinfos or addrinfos[0] is None:
             LOG.error(_LE('No controller address found. '
                           'Unable to send heartbeat.'))
             return
-        try:
-            if addrinfo[0] == socket.AF_INET:
-                self.v4sock.sendto(envelope_str, addrinfo[4])
-            elif addrinfo[0] == socket.AF_INET6:
-                self.v6sock.sendto(envelope_str, addrinfo[4])
-        except socket.error:
-            # Pass here as on amp boot it will get one or more
-            # error: [Errno 101] Network is unreachable
-            # while the networks are coming up
-            # No harm in trying to send as it will still failover
-            # if the message isn't received
-            pass
+        for addrinfo in addrinfos:
+            try:
+                if addrinfo[0] == socket.AF_INET:
+                    self.v4sock.sendto(envelope_str, addrinfo[4])
+                elif addrinfo[0] == socket.AF_INET6:
+                    self.v6sock.sendto(envelope_str, addrinfo[4])
+            except socket.error:
+                # Pass here as on amp boot it will get one or more
+                # error: [Errno 101] Network is unreachable
+                # while the networks are coming up
+                # No harm in trying to send as it will still failover
+                # if the message isn't received
+                pass
+
+    def snapshot_requested(self):
+        """Check whether a controller asked for a full status snapshot
+
+        The health manager replies to a heartbeat with a snapshot request
+        when it missed the snapshot a delta heartbeat refers to. Replies
+        that fail the HMAC check are dropped.
+
+        :returns: True if a snapshot request for this amphora was received
+        """
+        requested = False
+        socks = [self.v4sock, self.v6sock]
+        for i in range(MAX_REPLIES):
+            readable = select.select(socks, [], [], 0)[0]
+            if not readable:
+                break
+            for sock in readable:
+                try:
+                    data = sock.recvfrom(UDP_MAX_SIZE)[0]
+                    obj = status_message.unwrap_envelope(data, self.key)
+                except (socket.error, exceptions.InvalidHMACException,
+                        exceptions.InvalidHeartbeatVersion):
+                    continue
+                if (obj.get('request') == status_message.SNAPSHOT_REQUEST and
+                        obj.get('id') == CONF.amphora_agent.amphora_id):
+                    requested = True
+        return requested
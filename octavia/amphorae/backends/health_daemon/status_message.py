@@ -16,11 +16,14 @@ import binascii
 import hashlib
 import hmac
 import json
+import re
 import zlib
 
 from oslo_log import log as logging
 from oslo_utils import secretutils
+import six
 
+from octavia.common import constants
 from octavia.common import exceptions
 from octavia.i18n import _LW
 
@@ -29,25 +32,219 @@ LOG = logging.getLogger(__name__)
 hash_algo = hashlib.sha256
 hash_len = 32
 
+# Version 0 is zlib compressed JSON. Version 1 is a compact binary format
+# that starts with BINARY_MAGIC, which a zlib stream never starts with.
+JSON_VERSION = 0
+BINARY_VERSION = 1
+BINARY_MAGIC = b'\xfe'
+
+STATUS_LITERAL = 0
+STATUS_NAMES = {1: constants.OPEN, 2: constants.FULL, 3: constants.UP,
+                4: constants.DOWN, 5: constants.NO_CHECK}
+# Status codes as the two hex digits of their byte
+STATUS_CODES = dict((status, '%02x' % code) for code, status in
+                    six.iteritems(STATUS_NAMES))
+STATUS_HEX_NAMES = dict((code, status) for status, code in
+                        six.iteritems(STATUS_CODES))
+UUID_RE = re.compile('^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-'
+                     '[0-9a-f]{12}$')
+STATS_ORDER = ('rx', 'tx', 'conns', 'totconns')
+STATS_KEYS = set(STATS_ORDER)
+LISTENER_KEYS = set(('status', 'stats', 'pools'))
+POOL_KEYS = set(('status', 'members'))
+
+# A delta heartbeat holds the seq of the full snapshot it is relative to
+# under this key. Full snapshots do not have it.
+DELTA_KEY = 'delta'
+# Sent back to an amphora by the health manager to ask for a full snapshot
+SNAPSHOT_REQUEST = 'snapshot'
+
 
 def to_hex(byte_array):
     return binascii.hexlify(byte_array).decode()
 
 
-def encode_obj(obj):
+def encode_obj(obj, version=JSON_VERSION):
+    if version == BINARY_VERSION:
+        try:
+            return encode_binary_obj(obj)
+        except (AttributeError, KeyError, TypeError, ValueError):
+            LOG.debug('Unable to encode the heartbeat in the binary format, '
+                      'falling back to JSON')
     json_bytes = json.dumps(obj).encode('utf-8')
     binary_array = zlib.compress(json_bytes, 9)
     return binary_array
 
 
 def decode_obj(binary_array):
+    if binary_array[:1] == BINARY_MAGIC:
+        return decode_binary_obj(binary_array)
     json_str = zlib.decompress(binary_array).decode('utf-8')
     obj = json.loads(json_str)
     return obj
 
 
-def wrap_envelope(obj, key):
-    payload = encode_obj(obj)
+# The binary format is built and parsed as a hex string, so that packing
+# and unpacking the whole message is a single hexlify/unhexlify call.
+
+def _hex_varint(value):
+    if 0 <= value < 0x80:
+        return '%02x' % value
+    if value < 0:
+        raise ValueError('Negative values can not be encoded')
+    out = []
+    while value >= 0x80:
+        out.append('%02x' % (value & 0x7f | 0x80))
+        value >>= 7
+    out.append('%02x' % value)
+    return ''.join(out)
+
+
+def _hex_uuid(value):
+    # Only ids that survive the round trip unchanged can be packed
+    if not UUID_RE.match(value):
+        raise ValueError('%s is not a canonical UUID' % value)
+    return value.replace('-', '')
+
+
+def _hex_bytes(value):
+    return _hex_varint(len(value)) + to_hex(value)
+
+
+def _hex_status(status):
+    code = STATUS_CODES.get(status)
+    if code is None:
+        return '%02x' % STATUS_LITERAL + _hex_bytes(status.encode('utf-8'))
+    return code
+
+
+def _check_keys(obj, keys):
+    if set(obj) != keys:
+        raise ValueError('Unexpected keys %s' % sorted(obj))
+
+
+def encode_binary_obj(obj):
+    """Encode a heartbeat in the compact binary format
+
+    UUIDs are packed as 16 raw bytes, statuses as one byte and counters as
+    varints. Top level keys other than id, seq and listeners are carried
+    along as JSON.
+
+    :raises ValueError: obj can not be represented in the binary format
+    """
+    out = [to_hex(BINARY_MAGIC), '%02x' % BINARY_VERSION,
+           _hex_uuid(obj['id']), _hex_varint(obj['seq']),
+           _hex_varint(len(obj['listeners']))]
+    for listener_id, listener in six.iteritems(obj['listeners']):
+        _check_keys(listener, LISTENER_KEYS)
+        _check_keys(listener['stats'], STATS_KEYS)
+        out.append(_hex_uuid(listener_id))
+        out.append(_hex_status(listener['status']))
+        for key in STATS_ORDER:
+            out.append(_hex_varint(listener['stats'][key]))
+        out.append(_hex_varint(len(listener['pools'])))
+        for pool_id, pool in six.iteritems(listener['pools']):
+            _check_keys(pool, POOL_KEYS)
+            out.append(_hex_uuid(pool_id))
+            out.append(_hex_status(pool['status']))
+            out.append(_hex_varint(len(pool['members'])))
+            for member_id, status in six.iteritems(pool['members']):
+                out.append(_hex_uuid(member_id))
+                out.append(_hex_status(status))
+    extras = dict((key, value) for key, value in six.iteritems(obj)
+                  if key not in ('id', 'seq', 'listeners'))
+    out.append(_hex_bytes(json.dumps(extras).encode('utf-8')
+                          if extras else b''))
+    return binascii.unhexlify(''.join(out))
+
+
+class _BinaryReader(object):
+    def __init__(self, data):
+        self.hex = to_hex(data)
+        # Offset in hex digits, two per byte
+        self.pos = 0
+
+    def read_byte(self):
+        if self.pos + 2 > len(self.hex):
+            raise ValueError('Truncated heartbeat message')
+        value = int(self.hex[self.pos:self.pos + 2], 16)
+        self.pos += 2
+        return value
+
+    def read_bytes(self, length):
+        end = self.pos + 2 * length
+        if end > len(self.hex):
+            raise ValueError('Truncated heartbeat message')
+        value = binascii.unhexlify(self.hex[self.pos:end])
+        self.pos = end
+        return value
+
+    def read_varint(self):
+        value = 0
+        shift = 0
+        while True:
+            byte = self.read_byte()
+            value |= (byte & 0x7f) << shift
+            if not byte & 0x80:
+                return value
+            shift += 7
+
+    def read_uuid(self):
+        pos = self.pos
+        h = self.hex
+        if pos + 32 > len(h):
+            raise ValueError('Truncated heartbeat message')
+        self.pos = pos + 32
+        return '%s-%s-%s-%s-%s' % (h[pos:pos + 8], h[pos + 8:pos + 12],
+                                   h[pos + 12:pos + 16], h[pos + 16:pos + 20],
+                                   h[pos + 20:pos + 32])
+
+    def read_status(self):
+        code = self.read_byte()
+        if code == STATUS_LITERAL:
+            return self.read_bytes(self.read_varint()).decode('utf-8')
+        return STATUS_NAMES[code]
+
+
+def decode_binary_obj(binary_array):
+    reader = _BinaryReader(binary_array)
+    reader.read_byte()  # BINARY_MAGIC
+    version = reader.read_byte()
+    if version != BINARY_VERSION:
+        LOG.warning(_LW('heartbeat message version %s is not supported, '
+                        'dropping packet'), version)
+        raise exceptions.InvalidHeartbeatVersion(version=version)
+    obj = {'id': reader.read_uuid(), 'seq': reader.read_varint(),
+           'listeners': {}}
+    for i in range(reader.read_varint()):
+        listener_id = reader.read_uuid()
+        listener = {'status': reader.read_status(), 'stats': {}, 'pools': {}}
+        for key in STATS_ORDER:
+            listener['stats'][key] = reader.read_varint()
+        for j in range(reader.read_varint()):
+            pool_id = reader.read_uuid()
+            pool = {'status': reader.read_status(), 'members': {}}
+            members = pool['members']
+            for k in range(reader.read_varint()):
+                member_id = reader.read_uuid()
+                # Inlined read_status, this is the hot loop
+                status = STATUS_HEX_NAMES.get(
+                    reader.hex[reader.pos:reader.pos + 2])
+                if status is None:
+                    status = reader.read_status()
+                else:
+                    reader.pos += 2
+                members[member_id] = status
+            listener['pools'][pool_id] = pool
+        obj['listeners'][listener_id] = listener
+    extras = reader.read_bytes(reader.read_varint())
+    if extras:
+        obj.update(json.loads(extras.decode('utf-8')))
+    return obj
+
+
+def wrap_envelope(obj, key, version=JSON_VERSION):
+    payload = encode_obj(obj, version)
     hmc = get_hmac(payload, key)
     envelope = payload + hmc
     return envelope
@@ -37,6 +37,22 @@ class AmphoraLoadBalancerDriver(object):
         """
         pass
 
+    def update_many(self, listeners, vip):
+        """Update the amphorae with the configuration of several listeners.
+
+        :param listeners: listener objects, all on the same load balancer
+        :type listeners: list
+        :param vip: vip object, need to use its ip_address property
+        :type vip: object
+        :returns: None
+
+        Drivers that can push several listener configurations to an amphora
+        at once should override this. By default each listener is updated
+        on its own.
+        """
+        for listener in listeners:
+            self.update(listener, vip)
+
     @abc.abstractmethod
     def stop(self, listener, vip):
         """Stop the listener on the vip.
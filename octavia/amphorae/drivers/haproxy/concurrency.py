@@ -0,0 +1,108 @@
+# Copyright 2016 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import threading
+
+from concurrent import futures
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from octavia.i18n import _LW
+
+LOG = logging.getLogger(__name__)
+CONF = cfg.CONF
+CONF.import_group('haproxy_amphora', 'octavia.common.config')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = futures.ThreadPoolExecutor(
+                max_workers=CONF.haproxy_amphora.rest_request_workers)
+        return _executor
+
+
+def map_amphorae(func, amphorae, *args):
+    """Calls func(amphora, *args) for all of the amphorae concurrently.
+
+    The calls share one executor bounded by rest_request_workers. Once a
+    call fails, the calls that have not started yet are cancelled, as when
+    calling them one after another, but the calls already running are
+    waited for. Unlike one after another, amphorae after the failed one may
+    then have been called too.
+
+    The exception of the first failed amphora, in the order of amphorae, is
+    raised with the outcome of every call, so that the caller can act on
+    the amphorae that were called successfully:
+
+    * amphorae_succeeded: the amphorae whose call succeeded
+    * amphorae_failed: the (amphora, exception) of the failed calls
+    * amphorae_skipped: the amphorae that were not called
+
+    :param func: the function to call for each amphora
+    :param amphorae: the amphorae to call it for
+    :returns: the results of the calls, in the order of amphorae
+    """
+    amphorae = list(amphorae)
+    if len(amphorae) < 2:
+        results = []
+        for amp in amphorae:
+            try:
+                results.append(func(amp, *args))
+            except Exception as e:
+                _set_outcome(e, [], [(amp, e)], [])
+                raise
+        return results
+
+    executor = _get_executor()
+    calls = [(amp, executor.submit(func, amp, *args)) for amp in amphorae]
+    done, not_done = futures.wait([future for amp, future in calls],
+                                  return_when=futures.FIRST_EXCEPTION)
+    # Calls are only left when one failed, do not start the queued ones
+    # but wait for the running ones
+    futures.wait([future for future in not_done if not future.cancel()])
+    if all(future.exception() is None for future in done):
+        return [future.result() for amp, future in calls]
+
+    succeeded = []
+    failed = []
+    skipped = []
+    for amp, future in calls:
+        if future.cancelled():
+            skipped.append(amp)
+        elif future.exception() is not None:
+            failed.append((amp, future.exception()))
+        else:
+            succeeded.append(amp)
+    for amp, error in failed[1:]:
+        LOG.warning(_LW("Request to amphora %(amp)s failed: %(err)s"),
+                    {'amp': amp.id, 'err': error})
+    if skipped:
+        LOG.warning(_LW("Requests to amphorae %s were not sent after a "
+                        "failure"), ', '.join(amp.id for amp in skipped))
+    _set_outcome(failed[0][1], succeeded, failed, skipped)
+    # result() re-raises the exception of the first failed call
+    for amp, future in calls:
+        if not future.cancelled():
+            future.result()
+
+
+def _set_outcome(error, succeeded, failed, skipped):
+    error.amphorae_succeeded = succeeded
+    error.amphorae_failed = failed
+    error.amphorae_skipped = skipped
@@ -13,18 +13,25 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import collections
+import errno
 import functools
 import hashlib
+import os
+import random
+import threading
 import time
 import warnings
 
 from oslo_log import log as logging
+from oslo_utils import timeutils
 import requests
 import six
 from stevedore import driver as stevedore_driver
 
 from octavia.amphorae.driver_exceptions import exceptions as driver_except
 from octavia.amphorae.drivers import driver_base as driver_base
+from octavia.amphorae.drivers.haproxy import concurrency
 from octavia.amphorae.drivers.haproxy import exceptions as exc
 from octavia.amphorae.drivers.keepalived import vrrp_rest_driver
 from octavia.common.config import cfg
@@ -67,22 +74,64 @@ class HaproxyAmphoraLoadBalancerDriver(
         # Process listener certificate info
         certs = self._process_tls_certificates(listener)
 
-        for amp in listener.load_balancer.amphorae:
-            if amp.status != constants.DELETED:
-                # Generate HaProxy configuration from listener object
-                config = self.jinja.build_config(amp,
-                                                 listener,
-                                                 certs['tls_cert'])
-                self.client.upload_config(amp, listener.id, config)
-                # todo (german): add a method to REST interface to reload or
-                #                start without having to check
-                # Is that listener running?
-                r = self.client.get_listener_status(amp,
-                                                    listener.id)
-                if r['status'] == 'ACTIVE':
-                    self.client.reload_listener(amp, listener.id)
-                else:
-                    self.client.start_listener(amp, listener.id)
+        configs = {}
+        amphorae = self._live_amphorae(listener.load_balancer)
+        for amp in amphorae:
+            # Generate HaProxy configuration from listener object
+            configs[amp.id] = self.jinja.build_config(amp,
+                                                      listener,
+                                                      certs['tls_cert'])
+        concurrency.map_amphorae(
+            lambda amp: self._upload_and_apply_config(
+                amp, listener.id, configs[amp.id]), amphorae)
+
+    def update_many(self, listeners, vip):
+        LOG.debug("Amphora %s haproxy, updating listeners %s, vip %s",
+                  self.__class__.__name__,
+                  [listener.protocol_port for listener in listeners],
+                  vip.ip_address)
+
+        # Render the configuration of every listener per amphora, so that
+        # each amphora gets all of them in a single request
+        amp_configs = collections.OrderedDict()
+        for listener in listeners:
+            certs = self._process_tls_certificates(listener)
+            for amp in listener.load_balancer.amphorae:
+                if amp.status != constants.DELETED:
+                    configs = amp_configs.setdefault(
+                        amp.id, (amp, collections.OrderedDict()))[1]
+                    configs[listener.id] = self.jinja.build_config(
+                        amp, listener, certs['tls_cert'])
+
+        concurrency.map_amphorae(
+            lambda amp: self._upload_and_apply_configs(
+                amp, amp_configs[amp.id][1]),
+            [amp for amp, configs in six.itervalues(amp_configs)])
+
+    def _upload_and_apply_configs(self, amp, configs):
+        try:
+            self.client.upload_configs(amp, configs)
+        except exc.NotFound:
+            # The amphora agent predates the multi-listener upload
+            LOG.debug("Amphora %s does not support multi-listener "
+                      "uploads, updating its listeners one by one",
+                      amp.id)
+            for listener_id, config in six.iteritems(configs):
+                self._upload_and_apply_config(amp, listener_id, config)
+
+    def _upload_and_apply_config(self, amp, listener_id, config):
+        r = self.client.upload_config(amp, listener_id, config)
+        if r.status_code == 304:
+            # The listener already runs with this configuration
+            return
+        # todo (german): add a method to REST interface to reload or
+        #                start without having to check
+        # Is that listener running?
+        r = self.client.get_listener_status(amp, listener_id)
+        if r['status'] == 'ACTIVE':
+            self.client.reload_listener(amp, listener_id)
+        else:
+            self.client.start_listener(amp, listener_id)
 
     def upload_cert_amp(self, amp, pem):
         LOG.debug("Amphora %s updating cert in REST driver "
@@ -90,10 +139,15 @@ class HaproxyAmphoraLoadBalancerDriver(
                   self.__class__.__name__, amp.id)
         self.client.update_cert_for_rotation(amp, pem)
 
+    @staticmethod
+    def _live_amphorae(load_balancer):
+        return [amp for amp in load_balancer.amphorae
+                if amp.status != constants.DELETED]
+
     def _apply(self, func, listener=None, *args):
-        for amp in listener.load_balancer.amphorae:
-            if amp.status != constants.DELETED:
-                func(amp, listener.id, *args)
+        concurrency.map_amphorae(
+            func, self._live_amphorae(listener.load_balancer),
+            listener.id, *args)
 
     def stop(self, listener, vip):
         self._apply(self.client.stop_listener, listener)
@@ -114,22 +168,24 @@ class HaproxyAmphoraLoadBalancerDriver(
         pass
 
     def post_vip_plug(self, load_balancer, amphorae_network_config):
-        for amp in load_balancer.amphorae:
-            if amp.status != constants.DELETED:
-                subnet = amphorae_network_config.get(amp.id).vip_subnet
-                # NOTE(blogan): using the vrrp port here because that
-                # is what the allowed address pairs network driver sets
-                # this particular port to.  This does expose a bit of
-                # tight coupling between the network driver and amphora
-                # driver.  We will need to revisit this to try and remove
-                # this tight coupling.
-                port = amphorae_network_config.get(amp.id).vrrp_port
-                net_info = {'subnet_cidr': subnet.cidr,
-                            'gateway': subnet.gateway_ip,
-                            'mac_address': port.mac_address}
-                self.client.plug_vip(amp,
-                                     load_balancer.vip.ip_address,
-                                     net_info)
+        net_infos = {}
+        amphorae = self._live_amphorae(load_balancer)
+        for amp in amphorae:
+            subnet = amphorae_network_config.get(amp.id).vip_subnet
+            # NOTE(blogan): using the vrrp port here because that
+            # is what the allowed address pairs network driver sets
+            # this particular port to.  This does expose a bit of
+            # tight coupling between the network driver and amphora
+            # driver.  We will need to revisit this to try and remove
+            # this tight coupling.
+            port = amphorae_network_config.get(amp.id).vrrp_port
+            net_infos[amp.id] = {'subnet_cidr': subnet.cidr,
+                                 'gateway': subnet.gateway_ip,
+                                 'mac_address': port.mac_address}
+        concurrency.map_amphorae(
+            lambda amp: self.client.plug_vip(
+                amp, load_balancer.vip.ip_address, net_infos[amp.id]),
+            amphorae)
 
     def post_network_plug(self, amphora, port):
         port_info = {'mac_address': port.mac_address}
@@ -158,14 +214,37 @@ class HaproxyAmphoraLoadBalancerDriver(
             sni_certs = data['sni_certs']
             certs.extend(sni_certs)
 
-        for cert in certs:
-            pem = cert_parser.build_pem(cert)
-            md5 = hashlib.md5(six.b(pem)).hexdigest()
-            name = '{cn}.pem'.format(cn=cert.primary_cn)
-            self._apply(self._upload_cert, listener, pem, md5, name)
+        pems = [('{cn}.pem'.format(cn=cert.primary_cn),
+                 cert_parser.build_pem(cert)) for cert in certs]
+        if pems:
+            self._apply(self._sync_certs, listener, pems)
 
         return {'tls_cert': tls_cert, 'sni_certs': sni_certs}
 
+    def _sync_certs(self, amp, listener_id, pems):
+        """Brings the certificates of a listener on an amphora up to date
+
+        :param pems: list of (filename, PEM data) of the listener
+        """
+        try:
+            manifest = self.client.get_cert_manifest(amp, listener_id)
+        except exc.NotFound:
+            # The amphora agent predates the certificate manifest
+            for name, pem in pems:
+                md5 = hashlib.md5(six.b(pem)).hexdigest()
+                self._upload_cert(amp, listener_id, pem, md5, name)
+            return
+
+        # Like uploading them one by one, the last PEM of a name wins
+        pems = dict(pems)
+        uploads = dict((name, pem) for name, pem in pems.items()
+                       if manifest.get(name) !=
+                       hashlib.md5(six.b(pem)).hexdigest())
+        # Certificates left in the directory would still be served for SNI
+        deletes = [name for name in manifest if name not in pems]
+        if uploads or deletes:
+            self.client.update_certs(amp, listener_id, uploads, deletes)
+
     def _upload_cert(self, amp, listener_id, pem, md5, name):
         try:
             if self.client.get_cert_md5sum(amp, listener_id, name) == md5:
@@ -177,6 +256,11 @@ class HaproxyAmphoraLoadBalancerDriver(
             amp, listener_id, name, pem)
 
 
+def _is_connection_refused(error):
+    # requests only keeps the message of the socket error it failed on
+    return os.strerror(errno.ECONNREFUSED) in six.text_type(error)
+
+
 # Check a custom hostname
 class CustomHostNameCheckingAdapter(requests.adapters.HTTPAdapter):
     def cert_verify(self, conn, url, verify, cert):
@@ -185,6 +269,66 @@ class CustomHostNameCheckingAdapter(requests.adapters.HTTPAdapter):
                      self).cert_verify(conn, url, verify, cert)
 
 
+class AmphoraSessionPool(object):
+    """Keeps a session, and so a connection pool, per amphora.
+
+    Each session has its own adapter checking the hostname against the
+    amphora id, so that requests to several amphorae can be sent
+    concurrently, and keeps its connections alive between requests, so
+    that they do not need a new TLS handshake each. The sessions are shared
+    by all of the clients, closed once they have been idle for
+    rest_connection_idle_timeout seconds and the least recently used ones
+    are closed when there are more than rest_connection_pool_size.
+    """
+
+    def __init__(self):
+        super(AmphoraSessionPool, self).__init__()
+        # amphora id -> (session, time of last use), least recent first
+        self.sessions = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _new_session(amp):
+        session = requests.Session()
+        session.cert = CONF.haproxy_amphora.client_cert
+        ssl_adapter = CustomHostNameCheckingAdapter(pool_connections=1)
+        ssl_adapter.uuid = amp.id
+        session.mount('https://', ssl_adapter)
+        return session
+
+    def get(self, amp):
+        now = timeutils.now()
+        idle_timeout = CONF.haproxy_amphora.rest_connection_idle_timeout
+        closed = []
+        with self.lock:
+            while self.sessions:
+                amp_id, (session, last_used) = next(
+                    six.iteritems(self.sessions))
+                if now - last_used <= idle_timeout:
+                    break
+                closed.append(self.sessions.pop(amp_id)[0])
+            entry = self.sessions.pop(amp.id, None)
+            session = entry[0] if entry else self._new_session(amp)
+            self.sessions[amp.id] = (session, now)
+            while (len(self.sessions) >
+                   CONF.haproxy_amphora.rest_connection_pool_size):
+                closed.append(self.sessions.popitem(last=False)[1][0])
+        for old_session in closed:
+            old_session.close()
+        return session
+
+    def close(self):
+        with self.lock:
+            sessions = [session for session, last_used in
+                        six.itervalues(self.sessions)]
+            self.sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+SESSION_POOL = AmphoraSessionPool()
+
+
 class AmphoraAPIClient(object):
     def __init__(self):
         super(AmphoraAPIClient, self).__init__()
@@ -204,10 +348,7 @@ class AmphoraAPIClient(object):
         self.stop_vrrp = functools.partial(self._vrrp_action, 'stop')
         self.reload_vrrp = functools.partial(self._vrrp_action, 'reload')
 
-        self.session = requests.Session()
-        self.session.cert = CONF.haproxy_amphora.client_cert
-        self.ssl_adapter = CustomHostNameCheckingAdapter()
-        self.session.mount('https://', self.ssl_adapter)
+        self.sessions = SESSION_POOL
 
     def _base_url(self, ip):
         return "https://{ip}:{port}/{version}/".format(
@@ -215,9 +356,12 @@ class AmphoraAPIClient(object):
             port=CONF.haproxy_amphora.bind_port,
             version=API_VERSION)
 
+    def _get_session(self, amp):
+        return self.sessions.get(amp)
+
     def request(self, method, amp, path='/', **kwargs):
         LOG.debug("request url %s", path)
-        _request = getattr(self.session, method.lower())
+        _request = getattr(self._get_session(amp), method.lower())
         _url = self._base_url(amp.lb_network_ip) + path
         LOG.debug("request url " + _url)
         timeout_tuple = (CONF.haproxy_amphora.rest_request_conn_timeout,
@@ -230,9 +374,13 @@ class AmphoraAPIClient(object):
         headers = reqargs.setdefault('headers', {})
 
         headers['User-Agent'] = OCTAVIA_API_CLIENT
-        self.ssl_adapter.uuid = amp.id
-        # Keep retrying
-        for a in six.moves.xrange(CONF.haproxy_amphora.connection_max_retries):
+        # Keep retrying, waiting exponentially longer between the attempts,
+        # until the deadline
+        max_retries = CONF.haproxy_amphora.connection_max_retries
+        deadline = timeutils.now() + self._retry_timeout()
+        interval = CONF.haproxy_amphora.connection_retry_initial_interval
+        refused_since = None
+        for a in six.moves.xrange(max_retries):
             try:
                 with warnings.catch_warnings():
                     warnings.filterwarnings(
@@ -240,21 +388,58 @@ class AmphoraAPIClient(object):
                         message="A true SSLContext object is not available"
                     )
                     r = _request(**reqargs)
-            except (requests.ConnectionError, requests.Timeout):
-                LOG.warning(_LW("Could not connect to instance. Retrying."))
-                time.sleep(CONF.haproxy_amphora.connection_retry_interval)
-                if a == CONF.haproxy_amphora.connection_max_retries - 1:
+            except (requests.ConnectionError, requests.Timeout) as e:
+                now = timeutils.now()
+                # An amphora whose port refuses connections is up, but its
+                # agent is not. If that lasts, the agent is not going to
+                # come up, so there is no point in waiting for the deadline.
+                if _is_connection_refused(e):
+                    if refused_since is None:
+                        refused_since = now
+                    if (now - refused_since >
+                            CONF.haproxy_amphora.connection_refused_timeout):
+                        LOG.warning(_LW("Amphora %s keeps refusing "
+                                        "connections. Giving up."), amp.id)
+                        raise driver_except.TimeOutException()
+                else:
+                    refused_since = None
+                # Equal jitter, so that the requests of the flows waiting
+                # for the same amphorae spread out
+                wait = interval / 2.0 + random.uniform(0, interval / 2.0)
+                if a == max_retries - 1 or now + wait > deadline:
                     raise driver_except.TimeOutException()
+                LOG.warning(_LW("Could not connect to instance. Retrying."))
+                time.sleep(wait)
+                interval = min(interval * 2,
+                               CONF.haproxy_amphora.connection_retry_interval)
             else:
                 return r
         raise driver_except.UnavailableException()
 
+    @staticmethod
+    def _retry_timeout():
+        timeout = CONF.haproxy_amphora.connection_retry_timeout
+        if timeout is None:
+            timeout = (CONF.haproxy_amphora.connection_max_retries *
+                       CONF.haproxy_amphora.connection_retry_interval)
+        return timeout
+
     def upload_config(self, amp, listener_id, config):
+        # The agent answers 304 if the listener already runs with it
+        md5 = hashlib.md5(six.b(config)).hexdigest()
         r = self.put(
             amp,
             'listeners/{amphora_id}/{listener_id}/haproxy'.format(
                 amphora_id=amp.id, listener_id=listener_id),
-            data=config)
+            data=config, headers={'If-None-Match': '"{0}"'.format(md5)})
+        return exc.check_exception(r)
+
+    def upload_configs(self, amp, configs):
+        files = [(listener_id, (listener_id, config))
+                 for listener_id, config in six.iteritems(configs)]
+        r = self.put(
+            amp, 'haproxy/{amphora_id}'.format(amphora_id=amp.id),
+            files=files)
         return exc.check_exception(r)
 
     def get_listener_status(self, amp, listener_id):
@@ -288,6 +473,20 @@ class AmphoraAPIClient(object):
         if exc.check_exception(r):
             return r.json().get("md5sum")
 
+    def get_cert_manifest(self, amp, listener_id):
+        r = self.get(amp, 'certificates/{listener_id}'.format(
+            listener_id=listener_id))
+        if exc.check_exception(r):
+            return r.json().get('certificates')
+
+    def update_certs(self, amp, listener_id, pems, deletes):
+        r = self.put(
+            amp,
+            'certificates/{listener_id}'.format(listener_id=listener_id),
+            files=[(name, (name, pem)) for name, pem in pems.items()],
+            data={'delete': deletes})
+        return exc.check_exception(r)
+
     def delete_listener(self, amp, listener_id):
         r = self.delete(
             amp, 'listeners/{listener_id}'.format(listener_id=listener_id))
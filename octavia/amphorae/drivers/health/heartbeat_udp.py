@@ -12,22 +12,109 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
+import errno
+import multiprocessing
 import socket
+import time
+import zlib
 
 from concurrent import futures
 from oslo_config import cfg
 from oslo_log import log as logging
+import six
 
 from octavia.amphorae.backends.health_daemon import status_message
 from octavia.common import exceptions
 from octavia.db import repositories
-from octavia.i18n import _LI
+from octavia.i18n import _LE, _LI, _LW
 
 
 UDP_MAX_SIZE = 64 * 1024
+# Interval, in seconds, between two reports of the received packet rate
+STATS_REPORT_INTERVAL = 60
+# A correctly signed heartbeat can still fail to decode, for example a
+# truncated message or a status code from a newer amphora
+DECODE_ERRORS = (KeyError, ValueError, zlib.error)
 LOG = logging.getLogger(__name__)
 
 
+class HeartbeatBatcher(object):
+    """Buffers decoded heartbeats and coalesces them per amphora
+
+    Only the newest heartbeat of each amphora is kept, as decided by the
+    ``seq`` number the amphora puts in every message. The buffered
+    heartbeats are handed out as one batch once the window has elapsed or
+    the batch has reached its maximum size.
+    """
+    def __init__(self, window, max_size):
+        self.window = window
+        self.max_size = max_size
+        self.buffer = collections.OrderedDict()
+        self.last_flush = time.time()
+        self.counters = {'heartbeats_buffered': 0,
+                         'packets_merged': 0,
+                         'batches_flushed': 0,
+                         'heartbeats_flushed': 0,
+                         'max_batch_size': 0,
+                         'last_batch_size': 0}
+
+    def add(self, obj):
+        """Add a heartbeat to the current batch
+
+        :param obj: The decoded heartbeat message
+        :return: None
+        """
+        self.counters['heartbeats_buffered'] += 1
+        amp_id = obj.get('id')
+        buffered = self.buffer.get(amp_id)
+        if buffered is not None:
+            self.counters['packets_merged'] += 1
+            if obj.get('seq', 0) < buffered.get('seq', 0):
+                # An older heartbeat arrived late, keep the newer one
+                return
+            if (status_message.DELTA_KEY in obj and
+                    status_message.DELTA_KEY not in buffered):
+                # The delta is relative to the buffered snapshot, which has
+                # to be written first. The next delta repeats its changes.
+                return
+        self.buffer[amp_id] = obj
+
+    def is_due(self):
+        if not self.buffer:
+            return False
+        return (len(self.buffer) >= self.max_size or
+                time.time() - self.last_flush >= self.window)
+
+    def drain(self):
+        """Return the buffered heartbeats and start a new batch
+
+        :return: list of heartbeat messages, one per amphora
+        """
+        batch = list(self.buffer.values())
+        self.buffer = collections.OrderedDict()
+        self.last_flush = time.time()
+        if batch:
+            self.counters['batches_flushed'] += 1
+            self.counters['heartbeats_flushed'] += len(batch)
+            self.counters['last_batch_size'] = len(batch)
+            self.counters['max_batch_size'] = max(
+                self.counters['max_batch_size'], len(batch))
+        return batch
+
+    def get_stats(self):
+        """Return the batching counters
+
+        :return: dict of counter name to value, including the average
+                 batch size
+        """
+        stats = dict(self.counters)
+        stats['avg_batch_size'] = (
+            float(stats['heartbeats_flushed']) / stats['batches_flushed']
+            if stats['batches_flushed'] else 0.0)
+        return stats
+
+
 class UDPStatusGetter(object):
     """This class defines methods that will gather heatbeats
 
@@ -44,10 +131,43 @@ class UDPStatusGetter(object):
         LOG.info(_LI('attempting to listen on %(ip)s port %(port)s'),
                  {'ip': self.ip, 'port': self.port})
         self.sock = None
+        self.packets_received = 0
+        self.started = time.time()
+        self.last_report = self.started
+        self.batcher = None
+        if cfg.CONF.health_manager.heartbeat_batch_window > 0:
+            self.batcher = HeartbeatBatcher(
+                cfg.CONF.health_manager.heartbeat_batch_window,
+                cfg.CONF.health_manager.heartbeat_batch_max_size)
+        # The address each amphora sent its last heartbeat from, to send
+        # the snapshot requests to
+        self.amphora_addrs = None
+        if cfg.CONF.health_manager.heartbeat_snapshot_interval > 0:
+            self.amphora_addrs = {}
+        self.recv_buffers = None
+        if cfg.CONF.health_manager.heartbeat_recv_batch_size > 1:
+            self.recv_buffers = [
+                memoryview(bytearray(UDP_MAX_SIZE)) for i in
+                range(cfg.CONF.health_manager.heartbeat_recv_batch_size)]
+        self.stats_flush_interval = (
+            cfg.CONF.health_manager.stats_flush_interval)
+        self.last_stats_flush = self.started
         self.update(self.key, self.ip, self.port)
 
         self.executor = futures.ThreadPoolExecutor(
             max_workers=cfg.CONF.health_manager.status_update_threads)
+        # Without batching the amphora health of each heartbeat is written
+        # by threads of its own, so it never waits behind status updates
+        self.liveness_executor = None
+        if self.batcher is None:
+            self.liveness_executor = futures.ThreadPoolExecutor(
+                max_workers=cfg.CONF.health_manager.status_update_threads)
+        self.stats_executor = self.executor
+        if cfg.CONF.health_manager.stats_flush_interval > 0:
+            # The stats are only gathered in memory and flushed now and
+            # then, so they get their own thread and never hold up the
+            # health updates
+            self.stats_executor = futures.ThreadPoolExecutor(max_workers=1)
         self.repo = repositories.Repositories().amphorahealth
 
     def update(self, key, ip, port):
@@ -65,12 +185,28 @@ class UDPStatusGetter(object):
             if self.sock is not None:
                 self.sock.close()
             self.sock = socket.socket(ai_family, socket.SOCK_DGRAM)
+            if cfg.CONF.health_manager.heartbeat_listener_processes > 1:
+                # Let the kernel spread the heartbeats over all of the
+                # receiver processes bound to this address
+                if not hasattr(socket, 'SO_REUSEPORT'):
+                    raise exceptions.NetworkConfig(
+                        "SO_REUSEPORT is required to run more than one "
+                        "heartbeat listener process")
+                self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT,
+                                     1)
             self.sock.bind((ip, port))
             if cfg.CONF.health_manager.sock_rlimit > 0:
                 rlimit = cfg.CONF.health_manager.sock_rlimit
                 LOG.info(_LI("setting sock rlimit to %s"), rlimit)
                 self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF,
                                      rlimit)
+            timeouts = [timeout for timeout in (
+                cfg.CONF.health_manager.heartbeat_batch_window,
+                self.stats_flush_interval) if timeout > 0]
+            if timeouts:
+                # Wake up periodically so a batch or the gathered stats are
+                # flushed on time even when no more heartbeats arrive
+                self.sock.settimeout(min(timeouts))
             break  # just used the first addr getaddrinfo finds
         if self.sock is None:
             raise exceptions.NetworkConfig("unable to find suitable socket")
@@ -168,13 +304,180 @@ class UDPStatusGetter(object):
         obj = status_message.unwrap_envelope(data, self.key)
         return obj, srcaddr
 
+    def dorecv_batch(self):
+        """Waits for UDP heart beats and drains all that are waiting.
+
+        The datagrams are received into a ring of preallocated buffers, one
+        syscall each, and verified and decoded straight from the buffers.
+        Packets that fail HMAC verification are dropped.
+
+        :return: Returns a list of the unwrapped payloads and addrs that
+                 sent them, see dorecv.
+        """
+        received = []
+        # Block until the first heart beat arrives
+        nbytes, srcaddr = self.sock.recvfrom_into(self.recv_buffers[0])
+        received.append((self.recv_buffers[0][:nbytes], srcaddr))
+        timeout = self.sock.gettimeout()
+        self.sock.settimeout(0.0)
+        try:
+            for buf in self.recv_buffers[1:]:
+                try:
+                    nbytes, srcaddr = self.sock.recvfrom_into(buf)
+                except socket.error as e:
+                    if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                        break
+                    raise
+                received.append((buf[:nbytes], srcaddr))
+        finally:
+            self.sock.settimeout(timeout)
+
+        heartbeats = []
+        for data, srcaddr in received:
+            if six.PY2:
+                data = data.tobytes()
+            try:
+                obj = status_message.unwrap_envelope(data, self.key)
+            except (exceptions.InvalidHMACException,
+                    exceptions.InvalidHeartbeatVersion):
+                # Pass here as the packet was dropped and logged already
+                continue
+            except DECODE_ERRORS as e:
+                LOG.warning(_LW('Dropping a heartbeat from %(addr)s that '
+                                'could not be decoded: %(err)s'),
+                            {'addr': srcaddr, 'err': e})
+                continue
+            heartbeats.append((obj, srcaddr))
+        return heartbeats
+
     def check(self):
         try:
-            (obj, srcaddr) = self.dorecv()
+            if self.recv_buffers is not None:
+                heartbeats = self.dorecv_batch()
+            else:
+                heartbeats = [self.dorecv()]
+        except socket.timeout:
+            heartbeats = []
+        except (exceptions.InvalidHMACException,
+                exceptions.InvalidHeartbeatVersion):
+            # Pass here as the packet was dropped and logged already
+            heartbeats = []
+        except DECODE_ERRORS as e:
+            LOG.warning(_LW('Dropping a heartbeat that could not be '
+                            'decoded: %s'), e)
+            heartbeats = []
+
+        for obj, srcaddr in heartbeats:
+            self.packets_received += 1
+            if self.amphora_addrs is not None:
+                self.amphora_addrs[obj.get('id')] = srcaddr
+            if self.batcher is not None:
+                self.batcher.add(obj)
+                continue
             if self.health_update:
-                self.executor.submit(self.health_update.update_health, obj)
+                self.liveness_executor.submit(self._update_health, obj)
             if self.stats_update:
-                self.executor.submit(self.stats_update.update_stats, obj)
-        except exceptions.InvalidHMACException:
-            # Pass here as the packet was dropped and logged already
-            pass
+                self.stats_executor.submit(self.stats_update.update_stats,
+                                           obj)
+
+        if self.batcher is not None and self.batcher.is_due():
+            self.flush()
+        if self.stats_flush_interval > 0 and self.stats_update:
+            self._flush_stats_if_due()
+        if self.amphora_addrs is not None and self.health_update:
+            self.send_snapshot_requests()
+        self._report_stats()
+
+    def _update_health(self, obj):
+        lb_id = self.health_update.update_liveness(obj)
+        self.executor.submit(self.health_update.update_statuses, obj, lb_id)
+
+    def send_snapshot_requests(self):
+        """Ask the amphorae that missed a snapshot to send a new one
+
+        The requests are sent back to the address of the last heartbeat of
+        the amphora, signed with the heartbeat key.
+        """
+        for amp_id in self.health_update.pop_snapshot_requests():
+            srcaddr = self.amphora_addrs.get(amp_id)
+            if srcaddr is None:
+                continue
+            request = status_message.wrap_envelope(
+                {'id': amp_id, 'request': status_message.SNAPSHOT_REQUEST},
+                self.key)
+            try:
+                self.sock.sendto(request, srcaddr)
+            except socket.error as e:
+                LOG.warning(_LW('Unable to request a status snapshot from '
+                                'amphora %(id)s: %(err)s'),
+                            {'id': amp_id, 'err': e})
+
+    def flush(self):
+        """Hand the buffered heartbeats to the updaters as one batch"""
+        batch = self.batcher.drain()
+        if not batch:
+            return
+        LOG.debug("Flushing heartbeat batch: %s", self.batcher.get_stats())
+        if self.health_update:
+            self.executor.submit(self.health_update.update_health_batch,
+                                 batch)
+        if self.stats_update:
+            self.stats_executor.submit(self.stats_update.update_stats_batch,
+                                       batch)
+
+    def _flush_stats_if_due(self):
+        now = time.time()
+        if now - self.last_stats_flush < self.stats_flush_interval:
+            return
+        self.last_stats_flush = now
+        self.stats_executor.submit(self.stats_update.flush_if_due)
+
+    def shutdown(self):
+        """Hand over the buffered heartbeats and write the gathered stats
+
+        Waits for the queued updates, so nothing received before the
+        listener stops is lost.
+        """
+        if self.batcher is not None:
+            self.flush()
+        if self.liveness_executor is not None:
+            # Its threads queue the status updates on the executor
+            self.liveness_executor.shutdown(wait=True)
+        self.executor.shutdown(wait=True)
+        if self.stats_executor is not self.executor:
+            self.stats_executor.shutdown(wait=True)
+        if self.stats_flush_interval > 0 and self.stats_update:
+            try:
+                self.stats_update.flush()
+            except Exception:
+                LOG.exception(_LE('Unable to write the gathered listener '
+                                  'stats'))
+        self.sock.close()
+
+    def get_stats(self):
+        """Return the receive counters of this process
+
+        :return: dict with the received packet count and rate, the
+                 heartbeat batching counters if batching is enabled and the
+                 status cache counters under status_cache if it is enabled
+        """
+        elapsed = time.time() - self.started
+        stats = {'packets_received': self.packets_received,
+                 'packets_per_second': (self.packets_received / elapsed
+                                        if elapsed > 0 else 0.0)}
+        if self.batcher is not None:
+            stats.update(self.batcher.get_stats())
+        if self.health_update:
+            cache_stats = self.health_update.get_cache_stats()
+            if cache_stats is not None:
+                stats['status_cache'] = cache_stats
+        return stats
+
+    def _report_stats(self):
+        now = time.time()
+        if now - self.last_report < STATS_REPORT_INTERVAL:
+            return
+        self.last_report = now
+        LOG.info(_LI('Heartbeat listener %(name)s: %(stats)s'),
+                 {'name': multiprocessing.current_process().name,
+                  'stats': self.get_stats()})
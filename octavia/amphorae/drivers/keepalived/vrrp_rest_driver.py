@@ -13,9 +13,9 @@
 # under the License.
 
 from oslo_log import log as logging
-import six
 
 from octavia.amphorae.drivers import driver_base as driver_base
+from octavia.amphorae.drivers.haproxy import concurrency
 from octavia.amphorae.drivers.keepalived.jinja import jinja_cfg
 from octavia.common import constants
 from octavia.i18n import _LI
@@ -31,6 +31,11 @@ class KeepalivedAmphoraDriverMixin(driver_base.VRRPDriverMixin):
         # The Mixed class must define a self.client object for the
         # AmphoraApiClient
 
+    @staticmethod
+    def _allocated_amphorae(loadbalancer):
+        return [amp for amp in loadbalancer.amphorae
+                if amp.status == constants.AMPHORA_ALLOCATED]
+
     def update_vrrp_conf(self, loadbalancer):
         """Update amphorae of the loadbalancer with a new VRRP configuration
 
@@ -41,12 +46,15 @@ class KeepalivedAmphoraDriverMixin(driver_base.VRRPDriverMixin):
         LOG.debug("Update loadbalancer %s amphora VRRP configuration.",
                   loadbalancer.id)
 
-        for amp in six.moves.filter(
-            lambda amp: amp.status == constants.AMPHORA_ALLOCATED,
-                loadbalancer.amphorae):
+        amphorae = self._allocated_amphorae(loadbalancer)
+        configs = {}
+        for amp in amphorae:
             # Generate Keepalived configuration from loadbalancer object
-            config = templater.build_keepalived_config(loadbalancer, amp)
-            self.client.upload_vrrp_config(amp, config)
+            configs[amp.id] = templater.build_keepalived_config(
+                loadbalancer, amp)
+        concurrency.map_amphorae(
+            lambda amp: self.client.upload_vrrp_config(amp, configs[amp.id]),
+            amphorae)
 
     def stop_vrrp_service(self, loadbalancer):
         """Stop the vrrp services running on the loadbalancer's amphorae
@@ -56,11 +64,8 @@ class KeepalivedAmphoraDriverMixin(driver_base.VRRPDriverMixin):
         LOG.info(_LI("Stop loadbalancer %s amphora VRRP Service."),
                  loadbalancer.id)
 
-        for amp in six.moves.filter(
-            lambda amp: amp.status == constants.AMPHORA_ALLOCATED,
-                loadbalancer.amphorae):
-
-            self.client.stop_vrrp(amp)
+        concurrency.map_amphorae(self.client.stop_vrrp,
+                                 self._allocated_amphorae(loadbalancer))
 
     def start_vrrp_service(self, loadbalancer):
         """Start the VRRP services of all amphorae of the loadbalancer
@@ -70,13 +75,13 @@ class KeepalivedAmphoraDriverMixin(driver_base.VRRPDriverMixin):
         LOG.info(_LI("Start loadbalancer %s amphora VRRP Service."),
                  loadbalancer.id)
 
-        for amp in six.moves.filter(
-            lambda amp: amp.status == constants.AMPHORA_ALLOCATED,
-                loadbalancer.amphorae):
-
+        def start_vrrp(amp):
             LOG.debug("Start VRRP Service on amphora %s .", amp.lb_network_ip)
             self.client.start_vrrp(amp)
 
+        concurrency.map_amphorae(start_vrrp,
+                                 self._allocated_amphorae(loadbalancer))
+
     def reload_vrrp_service(self, loadbalancer):
         """Reload the VRRP services of all amphorae of the loadbalancer
 
@@ -85,8 +90,5 @@ class KeepalivedAmphoraDriverMixin(driver_base.VRRPDriverMixin):
         LOG.info(_LI("Reload loadbalancer %s amphora VRRP Service."),
                  loadbalancer.id)
 
-        for amp in six.moves.filter(
-            lambda amp: amp.status == constants.AMPHORA_ALLOCATED,
-                loadbalancer.amphorae):
-
-            self.client.reload_vrrp(amp)
+        concurrency.map_amphorae(self.client.reload_vrrp,
+                                 self._allocated_amphorae(loadbalancer))
@@ -29,7 +29,7 @@ def setup_app(pecan_config=None, debug=False, argv=None):
     """Creates and returns a pecan wsgi app."""
     octavia_service.prepare_service(argv)
 
-    app_hooks = [hooks.ContextHook()]
+    app_hooks = [hooks.ContextHook(), hooks.StreamingHook()]
 
     if not pecan_config:
         pecan_config = get_pecan_config()
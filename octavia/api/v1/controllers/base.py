@@ -12,16 +12,22 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import itertools
+import json
 import logging
 
 from oslo_config import cfg
+import pecan
 from pecan import rest
+from sqlalchemy.orm import exc as sa_exception
 from stevedore import driver as stevedore_driver
+from wsme import api as wsme_api
+from wsme.rest import json as wsme_json
 
 from octavia.common import data_models
 from octavia.common import exceptions
 from octavia.db import repositories
-from octavia.i18n import _LI
+from octavia.i18n import _LE, _LI, _LW
 
 CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
@@ -56,41 +62,181 @@ class BaseController(rest.RestController):
         return converted
 
     @staticmethod
-    def _get_db_obj(session, repo, data_model, id):
-        """Gets an object from the database and returns it."""
-        db_obj = repo.get(session, id=id)
+    def _get_pagination_max_limit():
+        """Returns the pagination_max_limit option, None for no limit"""
+        max_limit = CONF.pagination_max_limit
+        if max_limit.lower() == 'infinite':
+            return None
+        try:
+            max_limit = int(max_limit)
+        except ValueError:
+            LOG.warning(_LW("Invalid value for pagination_max_limit: %s. It "
+                            "should be an integer, ignoring it."), max_limit)
+            return None
+        if max_limit <= 0:
+            return None
+        return max_limit
+
+    def _get_db_page(self, session, repo, to_type, limit=None, marker=None,
+                     sort_key=None, sort_dir=None, fields=None, **kwargs):
+        """Gets a page of objects from the database and converts them
+
+        limit and marker are only used when allow_pagination is set, and
+        sort_key and sort_dir when allow_sorting is set. The sort key must
+        be a column that is not nullable, since the keyset of the marker can
+        not be compared to NULL. When fields is given only these columns are
+        loaded and returned.
+
+        :param limit: The maximum number of objects to return, capped by
+                      pagination_max_limit
+        :param marker: The id of the last object of the previous page
+        :param sort_key: The column to sort on
+        :param sort_dir: The sort direction, asc or desc
+        :param fields: Comma separated names of the columns to return
+        :param kwargs: Other arguments and filters of repo.get_page
+        :raises: exceptions.InvalidOption if an option is not valid
+        """
+        if isinstance(to_type, list):
+            to_type = to_type[0]
+        columns = repo.model_class.__table__.columns
+
+        def _is_field(name):
+            return name in columns and hasattr(to_type, name)
+
+        if CONF.allow_pagination:
+            if limit is not None and limit < 1:
+                raise exceptions.InvalidOption(value=limit, option='limit')
+            max_limit = self._get_pagination_max_limit()
+            if max_limit:
+                limit = min(limit or max_limit, max_limit)
+            kwargs.update(limit=limit, marker=marker)
+        if CONF.allow_sorting:
+            if sort_key is not None:
+                if not _is_field(sort_key) or columns[sort_key].nullable:
+                    raise exceptions.InvalidOption(value=sort_key,
+                                                   option='sort_key')
+                kwargs['sort_keys'] = [sort_key]
+            if sort_dir is not None:
+                if sort_dir not in ('asc', 'desc'):
+                    raise exceptions.InvalidOption(value=sort_dir,
+                                                   option='sort_dir')
+                kwargs['sort_dir'] = sort_dir
+        if fields is not None:
+            fields = [field.strip() for field in fields.split(',')
+                      if field.strip()]
+            for field in fields:
+                if not _is_field(field):
+                    raise exceptions.InvalidOption(value=field,
+                                                   option='fields')
+            kwargs['fields'] = fields
+        batch_size = CONF.list_stream_batch_size
+        try:
+            db_objs = repo.get_page(session, batch_size=batch_size or None,
+                                    **kwargs)
+        except sa_exception.NoResultFound:
+            raise exceptions.InvalidOption(value=marker, option='marker')
+        if fields is not None:
+            # The objects only hold the requested columns, so they can not
+            # go through from_data_model which may need relationships.
+            types = (to_type(**db_obj.to_dict()) for db_obj in db_objs)
+        else:
+            types = (to_type.from_data_model(db_obj) for db_obj in db_objs)
+        # Only JSON is streamed, other content types are rendered by WSME
+        if (not batch_size or pecan.request.pecan.get('content_type') !=
+                'application/json'):
+            return list(types)
+        return self._stream_json_list(types, to_type, batch_size)
+
+    @staticmethod
+    def _stream_json_list(types, to_type, batch_size):
+        """Streams a list of WSME types as the JSON body of the response
+
+        The items are serialized batch_size at a time while the response is
+        written, so the list is never held in memory. The body is the same
+        as the one WSME renders for the list. The first batch is serialized
+        before the status is sent, so an error in the query or in the first
+        items still fails the request. A later error can only end the body,
+        which is then not valid JSON.
+
+        :param types: An iterable of the to_type objects to send
+        :returns: The WSME response the controller method returns
+        """
+        def _serialize(items):
+            return ', '.join(json.dumps(wsme_json.tojson(to_type, item))
+                             for item in items).encode('utf-8')
+
+        types = iter(types)
+        first = _serialize(itertools.islice(types, batch_size))
+
+        def _chunks():
+            yield b'[' + first
+            separator = b', ' if first else b''
+            try:
+                while True:
+                    chunk = _serialize(itertools.islice(types, batch_size))
+                    if not chunk:
+                        break
+                    yield separator + chunk
+                    separator = b', '
+            except Exception:
+                # The status was sent with the first chunk, all that can be
+                # done is to end the body.
+                LOG.exception(_LE("Failed to stream a %s list"),
+                              to_type.__name__)
+                return
+            yield b']'
+
+        pecan.response.app_iter = _chunks()
+        # WSME removes the content type of responses without a return type,
+        # hooks.StreamingHook sets it back.
+        pecan.request.context['stream_content_type'] = 'application/json'
+        return wsme_api.Response(None, status_code=200, return_type=None)
+
+    @staticmethod
+    def _get_db_obj(session, repo, data_model, id, relationships=None,
+                    profile=None):
+        """Gets an object from the database and returns it.
+
+        :param relationships: None to load the complete data model graph,
+                              else the relationships to load shallowly
+        :param profile: The load profile of the repository to use
+        """
+        db_obj = repo.get(session, relationships=relationships,
+                          profile=profile, id=id)
         if not db_obj:
             LOG.info(_LI("%s not found"), data_model._name() + id)
             raise exceptions.NotFound(
                 resource=data_model._name(), id=id)
         return db_obj
 
-    def _get_db_lb(self, session, id):
+    def _get_db_lb(self, session, id, relationships=None, profile=None):
         """Get a load balancer from the database."""
         return self._get_db_obj(session, self.repositories.load_balancer,
-                                data_models.LoadBalancer, id)
+                                data_models.LoadBalancer, id, relationships,
+                                profile)
 
-    def _get_db_listener(self, session, id):
+    def _get_db_listener(self, session, id, relationships=None):
         """Get a listener from the database."""
         return self._get_db_obj(session, self.repositories.listener,
-                                data_models.Listener, id)
+                                data_models.Listener, id, relationships)
 
-    def _get_db_pool(self, session, id):
+    def _get_db_pool(self, session, id, relationships=None, profile=None):
         """Get a pool from the database."""
         return self._get_db_obj(session, self.repositories.pool,
-                                data_models.Pool, id)
+                                data_models.Pool, id, relationships,
+                                profile)
 
-    def _get_db_member(self, session, id):
+    def _get_db_member(self, session, id, relationships=None):
         """Get a member from the database."""
         return self._get_db_obj(session, self.repositories.member,
-                                data_models.Member, id)
+                                data_models.Member, id, relationships)
 
-    def _get_db_l7policy(self, session, id):
+    def _get_db_l7policy(self, session, id, relationships=None):
         """Get a L7 Policy from the database."""
         return self._get_db_obj(session, self.repositories.l7policy,
-                                data_models.L7Policy, id)
+                                data_models.L7Policy, id, relationships)
 
-    def _get_db_l7rule(self, session, id):
+    def _get_db_l7rule(self, session, id, relationships=None):
         """Get a L7 Rule from the database."""
         return self._get_db_obj(session, self.repositories.l7rule,
-                                data_models.L7Rule, id)
+                                data_models.L7Rule, id, relationships)
@@ -46,7 +46,8 @@ class L7PolicyController(base.BaseController):
     def get(self, id):
         """Gets a single l7policy's details."""
         context = pecan.request.context.get('octavia_context')
-        db_l7policy = self._get_db_l7policy(context.session, id)
+        db_l7policy = self._get_db_l7policy(context.session, id,
+                                            relationships=())
         return self._convert_db_to_type(db_l7policy,
                                         l7policy_types.L7PolicyResponse)
 
@@ -174,7 +175,7 @@ class L7PolicyController(base.BaseController):
         if l7policy_id and len(remainder) and remainder[0] == 'l7rules':
             remainder = remainder[1:]
             db_l7policy = self.repositories.l7policy.get(
-                context.session, id=l7policy_id)
+                context.session, relationships=(), id=l7policy_id)
             if not db_l7policy:
                 LOG.info(_LI("L7Policy %s not found."), l7policy_id)
                 raise exceptions.NotFound(
@@ -46,7 +46,8 @@ class L7RuleController(base.BaseController):
     def get(self, id):
         """Gets a single l7rule's details."""
         context = pecan.request.context.get('octavia_context')
-        db_l7rule = self._get_db_l7rule(context.session, id)
+        db_l7rule = self._get_db_l7rule(context.session, id,
+                                        relationships=())
         return self._convert_db_to_type(db_l7rule,
                                         l7rule_types.L7RuleResponse)
 
@@ -49,10 +49,12 @@ class ListenersController(base.BaseController):
         # available
         listener.tls_termination = wtypes.Unset
 
-    def _get_db_listener(self, session, id):
+    def _get_db_listener(self, session, id, relationships=None,
+                         profile=None):
         """Gets a listener object from the database."""
         db_listener = self.repositories.listener.get(
-            session, load_balancer_id=self.load_balancer_id, id=id)
+            session, relationships=relationships, profile=profile,
+            load_balancer_id=self.load_balancer_id, id=id)
         if not db_listener:
             LOG.info(_LI("Listener %s not found."), id)
             raise exceptions.NotFound(
@@ -63,18 +65,24 @@ class ListenersController(base.BaseController):
     def get_one(self, id):
         """Gets a single listener's details."""
         context = pecan.request.context.get('octavia_context')
-        db_listener = self._get_db_listener(context.session, id)
+        db_listener = self._get_db_listener(
+            context.session, id, relationships=('sni_containers',),
+            profile='listener_summary')
         return self._convert_db_to_type(db_listener,
                                         listener_types.ListenerResponse)
 
-    @wsme_pecan.wsexpose([listener_types.ListenerResponse])
-    def get_all(self):
+    @wsme_pecan.wsexpose([listener_types.ListenerResponse], int,
+                         wtypes.text, wtypes.text, wtypes.text, wtypes.text)
+    def get_all(self, limit=None, marker=None, sort_key=None, sort_dir=None,
+                fields=None):
         """Lists all listeners on a load balancer."""
         context = pecan.request.context.get('octavia_context')
-        db_listeners = self.repositories.listener.get_all(
-            context.session, load_balancer_id=self.load_balancer_id)
-        return self._convert_db_to_type(db_listeners,
-                                        [listener_types.ListenerResponse])
+        return self._get_db_page(
+            context.session, self.repositories.listener,
+            [listener_types.ListenerResponse], limit=limit, marker=marker,
+            sort_key=sort_key, sort_dir=sort_dir, fields=fields,
+            relationships=('sni_containers',), profile='listener_summary',
+            load_balancer_id=self.load_balancer_id)
 
     def _test_lb_and_listener_statuses(
             self, session, id=None, listener_status=constants.PENDING_UPDATE):
@@ -241,7 +249,7 @@ class ListenersController(base.BaseController):
             controller = remainder[0]
             remainder = remainder[1:]
             db_listener = self.repositories.listener.get(
-                context.session, id=listener_id)
+                context.session, relationships=(), id=listener_id)
             if not db_listener:
                 LOG.info(_LI("Listener %s not found."), listener_id)
                 raise exceptions.NotFound(
@@ -45,23 +45,29 @@ class LoadBalancersController(base.BaseController):
     def get_one(self, id):
         """Gets a single load balancer's details."""
         context = pecan.request.context.get('octavia_context')
-        load_balancer = self._get_db_lb(context.session, id)
+        load_balancer = self._get_db_lb(context.session, id,
+                                        relationships=('vip',),
+                                        profile='lb_summary')
         return self._convert_db_to_type(load_balancer,
                                         lb_types.LoadBalancerResponse)
 
     @wsme_pecan.wsexpose([lb_types.LoadBalancerResponse], wtypes.text,
-                         wtypes.text)
-    def get_all(self, tenant_id=None, project_id=None):
+                         wtypes.text, int, wtypes.text, wtypes.text,
+                         wtypes.text, wtypes.text)
+    def get_all(self, tenant_id=None, project_id=None, limit=None,
+                marker=None, sort_key=None, sort_dir=None, fields=None):
         """Lists all load balancers."""
         # NOTE(blogan): tenant_id and project_id are optional query parameters
         # tenant_id and project_id are the same thing.  tenant_id will be kept
         # around for a short amount of time.
         context = pecan.request.context.get('octavia_context')
         project_id = context.project_id or project_id or tenant_id
-        load_balancers = self.repositories.load_balancer.get_all(
-            context.session, project_id=project_id)
-        return self._convert_db_to_type(load_balancers,
-                                        [lb_types.LoadBalancerResponse])
+        return self._get_db_page(
+            context.session, self.repositories.load_balancer,
+            [lb_types.LoadBalancerResponse], limit=limit, marker=marker,
+            sort_key=sort_key, sort_dir=sort_dir, fields=fields,
+            relationships=('vip',), profile='lb_summary',
+            project_id=project_id)
 
     def _test_lb_status(self, session, id, lb_status=constants.PENDING_UPDATE):
         """Verify load balancer is in a mutable state."""
@@ -184,8 +190,8 @@ class LoadBalancersController(base.BaseController):
                                          remainder[0] == 'delete_cascade'):
             controller = remainder[0]
             remainder = remainder[1:]
-            db_lb = self.repositories.load_balancer.get(context.session,
-                                                        id=lb_id)
+            db_lb = self.repositories.load_balancer.get(
+                context.session, relationships=(), id=lb_id)
             if not db_lb:
                 LOG.info(_LI("Load Balancer %s was not found."), lb_id)
                 raise exceptions.NotFound(
@@ -24,6 +24,7 @@ from wsmeext import pecan as wsme_pecan
 from octavia.api.v1.controllers import base
 from octavia.api.v1.types import member as member_types
 from octavia.common import constants
+from octavia.common import data_models
 from octavia.common import exceptions
 import octavia.common.validate as validate
 from octavia.db import prepare as db_prepare
@@ -35,6 +36,8 @@ LOG = logging.getLogger(__name__)
 
 class MembersController(base.BaseController):
 
+    _custom_actions = {'batch': ['POST']}
+
     def __init__(self, load_balancer_id, pool_id, listener_id=None):
         super(MembersController, self).__init__()
         self.load_balancer_id = load_balancer_id
@@ -46,17 +49,20 @@ class MembersController(base.BaseController):
     def get(self, id):
         """Gets a single pool member's details."""
         context = pecan.request.context.get('octavia_context')
-        db_member = self._get_db_member(context.session, id)
+        db_member = self._get_db_member(context.session, id, relationships=())
         return self._convert_db_to_type(db_member, member_types.MemberResponse)
 
-    @wsme_pecan.wsexpose([member_types.MemberResponse])
-    def get_all(self):
+    @wsme_pecan.wsexpose([member_types.MemberResponse], int, wtypes.text,
+                         wtypes.text, wtypes.text, wtypes.text)
+    def get_all(self, limit=None, marker=None, sort_key=None, sort_dir=None,
+                fields=None):
         """Lists all pool members of a pool."""
         context = pecan.request.context.get('octavia_context')
-        db_members = self.repositories.member.get_all(
-            context.session, pool_id=self.pool_id)
-        return self._convert_db_to_type(db_members,
-                                        [member_types.MemberResponse])
+        return self._get_db_page(
+            context.session, self.repositories.member,
+            [member_types.MemberResponse], limit=limit, marker=marker,
+            sort_key=sort_key, sort_dir=sort_dir, fields=fields,
+            compact=True, pool_id=self.pool_id)
 
     def _get_affected_listener_ids(self, session, member=None):
         """Gets a list of all listeners this request potentially affects."""
@@ -87,6 +93,26 @@ class MembersController(base.BaseController):
             raise exceptions.ImmutableObject(resource=db_lb._name(),
                                              id=self.load_balancer_id)
 
+    def _reset_lb_and_listener_statuses(self, session):
+        # Setting LB and Listeners back to active because this is just a
+        # validation failure
+        self.repositories.load_balancer.update(
+            session, self.load_balancer_id,
+            provisioning_status=constants.ACTIVE)
+        for listener_id in self._get_affected_listener_ids(session):
+            self.repositories.listener.update(
+                session, listener_id, provisioning_status=constants.ACTIVE)
+
+    @staticmethod
+    def _raise_duplicate_member(de, member_dict):
+        if ['id'] == de.columns:
+            raise exceptions.IDAlreadyExists()
+        elif (set(['pool_id', 'ip_address', 'protocol_port']) ==
+              set(de.columns)):
+            raise exceptions.DuplicateMemberEntry(
+                ip_address=member_dict.get('ip_address'),
+                port=member_dict.get('protocol_port'))
+
     @wsme_pecan.wsexpose(member_types.MemberResponse,
                          body=member_types.MemberPOST, status_code=202)
     def post(self, member):
@@ -104,23 +130,8 @@ class MembersController(base.BaseController):
             db_member = self.repositories.member.create(context.session,
                                                         **member_dict)
         except oslo_exc.DBDuplicateEntry as de:
-            # Setting LB and Listener back to active because this is just a
-            # validation failure
-            self.repositories.load_balancer.update(
-                context.session, self.load_balancer_id,
-                provisioning_status=constants.ACTIVE)
-            for listener_id in self._get_affected_listener_ids(
-                    context.session):
-                self.repositories.listener.update(
-                    context.session, listener_id,
-                    provisioning_status=constants.ACTIVE)
-            if ['id'] == de.columns:
-                raise exceptions.IDAlreadyExists()
-            elif (set(['pool_id', 'ip_address', 'protocol_port']) ==
-                  set(de.columns)):
-                raise exceptions.DuplicateMemberEntry(
-                    ip_address=member_dict.get('ip_address'),
-                    port=member_dict.get('protocol_port'))
+            self._reset_lb_and_listener_statuses(context.session)
+            self._raise_duplicate_member(de, member_dict)
         try:
             LOG.info(_LI("Sending Creation of Member %s to handler"),
                      db_member.id)
@@ -177,3 +188,71 @@ class MembersController(base.BaseController):
                         operating_status=constants.ERROR)
         db_member = self.repositories.member.get(context.session, id=id)
         return self._convert_db_to_type(db_member, member_types.MemberResponse)
+
+    @wsme_pecan.wsexpose([member_types.MemberResponse],
+                         body=member_types.MembersBatchPOST, status_code=202)
+    def batch(self, members):
+        """Creates, updates and deletes several pool members at once.
+
+        The new members are inserted in one transaction and the changes are
+        sent to the handler together, so the load balancer is locked and
+        its listeners are updated only once.
+        """
+        context = pecan.request.context.get('octavia_context')
+        session = context.session
+        changed_ids = [m.id for m in members.update] + members.delete
+        if not (members.create or changed_ids):
+            return []
+        for member in members.create:
+            if member.subnet_id and not validate.subnet_exists(
+                    member.subnet_id):
+                raise exceptions.NotFound(resource='Subnet',
+                                          id=member.subnet_id)
+        seen_ids = set()
+        for member_id in changed_ids:
+            if member_id in seen_ids:
+                raise exceptions.InvalidOption(value=member_id,
+                                               option='members')
+            seen_ids.add(member_id)
+        db_members = dict(
+            (m.id, m) for m in self.repositories.member.get_page(
+                session, ids=changed_ids, relationships=(),
+                pool_id=self.pool_id)) if changed_ids else {}
+        for member_id in changed_ids:
+            if member_id not in db_members:
+                raise exceptions.NotFound(
+                    resource=data_models.Member._name(), id=member_id)
+        self._test_lb_and_listener_statuses(session)
+
+        member_dict = None
+        try:
+            with session.begin(subtransactions=True):
+                new_members = []
+                for member in members.create:
+                    member_dict = db_prepare.create_member(
+                        member.to_dict(render_unsets=True), self.pool_id)
+                    new_members.append(self.repositories.member.create(
+                        session, **member_dict))
+        except oslo_exc.DBDuplicateEntry as de:
+            self._reset_lb_and_listener_statuses(session)
+            self._raise_duplicate_member(de, member_dict)
+        try:
+            LOG.info(_LI("Sending batch update of %(new)d new, %(upd)d "
+                         "updated and %(del)d deleted members to handler"),
+                     {'new': len(new_members), 'upd': len(members.update),
+                      'del': len(members.delete)})
+            self.handler.batch_update(
+                new_members,
+                [(db_members[m.id], m) for m in members.update],
+                [db_members[member_id] for member_id in members.delete])
+        except Exception:
+            with excutils.save_and_reraise_exception(reraise=False):
+                for listener_id in self._get_affected_listener_ids(session):
+                    self.repositories.listener.update(
+                        session, listener_id,
+                        operating_status=constants.ERROR)
+        db_members = self.repositories.member.get_page(
+            session, ids=[m.id for m in new_members] + [
+                m.id for m in members.update], relationships=())
+        return self._convert_db_to_type(db_members,
+                                        [member_types.MemberResponse])
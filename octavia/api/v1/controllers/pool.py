@@ -47,22 +47,31 @@ class PoolsController(base.BaseController):
     def get(self, id):
         """Gets a pool's details."""
         context = pecan.request.context.get('octavia_context')
-        db_pool = self._get_db_pool(context.session, id)
+        db_pool = self._get_db_pool(context.session, id,
+                                    relationships=('session_persistence',),
+                                    profile='pool_summary')
         return self._convert_db_to_type(db_pool, pool_types.PoolResponse)
 
-    @wsme_pecan.wsexpose([pool_types.PoolResponse], wtypes.text)
-    def get_all(self, listener_id=None):
+    @wsme_pecan.wsexpose([pool_types.PoolResponse], wtypes.text, int,
+                         wtypes.text, wtypes.text, wtypes.text, wtypes.text)
+    def get_all(self, listener_id=None, limit=None, marker=None,
+                sort_key=None, sort_dir=None, fields=None):
         """Lists all pools on a listener or loadbalancer."""
         context = pecan.request.context.get('octavia_context')
         if listener_id is not None:
             self.listener_id = listener_id
+        filters = {}
         if self.listener_id:
-            pools = self._get_db_listener(context.session,
-                                          self.listener_id).pools
+            filters['ids'] = [pool.id for pool in self._get_db_listener(
+                context.session, self.listener_id).pools]
         else:
-            pools = self.repositories.pool.get_all(
-                context.session, load_balancer_id=self.load_balancer_id)
-        return self._convert_db_to_type(pools, [pool_types.PoolResponse])
+            filters['load_balancer_id'] = self.load_balancer_id
+        return self._get_db_page(
+            context.session, self.repositories.pool,
+            [pool_types.PoolResponse], limit=limit, marker=marker,
+            sort_key=sort_key, sort_dir=sort_dir, fields=fields,
+            relationships=('session_persistence',), profile='pool_summary',
+            **filters)
 
     def _get_affected_listener_ids(self, session, pool=None):
         """Gets a list of all listeners this request potentially affects."""
@@ -215,7 +224,8 @@ class PoolsController(base.BaseController):
                                            remainder[0] == 'healthmonitor'):
             controller = remainder[0]
             remainder = remainder[1:]
-            db_pool = self.repositories.pool.get(context.session, id=pool_id)
+            db_pool = self.repositories.pool.get(context.session,
+                                                 relationships=(), id=pool_id)
             if not db_pool:
                 LOG.info(_LI("Pool %s not found."), pool_id)
                 raise exceptions.NotFound(resource=data_models.Pool._name(),
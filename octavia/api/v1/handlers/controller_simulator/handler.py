@@ -397,6 +397,20 @@ class MemberHandler(abstract_handler.BaseObjectHandler):
                  {"entity": self.__class__.__name__, "id": member_id})
         simulate_controller(member_id, delete=True)
 
+    def batch_update(self, new_members, updated_members, deleted_members):
+        LOG.info(_LI("%(entity)s handling the batch update of %(count)d "
+                     "members"),
+                 {"entity": self.__class__.__name__,
+                  "count": (len(new_members) + len(updated_members) +
+                            len(deleted_members))})
+        for member in new_members:
+            simulate_controller(member, create=True)
+        for old_member, member in updated_members:
+            member.id = old_member.id
+            simulate_controller(member, update=True)
+        for member in deleted_members:
+            simulate_controller(member, delete=True)
+
 
 class L7PolicyHandler(abstract_handler.BaseObjectHandler):
 
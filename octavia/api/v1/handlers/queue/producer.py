@@ -165,6 +165,23 @@ class MemberProducer(BaseProducer):
     def payload_class(self):
         return self.PAYLOAD_CLASS
 
+    def batch_update(self, new_members, updated_members, deleted_members):
+        """sends a batch update of members to the controller in one message
+
+        :param new_members: The created members
+        :param updated_members: Tuples of a member and its MemberPUT updates
+        :param deleted_members: The members to delete
+        """
+        updates = []
+        for data_model, updated_model in updated_members:
+            member_updates = updated_model.to_dict(render_unsets=False)
+            member_updates['id'] = data_model.id
+            updates.append(member_updates)
+        kw = {"new_member_ids": [m.id for m in new_members],
+              "updated_members": updates,
+              "deleted_member_ids": [m.id for m in deleted_members]}
+        self.client.cast({}, "batch_update_members", **kw)
+
 
 class L7PolicyProducer(BaseProducer):
     """Sends updates,deletes and creates to the RPC end of the queue consumer
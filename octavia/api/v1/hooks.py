@@ -29,3 +29,16 @@ class ContextHook(hooks.PecanHook):
         auth_token = state.request.headers.get('X-Auth-Token')
         state.request.context['octavia_context'] = context.Context(
             user_id=user_id, project_id=project, auth_token=auth_token)
+
+
+class StreamingHook(hooks.PecanHook):
+    """Sets the content type of the streamed list responses
+
+    The controllers stream a list by setting the app_iter of the response
+    and returning no value to WSME, which then removes the content type.
+    """
+
+    def after(self, state):
+        content_type = state.request.context.get('stream_content_type')
+        if content_type:
+            state.response.content_type = content_type
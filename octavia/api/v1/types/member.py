@@ -47,3 +47,15 @@ class MemberPUT(base.BaseType):
     protocol_port = wtypes.wsattr(wtypes.IntegerType())
     enabled = wtypes.wsattr(bool)
     weight = wtypes.wsattr(wtypes.IntegerType())
+
+
+class MemberBatchPUT(MemberPUT):
+    """Defines attributes that are acceptable of a member update in a batch."""
+    id = wtypes.wsattr(wtypes.UuidType(), mandatory=True)
+
+
+class MembersBatchPOST(base.BaseType):
+    """Defines the members to create, update and delete in a batch."""
+    create = wtypes.wsattr([MemberPOST], default=[])
+    update = wtypes.wsattr([MemberBatchPUT], default=[])
+    delete = wtypes.wsattr([wtypes.UuidType()], default=[])
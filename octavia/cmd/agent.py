@@ -18,6 +18,7 @@ import multiprocessing as multiproc
 import os
 import ssl
 import sys
+import threading
 
 from oslo_config import cfg
 from oslo_reports import guru_meditation_report as gmr
@@ -58,6 +59,35 @@ class OctaviaSSLContext(serving._SSLContext):
         )
 
 
+class OctaviaRequestHandler(serving.WSGIRequestHandler):
+    # Keep the connections of the controllers open between requests, so
+    # that they do not need a new TLS handshake for each of them
+    protocol_version = 'HTTP/1.1'
+
+    @property
+    def timeout(self):
+        return CONF.amphora_agent.agent_request_keepalive_timeout
+
+
+def serialized(app):
+    """Handles the requests of all connections one at a time.
+
+    The server uses a thread per connection to keep them open, but the
+    agent still changes the amphora for one request at a time.
+    """
+    lock = threading.Lock()
+
+    def application(environ, start_response):
+        with lock:
+            result = app(environ, start_response)
+            try:
+                return list(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+    return application
+
+
 # start api server
 def main():
     # comment out to improve logging
@@ -85,8 +115,10 @@ def main():
     # in particular the certificate file
     serving.run_simple(hostname=CONF.haproxy_amphora.bind_host,
                        port=CONF.haproxy_amphora.bind_port,
-                       application=server.app,
+                       application=serialized(server.app),
                        use_debugger=CONF.debug,
                        ssl_context=ctx,
+                       threaded=True,
+                       request_handler=OctaviaRequestHandler,
                        use_reloader=True,
                        extra_files=[CONF.amphora_agent.agent_server_cert])
@@ -13,6 +13,7 @@
 # under the License.
 #
 import multiprocessing
+import signal
 import sys
 
 from oslo_config import cfg
@@ -32,13 +33,24 @@ LOG = logging.getLogger(__name__)
 CONF.import_group('health_manager', 'octavia.common.config')
 
 
+def _handle_sigterm(signum, frame):
+    sys.exit(0)
+
+
 def hm_listener():
     # TODO(german): steved'or load those drivers
     udp_getter = heartbeat_udp.UDPStatusGetter(
         update_db.UpdateHealthDb(),
         update_db.UpdateStatsDb())
-    while True:
-        udp_getter.check()
+    # The main process terminates the listeners, let them write what they
+    # gathered before they exit
+    signal.signal(signal.SIGTERM, _handle_sigterm)
+    try:
+        while True:
+            udp_getter.check()
+    finally:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        udp_getter.shutdown()
 
 
 def hm_health_check():
@@ -54,14 +66,22 @@ def main():
 
     processes = []
 
-    hm_listener_proc = multiprocessing.Process(name='HM_listener',
-                                               target=hm_listener)
-    processes.append(hm_listener_proc)
+    # Each listener process creates its own database engine and session
+    # pool the first time it processes a heartbeat
+    listener_count = CONF.health_manager.heartbeat_listener_processes
+    for index in range(listener_count):
+        name = 'HM_listener'
+        if listener_count > 1:
+            name = 'HM_listener_%d' % index
+        hm_listener_proc = multiprocessing.Process(name=name,
+                                                   target=hm_listener)
+        processes.append(hm_listener_proc)
     hm_health_check_proc = multiprocessing.Process(name='HM_health_check',
                                                    target=hm_health_check)
     processes.append(hm_health_check_proc)
     LOG.info(_LI("Health Manager listener process starts:"))
-    hm_listener_proc.start()
+    for process in processes[:-1]:
+        process.start()
     LOG.info(_LI("Health manager check process starts:"))
     hm_health_check_proc.start()
 
@@ -70,5 +90,5 @@ def main():
             process.join()
     except KeyboardInterrupt:
         LOG.info(_LI("Health Manager existing due to signal"))
-        hm_listener_proc.terminate()
-        hm_health_check_proc.terminate()
+        for process in processes:
+            process.terminate()
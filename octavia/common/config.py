@@ -44,14 +44,29 @@ core_opts = [
                help=_("The type of authentication to use")),
     cfg.BoolOpt('allow_bulk', default=True,
                 help=_("Allow the usage of the bulk API")),
-    cfg.BoolOpt('allow_pagination', default=False,
-                help=_("Allow the usage of the pagination")),
-    cfg.BoolOpt('allow_sorting', default=False,
-                help=_("Allow the usage of the sorting")),
+    cfg.BoolOpt('allow_pagination', default=True,
+                help=_("Allow the usage of the pagination. When set the "
+                       "list calls of the API accept the limit and marker "
+                       "parameters")),
+    cfg.BoolOpt('allow_sorting', default=True,
+                help=_("Allow the usage of the sorting. When set the list "
+                       "calls of the API accept the sort_key and sort_dir "
+                       "parameters")),
     cfg.StrOpt('pagination_max_limit', default="-1",
                help=_("The maximum number of items returned in a single "
                       "response, value was 'infinite' or negative integer "
-                      "means no limit")),
+                      "means no limit. Also the number of items returned "
+                      "when the request has no limit. Only used when "
+                      "allow_pagination is set.")),
+    cfg.IntOpt('list_stream_batch_size', default=0, min=0,
+               help=_("Number of items the list calls of the API read from "
+                      "the database and write to the response at a time, "
+                      "so that large JSON lists are streamed instead of "
+                      "being built in memory. An error after the first "
+                      "batch was sent can not change the status of the "
+                      "response any more, the client then gets a truncated "
+                      "body that is not valid JSON. 0 builds the complete "
+                      "response before sending it.")),
     cfg.StrOpt('host', default=utils.get_hostname(),
                help=_("The hostname Octavia is running on")),
     cfg.StrOpt('octavia_plugins',
@@ -75,6 +90,11 @@ amphora_agent_opts = [
                help=_("The file where the network interfaces are located. "
                       "Specifying this will override any value set for "
                       "agent_server_network_dir.")),
+    cfg.IntOpt('agent_request_keepalive_timeout', default=60, min=1,
+               help=_("The time in seconds the agent keeps an idle "
+                      "connection from a controller open. It should be "
+                      "longer than the rest_connection_idle_timeout of the "
+                      "controllers.")),
     # Do not specify in octavia.conf, loaded at runtime
     cfg.StrOpt('amphora_id', help=_("The amphora ID.")),
 ]
@@ -99,9 +119,27 @@ healthmanager_opts = [
     cfg.IntOpt('failover_threads',
                default=10,
                help=_('Number of threads performing amphora failovers.')),
+    cfg.IntOpt('stale_amphora_batch_size',
+               default=10, min=1,
+               help=_('Maximum number of stale amphorae claimed for '
+                      'failover with one database query.')),
+    cfg.FloatOpt('failover_rate', default=0, min=0,
+                 help=_('Maximum number of amphora failovers started per '
+                        'second. 0 does not limit the rate.')),
+    cfg.IntOpt('failover_burst', default=10, min=1,
+               help=_('Number of amphora failovers that can be started at '
+                      'once before failover_rate applies.')),
+    cfg.IntOpt('failover_pause_threshold', default=0, min=0, max=100,
+               help=_('Pause the amphora failovers while more than this '
+                      'percentage of the amphorae are stale at the same '
+                      'time, as the controllers have most likely lost '
+                      'their network. 0 never pauses.')),
     cfg.IntOpt('status_update_threads',
                default=50,
-               help=_('Number of threads performing amphora status update.')),
+               help=_('Number of threads performing amphora status update. '
+                      'Without heartbeat batching as many threads again '
+                      'write the amphora health, apart from the status '
+                      'changes.')),
     cfg.StrOpt('heartbeat_key',
                help=_('key used to validate amphora sending'
                       'the message'), secret=True),
@@ -112,8 +150,60 @@ healthmanager_opts = [
     cfg.IntOpt('health_check_interval',
                default=3,
                help=_('Sleep time between health checks in seconds.')),
+    cfg.BoolOpt('health_check_sharding', default=False,
+                help=_('Split the amphorae between the live health '
+                       'managers with a consistent hash of their ids. Each '
+                       'health manager only checks and fails over its own '
+                       'share of the amphorae.')),
+    cfg.IntOpt('shard_member_timeout', default=30,
+               help=_('Interval, in seconds, after which a health manager '
+                      'that stopped checking in is dropped and its share '
+                      'of the amphorae is taken over by the others. Must be '
+                      'longer than health_check_interval.')),
     cfg.IntOpt('sock_rlimit', default=0,
                help=_(' sets the value of the heartbeat recv buffer')),
+    cfg.IntOpt('heartbeat_listener_processes', default=1, min=1,
+               help=_('Number of processes receiving heartbeats. When more '
+                      'than one is configured the processes share bind_ip '
+                      'and bind_port using SO_REUSEPORT.')),
+    cfg.IntOpt('heartbeat_recv_batch_size', default=0,
+               help=_('Number of preallocated receive buffers. When greater '
+                      'than 1 the heartbeat listener drains up to this many '
+                      'waiting heartbeats at a time into reused buffers. '
+                      'Set to 0 to receive one heartbeat at a time.')),
+    cfg.FloatOpt('heartbeat_batch_window', default=0,
+                 help=_('Time, in seconds, to buffer received heartbeats '
+                        'before writing them to the database in one batch. '
+                        'Only the newest heartbeat per amphora is kept. '
+                        'Set to 0 to process each heartbeat individually.')),
+    cfg.IntOpt('heartbeat_batch_max_size', default=500,
+               help=_('Maximum number of amphorae in a heartbeat batch. A '
+                      'batch is flushed early when it reaches this size.')),
+    cfg.BoolOpt('bulk_status_update', default=False,
+                help=_('Load and write the operating status of the objects '
+                       'in a heartbeat with one query per table instead of '
+                       'one query per object.')),
+    cfg.IntOpt('status_cache_size', default=0,
+               help=_('Maximum number of objects for which the health '
+                      'manager caches the last operating status written. '
+                      'Heartbeats that match the cache do not update the '
+                      'object in the database. Set to 0 to disable the '
+                      'cache.')),
+    cfg.IntOpt('status_cache_ttl', default=30,
+               help=_('Time, in seconds, after which a cached operating '
+                      'status expires and is written again. The cache of '
+                      'a heartbeat listener process does not see the '
+                      'operating statuses written by the API, the other '
+                      'processes or the failover flows, so such a change '
+                      'may stay in the database until the cached status '
+                      'expires.')),
+    cfg.IntOpt('stats_flush_interval', default=0, min=0,
+               help=_('Interval, in seconds, at which the listener '
+                      'statistics gathered from the heartbeats are written '
+                      'to the database. The statistics are then kept in '
+                      'memory and processed apart from the amphora health '
+                      'and status updates. 0 writes the statistics of every '
+                      'heartbeat.')),
 
     # Used by the health manager on the amphora
     cfg.ListOpt('controller_ip_port_list',
@@ -124,6 +214,19 @@ healthmanager_opts = [
     cfg.IntOpt('heartbeat_interval',
                default=10,
                help=_('Sleep time between sending hearthbeats.')),
+    cfg.IntOpt('heartbeat_version',
+               default=0, min=0, max=1,
+               help=_('Format of the heartbeats sent by the amphorae. 0 is '
+                      'zlib compressed JSON, 1 is a compact binary format. '
+                      'The health manager accepts both, so upgrade the '
+                      'controllers before switching the amphorae to 1.')),
+    cfg.IntOpt('heartbeat_snapshot_interval',
+               default=0, min=0,
+               help=_('Number of heartbeats between two full status '
+                      'snapshots sent by the amphorae. The heartbeats in '
+                      'between only carry the statuses that changed since '
+                      'the last snapshot. 0 sends a full snapshot in every '
+                      'heartbeat.')),
     cfg.StrOpt('event_streamer_driver',
                help=_('Specifies which driver to use for the event_streamer '
                       'for syncing the octavia and neutron_lbaas dbs. If you '
@@ -159,8 +262,25 @@ haproxy_amphora_opts = [
                help=_('Retry threshold for connecting to amphorae.')),
     cfg.IntOpt('connection_retry_interval',
                default=5,
-               help=_('Retry timeout between connection attempts in '
-                      'seconds.')),
+               help=_('Maximum time to wait between connection attempts '
+                      'in seconds.')),
+    cfg.FloatOpt('connection_retry_initial_interval',
+                 default=0.5, min=0,
+                 help=_('Time to wait before the first connection retry in '
+                        'seconds. It doubles after each retry, up to '
+                        'connection_retry_interval, and a random jitter of '
+                        'up to half of it is taken off.')),
+    cfg.IntOpt('connection_retry_timeout',
+               min=0,
+               help=_('Time in seconds after which the connection attempts '
+                      'to an amphora are given up. Defaults to '
+                      'connection_max_retries times '
+                      'connection_retry_interval.')),
+    cfg.IntOpt('connection_refused_timeout',
+               default=300, min=0,
+               help=_('Time in seconds after which the connection attempts '
+                      'to an amphora that keeps refusing connections are '
+                      'given up, before connection_retry_timeout.')),
     cfg.StrOpt('haproxy_stick_size', default='10k',
                help=_('Size of the HAProxy stick table. Accepts k, m, g '
                       'suffixes.  Example: 10k')),
@@ -182,6 +302,19 @@ haproxy_amphora_opts = [
     cfg.FloatOpt('rest_request_read_timeout', default=60,
                  help=_("The time in seconds to wait for a REST API "
                         "response.")),
+    cfg.IntOpt('rest_connection_pool_size', default=100, min=1,
+               help=_("The maximum number of amphorae the REST API client "
+                      "keeps connections open to. The connections to the "
+                      "least recently used amphora are closed first.")),
+    cfg.FloatOpt('rest_connection_idle_timeout', default=30, min=0,
+                 help=_("The time in seconds after which the connections "
+                        "to an amphora that no REST API request was sent "
+                        "to are closed.")),
+    cfg.IntOpt('rest_request_workers', default=16, min=1,
+               help=_("The maximum number of REST API requests sent to the "
+                      "amphorae of load balancers at the same time. The "
+                      "amphorae of a load balancer are updated "
+                      "concurrently, up to this limit.")),
     # REST client
     cfg.StrOpt('client_cert', default='/etc/octavia/certs/client.pem',
                help=_("The client certificate to talk to the agent")),
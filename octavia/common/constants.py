@@ -199,6 +199,7 @@ UPDATE_HEALTH_MONITOR_FLOW = 'octavia-update-health-monitor-flow'
 UPDATE_LISTENER_FLOW = 'octavia-update-listener-flow'
 UPDATE_LOADBALANCER_FLOW = 'octavia-update-loadbalancer-flow'
 UPDATE_MEMBER_FLOW = 'octavia-update-member-flow'
+BATCH_UPDATE_MEMBERS_FLOW = 'octavia-batch-update-members-flow'
 UPDATE_POOL_FLOW = 'octavia-update-pool-flow'
 UPDATE_L7POLICY_FLOW = 'octavia-update-l7policy-flow'
 UPDATE_L7RULE_FLOW = 'octavia-update-l7rule-flow'
@@ -23,6 +23,9 @@ from octavia.common import constants
 
 class BaseDataModel(object):
 
+    # Empty so that CompactDataModel subclasses have no __dict__
+    __slots__ = ()
+
     # NOTE(brandon-logan) This does not discover dicts for relationship
     # attributes.
     def to_dict(self):
@@ -438,6 +441,13 @@ class AmphoraHealth(BaseDataModel):
         self.busy = busy
 
 
+class HealthManagerMember(BaseDataModel):
+
+    def __init__(self, member_id=None, last_update=None):
+        self.member_id = member_id
+        self.last_update = last_update
+
+
 class L7Rule(BaseDataModel):
 
     def __init__(self, id=None, l7policy_id=None, type=None,
@@ -556,3 +566,49 @@ class L7Policy(BaseDataModel):
             if p.id == self.id:
                 self.listener.l7policies.remove(p)
                 break
+
+
+class CompactDataModel(BaseDataModel):
+    """Read-only data model that only holds the column attributes
+
+    The attributes are stored in __slots__ instead of a per object dict,
+    which makes these much smaller than the regular data models when
+    thousands of them are loaded at once. Use compact_class to get the
+    compact class of a data model class.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, **kwargs):
+        for name in self.__slots__:
+            object.__setattr__(self, name, kwargs.get(name))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("%s is read-only" % self.__class__.__name__)
+
+    def to_dict(self):
+        """Converts a data model to a dictionary."""
+        return dict((name, getattr(self, name)) for name in self.__slots__)
+
+    def update(self, update_dict):
+        raise AttributeError("%s is read-only" % self.__class__.__name__)
+
+
+_compact_classes = {}
+
+
+def compact_class(data_model_class, fields):
+    """Returns the compact, read-only class of a data model class
+
+    The class is created on first use, keeps the name of the data model
+    class and holds the given fields.
+
+    :param data_model_class: A BaseDataModel subclass
+    :param fields: Names of the attributes of the compact objects
+    """
+    key = (data_model_class, tuple(fields))
+    if key not in _compact_classes:
+        _compact_classes[key] = type(data_model_class.__name__,
+                                     (CompactDataModel,),
+                                     {'__slots__': tuple(fields)})
+    return _compact_classes[key]
@@ -89,6 +89,10 @@ class InvalidHMACException(OctaviaException):
     message = _("HMAC hashes didn't match")
 
 
+class InvalidHeartbeatVersion(OctaviaException):
+    message = _("Heartbeat message version %(version)s is not supported")
+
+
 class MissingArguments(OctaviaException):
     message = _("Missing arguments.")
 
@@ -0,0 +1,217 @@
+# Copyright 2016 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import heapq
+import itertools
+import threading
+import time
+
+from oslo_log import log as logging
+
+from octavia.common import constants
+from octavia.i18n import _LE
+
+LOG = logging.getLogger(__name__)
+
+# Failover priorities, lower values are failed over first
+PRIORITY_NO_HEALTHY_PEER = 0
+PRIORITY_ACTIVE = 1
+PRIORITY_BACKUP = 2
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, float('inf'))
+
+
+def get_priority(role, healthy_peers):
+    """Return the failover priority of an amphora
+
+    Amphorae of load balancers that have no healthy amphora left come
+    first, then the MASTER and STANDALONE amphorae, then the BACKUP ones.
+
+    :param role: The role of the amphora
+    :param healthy_peers: Number of healthy amphorae of its load balancer
+    """
+    if not healthy_peers:
+        return PRIORITY_NO_HEALTHY_PEER
+    if role == constants.ROLE_BACKUP:
+        return PRIORITY_BACKUP
+    return PRIORITY_ACTIVE
+
+
+class TokenBucket(object):
+    """Token bucket rate limiter
+
+    Tokens are added at rate per second, up to burst tokens.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last_refill = time.time()
+
+    def _refill(self):
+        now = time.time()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def consume(self):
+        """Take a token
+
+        :returns: 0 if a token was taken, else the seconds until the next
+                  token is available
+        """
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class Histogram(object):
+    """Counts of observed values per bucket upper bound"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+
+    def observe(self, value):
+        self.total += value
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                return
+
+    def get_stats(self):
+        count = sum(self.counts)
+        return {'buckets': dict(zip(self.buckets, self.counts)),
+                'count': count,
+                'avg': self.total / count if count else 0.0}
+
+
+class FailoverScheduler(object):
+    """Queues amphora failovers and starts them in priority order
+
+    The failovers are started by a dispatcher thread, at most max_running
+    at a time and no faster than the token bucket allows when a rate is
+    set. The queue is ordered by priority, then by submission order.
+    """
+
+    def __init__(self, executor, failover, max_running, rate=0, burst=1):
+        self.executor = executor
+        self.failover = failover
+        self.max_running = max_running
+        self.bucket = TokenBucket(rate, burst) if rate > 0 else None
+        self._queue = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._stopping = False
+        self.running = 0
+        self.counters = {'submitted': 0, 'started': 0, 'completed': 0,
+                         'failed': 0}
+        self.wait_histogram = Histogram()
+        self.latency_histogram = Histogram()
+        self._thread = threading.Thread(target=self._dispatch,
+                                        name='failover_scheduler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, amphora_id, priority=PRIORITY_ACTIVE):
+        """Queue the failover of an amphora
+
+        :param amphora_id: The id of the amphora to fail over
+        :param priority: The failover priority, see get_priority
+        """
+        with self._condition:
+            heapq.heappush(self._queue, (priority, next(self._counter),
+                                         amphora_id, time.time()))
+            self.counters['submitted'] += 1
+            self._condition.notify()
+
+    def stop(self):
+        """Start all of the queued failovers and stop the dispatcher
+
+        The rate limit no longer applies to the queued failovers, which
+        are handed to the executor right away.
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _dispatch(self):
+        stopping = False
+        while not stopping:
+            with self._condition:
+                while True:
+                    # Only the items drained here are the last ones, as stop
+                    # may be called right after a single item was popped
+                    if self._stopping:
+                        stopping = True
+                        queued = sorted(self._queue)
+                        self._queue = []
+                        self.running += len(queued)
+                        break
+                    if self._queue and self.running < self.max_running:
+                        delay = self.bucket.consume() if self.bucket else 0
+                        if not delay:
+                            queued = [heapq.heappop(self._queue)]
+                            self.running += 1
+                            break
+                        self._condition.wait(delay)
+                    else:
+                        self._condition.wait()
+            for item in queued:
+                self._start(item)
+
+    def _start(self, item):
+        priority, count, amphora_id, queued_at = item
+        with self._condition:
+            self.wait_histogram.observe(time.time() - queued_at)
+            self.counters['started'] += 1
+        LOG.debug("Starting the failover of amphora %(id)s with priority "
+                  "%(priority)s", {'id': amphora_id, 'priority': priority})
+        self.executor.submit(self._run, amphora_id)
+
+    def _run(self, amphora_id):
+        started = time.time()
+        result = 'completed'
+        try:
+            self.failover(amphora_id)
+        except Exception:
+            result = 'failed'
+            LOG.exception(_LE("Failover of amphora %s failed"), amphora_id)
+        finally:
+            with self._condition:
+                self.counters[result] += 1
+                self.latency_histogram.observe(time.time() - started)
+                self.running -= 1
+                self._condition.notify()
+
+    def get_stats(self):
+        """Return the scheduler counters
+
+        :returns: dict with the queue depth, the number of running
+                  failovers, the counters and the queue wait and failover
+                  latency histograms
+        """
+        with self._condition:
+            stats = dict(self.counters)
+            stats['queue_depth'] = len(self._queue)
+            stats['running'] = self.running
+            stats['wait'] = self.wait_histogram.get_stats()
+            stats['latency'] = self.latency_histogram.get_stats()
+        return stats
@@ -0,0 +1,51 @@
+# Copyright 2016 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import bisect
+import hashlib
+
+# Number of points each member gets on the ring. More points spread the
+# keys more evenly between the members.
+DEFAULT_REPLICAS = 100
+
+
+class HashRing(object):
+    """Consistent hash ring mapping keys to members
+
+    Each member is put on the ring at several points. A key belongs to the
+    member of the first point at or after the hash of the key, so when a
+    member joins or leaves only the keys next to its points move.
+    """
+
+    def __init__(self, members, replicas=DEFAULT_REPLICAS):
+        self.members = sorted(members)
+        self._ring = {}
+        for member in self.members:
+            for replica in range(replicas):
+                self._ring[self._hash('%s-%d' % (member, replica))] = member
+        self._hashes = sorted(self._ring)
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(key.encode('utf-8')).hexdigest(), 16)
+
+    def get_member(self, key):
+        """Return the member that owns key, or None if there are no members
+
+        :param key: The key to look up, a string
+        """
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, self._hash(key))
+        return self._ring[self._hashes[index % len(self._hashes)]]
@@ -12,16 +12,19 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import datetime
 import time
 
 from concurrent import futures
 from oslo_config import cfg
 from oslo_log import log as logging
 
+from octavia.controller.healthmanager import failover_scheduler
+from octavia.controller.healthmanager import hash_ring
 from octavia.controller.worker import controller_worker as cw
 from octavia.db import api as db_api
 from octavia.db import repositories as repo
-from octavia.i18n import _LI
+from octavia.i18n import _LI, _LW
 
 CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
@@ -32,11 +35,124 @@ class HealthManager(object):
     def __init__(self):
         self.cw = cw.ControllerWorker()
         self.threads = CONF.health_manager.failover_threads
+        self.batch_size = CONF.health_manager.stale_amphora_batch_size
+        self.member_repo = None
+        self.ring = None
+        self.amp_repo = repo.AmphoraRepository()
+        self.failovers_paused = False
+        if CONF.health_manager.health_check_sharding:
+            self.member_id = CONF.host
+            self.member_repo = repo.HealthManagerMemberRepository()
+
+    def _refresh_membership(self, session):
+        """Check in as a live member and update the hash ring
+
+        The ring is rebuilt when health managers joined or left, which
+        moves their share of the amphorae.
+        """
+        timeout = CONF.health_manager.shard_member_timeout
+        self.member_repo.replace(session, self.member_id,
+                                 last_update=datetime.datetime.utcnow())
+        self.member_repo.delete_expired(session, timeout)
+        members = self.member_repo.get_live_members(session, timeout)
+        if self.ring is None or members != self.ring.members:
+            LOG.info(_LI("Health manager members are now: %s"), members)
+            self.ring = hash_ring.HashRing(members)
+
+    def _leave_membership(self):
+        try:
+            self.member_repo.delete(db_api.get_session(),
+                                    member_id=self.member_id)
+        except Exception as e:
+            LOG.warning(_LW("Unable to remove health manager member "
+                            "%(member)s: %(err)s"),
+                        {'member': self.member_id, 'err': e})
+
+    def _get_stale_amphora_ids(self, session, amp_health_repo):
+        """Scan the stale amphorae once per health check, if needed
+
+        The scan is shared by the failover pause check and the sharded
+        claim, which both need all of the stale amphorae.
+
+        :returns: list of stale amphora ids, or None if nothing needs them
+        """
+        if (self.member_repo is None and
+                not CONF.health_manager.failover_pause_threshold):
+            return None
+        return amp_health_repo.get_stale_amphora_ids(session)
+
+    def _claim_stale_amphorae(self, session, amp_health_repo, stale_ids):
+        """Claim the stale amphorae this health manager is in charge of
+
+        :param stale_ids: The ids returned by _get_stale_amphora_ids
+        :returns: generator of lists of claimed amphora ids, one per batch
+        """
+        if self.member_repo is None:
+            while True:
+                amp_ids = amp_health_repo.get_stale_amphorae(
+                    session, self.batch_size)
+                if amp_ids:
+                    yield amp_ids
+                if len(amp_ids) < self.batch_size:
+                    return
+
+        self._refresh_membership(session)
+        owned_ids = [amp_id for amp_id in stale_ids
+                     if self.ring.get_member(amp_id) == self.member_id]
+        for index in range(0, len(owned_ids), self.batch_size):
+            amp_ids = amp_health_repo.get_stale_amphorae(
+                session, self.batch_size,
+                amphora_ids=owned_ids[index:index + self.batch_size])
+            if amp_ids:
+                yield amp_ids
+
+    def _should_pause_failovers(self, session, amp_health_repo, stale_ids):
+        """Check whether too much of the fleet went stale at once
+
+        When more than failover_pause_threshold percent of the amphorae are
+        stale together the controllers have most likely lost their network,
+        and failing the amphorae over would make things worse. A single
+        stale amphora is always failed over.
+
+        :param stale_ids: The ids returned by _get_stale_amphora_ids
+        """
+        threshold = CONF.health_manager.failover_pause_threshold
+        if not threshold:
+            return False
+        stale = len(stale_ids)
+        # The fleet is only counted when there is more than one stale
+        # amphora, which is rare
+        total = amp_health_repo.count(session) if stale > 1 else stale
+        paused = stale > 1 and stale * 100 > total * threshold
+        if paused != self.failovers_paused:
+            if paused:
+                LOG.warning(_LW("%(stale)s of %(total)s amphorae are stale, "
+                                "pausing failovers until they recover."),
+                            {'stale': stale, 'total': total})
+            else:
+                LOG.info(_LI("Resuming failovers, %(stale)s of %(total)s "
+                             "amphorae are stale."),
+                         {'stale': stale, 'total': total})
+            self.failovers_paused = paused
+        return paused
+
+    def _get_priorities(self, session, amp_ids):
+        details = self.amp_repo.get_failover_details(session, amp_ids)
+        priorities = {}
+        for amp_id in amp_ids:
+            role, healthy_peers = details.get(amp_id, (None, 1))
+            priorities[amp_id] = failover_scheduler.get_priority(
+                role, healthy_peers)
+        return priorities
 
     def health_check(self):
         amp_health_repo = repo.AmphoraHealthRepository()
 
         with futures.ThreadPoolExecutor(max_workers=self.threads) as executor:
+            scheduler = failover_scheduler.FailoverScheduler(
+                executor, self.cw.failover_amphora, self.threads,
+                rate=CONF.health_manager.failover_rate,
+                burst=CONF.health_manager.failover_burst)
             try:
                 # Don't start checking immediately, as the health manager may
                 # have been down for a while and amphorae not able to check in.
@@ -46,18 +162,30 @@ class HealthManager(object):
                     session = db_api.get_session()
                     LOG.debug("Starting amphora health check")
                     failover_count = 0
-                    while True:
-                        amp = amp_health_repo.get_stale_amphora(session)
-                        if amp is None:
-                            break
-                        failover_count += 1
-                        LOG.info(_LI("Stale amphora's id is: %s"),
-                                 amp.amphora_id)
-                        executor.submit(self.cw.failover_amphora,
-                                        amp.amphora_id)
+                    stale_ids = self._get_stale_amphora_ids(session,
+                                                            amp_health_repo)
+                    if self._should_pause_failovers(session, amp_health_repo,
+                                                    stale_ids):
+                        time.sleep(CONF.health_manager.health_check_interval)
+                        continue
+                    # Queue the failovers of a batch before claiming the
+                    # next one
+                    for amp_ids in self._claim_stale_amphorae(
+                            session, amp_health_repo, stale_ids):
+                        priorities = self._get_priorities(session, amp_ids)
+                        for amp_id in amp_ids:
+                            failover_count += 1
+                            LOG.info(_LI("Stale amphora's id is: %s"),
+                                     amp_id)
+                            scheduler.submit(amp_id, priorities[amp_id])
                     if failover_count > 0:
-                        LOG.info(_LI("Failed over %s amphora"),
-                                 failover_count)
+                        LOG.info(_LI("Failed over %(count)s amphora: "
+                                     "%(stats)s"),
+                                 {'count': failover_count,
+                                  'stats': scheduler.get_stats()})
                     time.sleep(CONF.health_manager.health_check_interval)
             finally:
+                if self.member_repo is not None:
+                    self._leave_membership()
+                scheduler.stop()
                 executor.shutdown(wait=True)
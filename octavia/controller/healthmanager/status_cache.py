@@ -0,0 +1,74 @@
+# Copyright 2016 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import collections
+import threading
+import time
+
+
+class StatusCache(object):
+    """Bounded, TTL evicted cache of the last operating status written
+
+    Entries are kept in least recently used order. When the cache is full
+    the least recently used entry is evicted, and entries older than the
+    ttl are evicted when they are looked up.
+    """
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Return the cached status for key, or None if it is not cached."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            status, timestamp = entry
+            if time.time() - timestamp > self.ttl:
+                self.evictions += 1
+                self.misses += 1
+                return None
+            # Re-insert to mark it as the most recently used entry
+            self._entries[key] = entry
+            self.hits += 1
+            return status
+
+    def set(self, key, status):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (status, time.time())
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def get_stats(self):
+        with self._lock:
+            return {'size': len(self._entries),
+                    'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'invalidations': self.invalidations}
@@ -12,7 +12,11 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import collections
 import datetime
+import functools
+import threading
+import time
 
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -20,7 +24,9 @@ import six
 import sqlalchemy
 from stevedore import driver as stevedore_driver
 
+from octavia.amphorae.backends.health_daemon import status_message
 from octavia.common import constants
+from octavia.controller.healthmanager import status_cache
 from octavia.controller.healthmanager import update_serializer
 from octavia.controller.queue import event_queue
 from octavia.db import api as db_api
@@ -45,23 +51,171 @@ class UpdateHealthDb(object):
         self.loadbalancer_repo = repo.LoadBalancerRepository()
         self.member_repo = repo.MemberRepository()
         self.pool_repo = repo.PoolRepository()
+        self.status_cache = None
+        # The objects each amphora reported in its last heartbeat, expired
+        # like the statuses so amphorae that are gone do not pile up
+        self._reported_objects = None
+        if cfg.CONF.health_manager.status_cache_size > 0:
+            self.status_cache = status_cache.StatusCache(
+                cfg.CONF.health_manager.status_cache_size,
+                cfg.CONF.health_manager.status_cache_ttl)
+            self._reported_objects = status_cache.StatusCache(
+                cfg.CONF.health_manager.status_cache_size,
+                cfg.CONF.health_manager.status_cache_ttl)
+        # The seq of the last full snapshot received from each amphora
+        self._snapshot_seqs = {}
+        # The amphorae that should be asked for a full snapshot, added to
+        # by the update threads and popped by the heartbeat listener
+        self.snapshot_requests = set()
+        self._snapshot_lock = threading.Lock()
 
     def emit(self, info_type, info_id, info_obj):
         cnt = update_serializer.InfoContainer(info_type, info_id, info_obj)
         self.event_streamer.emit(cnt)
 
     def _update_status_and_emit_event(self, session, repo, entity_type,
-                                      entity_id, new_op_status):
-        entity = repo.get(session, id=entity_id)
+                                      entity_id, new_op_status, after_commit):
+        """Write a status change
+
+        The event and the cached status are only added to after_commit, to
+        be done once the status is committed.
+        """
+        entity = repo.get(session, relationships=(), id=entity_id)
+        if entity is None:
+            LOG.error(_LE("%(type)s %(id)s is not in DB"),
+                      {'type': entity_type, 'id': entity_id})
+            self._invalidate_cached_status(entity_type, entity_id)
+            return
         if entity.operating_status.lower() != new_op_status.lower():
             LOG.debug("%s %s status has changed from %s to "
                       "%s. Updating db and sending event.",
                       entity_type, entity_id, entity.operating_status,
                       new_op_status)
             repo.update(session, entity_id, operating_status=new_op_status)
-            self.emit(
-                entity_type, entity_id,
-                {constants.OPERATING_STATUS: new_op_status})
+            after_commit.append(functools.partial(
+                self.emit, entity_type, entity_id,
+                {constants.OPERATING_STATUS: new_op_status}))
+        after_commit.append(functools.partial(
+            self._cache_status, entity_type, entity_id, new_op_status))
+
+    def _bulk_update_status_and_emit_events(self, session, status_updates,
+                                            after_commit):
+        """Write the status changes of a heartbeat with set-based queries
+
+        The current operating status of all referenced objects is loaded
+        with one query per table and compared in memory, in the same order
+        _update_status_and_emit_event would have been called. Only changed
+        rows are written, with one bulk update per table, and events are
+        emitted only for those rows once they are committed.
+        """
+        ids_by_repo = collections.OrderedDict()
+        for db_repo, entity_type, entity_id, new_op_status in status_updates:
+            ids_by_repo.setdefault(db_repo, []).append(entity_id)
+
+        current_statuses = {}
+        changed_statuses = collections.OrderedDict()
+        for db_repo, ids in six.iteritems(ids_by_repo):
+            current_statuses[db_repo] = db_repo.get_operating_statuses(session,
+                                                                       ids)
+            changed_statuses[db_repo] = {}
+
+        events = []
+        for db_repo, entity_type, entity_id, new_op_status in status_updates:
+            statuses = current_statuses[db_repo]
+            if entity_id not in statuses:
+                LOG.error(_LE("%(type)s %(id)s is not in DB"),
+                          {'type': entity_type, 'id': entity_id})
+                self._invalidate_cached_status(entity_type, entity_id)
+                continue
+            if statuses[entity_id].lower() != new_op_status.lower():
+                LOG.debug("%s %s status has changed from %s to "
+                          "%s. Updating db and sending event.",
+                          entity_type, entity_id, statuses[entity_id],
+                          new_op_status)
+                statuses[entity_id] = new_op_status
+                changed_statuses[db_repo][entity_id] = new_op_status
+                events.append(functools.partial(
+                    self.emit, entity_type, entity_id,
+                    {constants.OPERATING_STATUS: new_op_status}))
+            after_commit.append(functools.partial(
+                self._cache_status, entity_type, entity_id, new_op_status))
+
+        for db_repo, statuses in six.iteritems(changed_statuses):
+            db_repo.update_operating_statuses(session, statuses)
+
+        after_commit.extend(events)
+
+    def get_cache_stats(self):
+        """Return the status cache counters, or None without a cache"""
+        if self.status_cache is None:
+            return None
+        return self.status_cache.get_stats()
+
+    def _cache_status(self, entity_type, entity_id, op_status):
+        if self.status_cache is not None:
+            self.status_cache.set((entity_type, entity_id), op_status)
+
+    def _invalidate_cached_status(self, entity_type, entity_id):
+        if self.status_cache is not None:
+            self.status_cache.invalidate((entity_type, entity_id))
+
+    def _check_snapshot(self, health):
+        """Detect the delta heartbeats that refer to a missed snapshot
+
+        A delta heartbeat only carries the statuses that changed since the
+        full snapshot whose seq it holds. If that snapshot was not received
+        the statuses in the DB may be stale, so the amphora is queued to be
+        asked for a new snapshot.
+        """
+        amphora_id = health['id']
+        if status_message.DELTA_KEY not in health:
+            self._snapshot_seqs[amphora_id] = health.get('seq')
+            with self._snapshot_lock:
+                self.snapshot_requests.discard(amphora_id)
+            return
+        if (self._snapshot_seqs.get(amphora_id) !=
+                health[status_message.DELTA_KEY]):
+            LOG.debug("Amphora %s heartbeat %s refers to snapshot %s which "
+                      "was not received. Requesting a snapshot.",
+                      amphora_id, health.get('seq'),
+                      health[status_message.DELTA_KEY])
+            with self._snapshot_lock:
+                self.snapshot_requests.add(amphora_id)
+
+    def pop_snapshot_requests(self):
+        """Return the amphorae to ask for a full snapshot and reset them"""
+        with self._snapshot_lock:
+            requests = self.snapshot_requests
+            self.snapshot_requests = set()
+        return requests
+
+    def _filter_cached_status_updates(self, amphora_id, status_updates,
+                                      full=True):
+        """Drop the status updates that match the last status written
+
+        Objects that the amphora reported in its previous full heartbeat but
+        not in this one have most likely been deleted, so they are removed
+        from the cache. Delta heartbeats leave out unchanged objects, so
+        they are not used to detect deletions.
+        """
+        reported = set()
+        remaining = []
+        for update in status_updates:
+            db_repo, entity_type, entity_id, new_op_status = update
+            key = (entity_type, entity_id)
+            reported.add(key)
+            cached_status = self.status_cache.get(key)
+            if (cached_status is None or
+                    cached_status.lower() != new_op_status.lower()):
+                remaining.append(update)
+        previous = self._reported_objects.get(amphora_id) or set()
+        if not full:
+            self._reported_objects.set(amphora_id, previous | reported)
+            return remaining
+        for key in previous - reported:
+            self.status_cache.invalidate(key)
+        self._reported_objects.set(amphora_id, reported)
+        return remaining
 
     def update_health(self, health):
         """This function is to update db info based on amphora status
@@ -70,6 +224,10 @@ class UpdateHealthDb(object):
         :type map: string
         :returns: null
 
+        A delta heartbeat also holds the seq of the full snapshot it is
+        relative to under the "delta" key, and only the members whose status
+        changed since that snapshot or that are DOWN.
+
         The input health data structure is shown as below:
 
         health = {
@@ -86,18 +244,109 @@ class UpdateHealthDb(object):
 
         """
         session = db_api.get_session()
+        self._update_health(session, health)
 
-        # We need to see if all of the listeners are reporting in
-        expected_listener_count = 0
-        lbs_on_amp = self.amphora_repo.get_all_lbs_on_amphora(session,
-                                                              health['id'])
-        for lb in lbs_on_amp:
-            listener_count = self.listener_repo.count(session,
-                                                      load_balancer_id=lb.id)
-            expected_listener_count += listener_count
+    def update_health_batch(self, healths):
+        """Update the db info of several amphorae in two transactions
 
+        The amphora health of the whole batch is committed first, so slow
+        status updates cannot delay it and trigger false failovers. The
+        status changes are then written in a second transaction. When a
+        transaction fails its heartbeats are written again one by one, so
+        one bad heartbeat does not hold back the rest of the batch.
+
+        :param healths: list of health messages, see update_health
+        :returns: null
+        """
+        session = db_api.get_session()
+        lb_ids = self._write_batch(
+            session, healths,
+            lambda session, health, after_commit: self._update_liveness(
+                session, health))
+        self._write_batch(
+            session, [health for health in healths if health['id'] in lb_ids],
+            lambda session, health, after_commit: self._update_statuses(
+                session, health, lb_ids[health['id']], after_commit))
+
+    def _write_batch(self, session, healths, write):
+        """Call write for each heartbeat in one transaction
+
+        write is called with the session, the heartbeat and a list of
+        actions to run once the transaction is committed. If the
+        transaction fails, each heartbeat is written in a transaction of
+        its own and the heartbeats that fail again are logged and skipped.
+
+        :returns: dict of amphora id to the result of write, for the
+                  heartbeats that were committed
+        """
+        if not healths:
+            return {}
+        after_commit = []
+        try:
+            with session.begin(subtransactions=True):
+                results = dict((health['id'],
+                                write(session, health, after_commit))
+                               for health in healths)
+        except Exception:
+            if len(healths) == 1:
+                # Nobody waits on the result of the update threads
+                LOG.exception(_LE('Unable to update the heartbeat of '
+                                  'amphora %s'), healths[0]['id'])
+                return {}
+            LOG.warning(_LW('Unable to update a batch of %d heartbeats, '
+                            'updating them one by one'), len(healths))
+            results = {}
+            for health in healths:
+                results.update(self._write_batch(session, [health], write))
+            return results
+        for action in after_commit:
+            action()
+        return results
+
+    def update_liveness(self, health):
+        """Update the amphora health of a heartbeat
+
+        The heartbeat listener writes it apart from the status changes, so
+        it does not wait behind them.
+
+        :param health: The health message, see update_health
+        :returns: The id of the load balancer of the amphora, or None
+        """
+        session = db_api.get_session()
+        return self._update_liveness(session, health)
+
+    def update_statuses(self, health, lb_id):
+        """Write the status changes of a heartbeat
+
+        :param health: The health message, see update_health
+        :param lb_id: The load balancer id returned by update_liveness
+        :returns: null
+        """
+        session = db_api.get_session()
+        after_commit = []
+        self._update_statuses(session, health, lb_id, after_commit)
+        for action in after_commit:
+            action()
+
+    def _update_health(self, session, health):
+        lb_id = self._update_liveness(session, health)
+        after_commit = []
+        self._update_statuses(session, health, lb_id, after_commit)
+        for action in after_commit:
+            action()
+
+    def _update_liveness(self, session, health):
+        """Update the amphora health if all of its listeners report in
+
+        :returns: The id of the load balancer of the amphora, or None
+        """
         listeners = health['listeners']
 
+        # We need to see if all of the listeners are reporting in
+        lb_id, expected_listener_count = (
+            self.amphora_repo.get_lb_and_listener_count(session,
+                                                        health['id']))
+
         # Do not update amphora health if the reporting listener count
         # does not match the expected listener count
         if len(listeners) == expected_listener_count:
@@ -112,10 +361,25 @@ class UpdateHealthDb(object):
                         {'id': health['id'],
                          'found': len(listeners),
                          'expected': expected_listener_count})
+        return lb_id
+
+    def _update_statuses(self, session, health, lb_id, after_commit):
+        """Write the status changes reported by a heartbeat
+
+        :param after_commit: list the events to emit and the statuses to
+                             cache are added to, to be run once the changes
+                             are committed
+        """
+        self._check_snapshot(health)
+        listeners = health['listeners']
 
         # We got a heartbeat so lb is healthy until proven otherwise
         lb_status = constants.ONLINE
 
+        # The status changes are collected as (repo, entity_type,
+        # entity_id, new_op_status) and written once all of them are known
+        status_updates = []
+
         # update listener and nodes db information
         for listener_id, listener in six.iteritems(listeners):
 
@@ -133,14 +397,10 @@ class UpdateHealthDb(object):
                                 '%(status)s'), {'list': listener_id,
                             'status': listener.get('status')})
 
-            try:
-                if listener_status is not None:
-                    self._update_status_and_emit_event(
-                        session, self.listener_repo, constants.LISTENER,
-                        listener_id, listener_status
-                    )
-            except sqlalchemy.orm.exc.NoResultFound:
-                LOG.error(_LE("Listener %s is not in DB"), listener_id)
+            if listener_status is not None:
+                status_updates.append(
+                    (self.listener_repo, constants.LISTENER, listener_id,
+                     listener_status))
 
             pools = listener['pools']
             for pool_id, pool in six.iteritems(pools):
@@ -177,38 +437,43 @@ class UpdateHealthDb(object):
                                         '%(status)s'), {'mem': member_id,
                                     'status': status})
 
-                    try:
-                        if member_status is not None:
-                            self._update_status_and_emit_event(
-                                session, self.member_repo, constants.MEMBER,
-                                member_id, member_status
-                            )
-                    except sqlalchemy.orm.exc.NoResultFound:
-                        LOG.error(_LE("Member %s is not able to update "
-                                      "in DB"), member_id)
-
-                try:
-                    if pool_status is not None:
-                        self._update_status_and_emit_event(
-                            session, self.pool_repo, constants.POOL,
-                            pool_id, pool_status
-                        )
-                except sqlalchemy.orm.exc.NoResultFound:
-                    LOG.error(_LE("Pool %s is not in DB"), pool_id)
+                    if member_status is not None:
+                        status_updates.append(
+                            (self.member_repo, constants.MEMBER, member_id,
+                             member_status))
+
+                if pool_status is not None:
+                    status_updates.append(
+                        (self.pool_repo, constants.POOL, pool_id,
+                         pool_status))
 
         # Update the load balancer status last
         # TODO(sbalukoff): This logic will need to be adjusted if we
         # start supporting multiple load balancers per amphora
-        lb_id = self.amphora_repo.get(
-            session, id=health['id']).load_balancer_id
         if lb_id is not None:
+            status_updates.append(
+                (self.loadbalancer_repo, constants.LOADBALANCER, lb_id,
+                 lb_status))
+
+        if self.status_cache is not None:
+            status_updates = self._filter_cached_status_updates(
+                health['id'], status_updates,
+                full=status_message.DELTA_KEY not in health)
+
+        if cfg.CONF.health_manager.bulk_status_update:
+            self._bulk_update_status_and_emit_events(session, status_updates,
+                                                     after_commit)
+            return
+
+        for db_repo, entity_type, entity_id, new_op_status in status_updates:
             try:
                 self._update_status_and_emit_event(
-                    session, self.loadbalancer_repo,
-                    constants.LOADBALANCER, lb_id, lb_status
-                )
+                    session, db_repo, entity_type, entity_id, new_op_status,
+                    after_commit)
             except sqlalchemy.orm.exc.NoResultFound:
-                LOG.error(_LE("Load balancer %s is not in DB"), lb_id)
+                LOG.error(_LE("%(type)s %(id)s is not in DB"),
+                          {'type': entity_type, 'id': entity_id})
+                self._invalidate_cached_status(entity_type, entity_id)
 
 
 class UpdateStatsDb(object):
@@ -217,6 +482,13 @@ class UpdateStatsDb(object):
         super(UpdateStatsDb, self).__init__()
         self.listener_stats_repo = repo.ListenerStatisticsRepository()
         self.event_streamer = event_queue.EventStreamerNeutron()
+        self.flush_interval = cfg.CONF.health_manager.stats_flush_interval
+        # The latest stats of each (listener_id, amphora_id) waiting to be
+        # written, used when the stats are flushed periodically
+        self._pending_stats = {}
+        self._pending_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.last_flush = time.time()
 
     def emit(self, info_type, info_id, info_obj):
         cnt = update_serializer.InfoContainer(info_type, info_id, info_obj)
@@ -246,20 +518,88 @@ class UpdateStatsDb(object):
             }
         }
 
+        When stats_flush_interval is set the stats are only kept in memory
+        and written later by flush_if_due or flush.
+        """
+        if self.flush_interval > 0:
+            self._gather_stats(health_message)
+            self.flush_if_due()
+            return
+        session = db_api.get_session()
+        self._update_stats(session, health_message)
+
+    def update_stats_batch(self, health_messages):
+        """Update the listener stats of several amphorae in one transaction
+
+        :param health_messages: list of health messages, see update_stats
+        :returns: null
         """
+        if self.flush_interval > 0:
+            for health_message in health_messages:
+                self._gather_stats(health_message)
+            self.flush_if_due()
+            return
         session = db_api.get_session()
+        with session.begin(subtransactions=True):
+            for health_message in health_messages:
+                self._update_stats(session, health_message)
 
+    def _gather_stats(self, health_message):
         amphora_id = health_message['id']
         listeners = health_message['listeners']
-        for listener_id, listener in six.iteritems(listeners):
+        with self._pending_lock:
+            # The amphorae report running totals, so the latest stats of a
+            # listener replace the ones waiting to be written
+            for listener_id, listener in six.iteritems(listeners):
+                self._pending_stats[(listener_id, amphora_id)] = listener.get(
+                    'stats')
+
+    def flush_if_due(self):
+        """Write the gathered listener stats once the interval is over
+
+        :returns: null
+        """
+        if time.time() - self.last_flush < self.flush_interval:
+            return
+        # Only one thread flushes, the others keep gathering
+        if not self._flush_lock.acquire(False):
+            return
+        try:
+            self.flush()
+        finally:
+            self._flush_lock.release()
+
+    def flush(self):
+        """Write the gathered listener stats in one transaction
+
+        :returns: null
+        """
+        with self._pending_lock:
+            pending = self._pending_stats
+            self._pending_stats = {}
+            self.last_flush = time.time()
+        if not pending:
+            return
+        LOG.debug("Flushing the stats of %d listeners.", len(pending))
+        session = db_api.get_session()
+        with session.begin(subtransactions=True):
+            for (listener_id, amphora_id), stats in six.iteritems(pending):
+                self._write_stats(session, listener_id, amphora_id, stats)
 
-            stats = listener.get('stats')
-            stats = {'bytes_in': stats['rx'], 'bytes_out': stats['tx'],
-                     'active_connections': stats['conns'],
-                     'total_connections': stats['totconns']}
-            LOG.debug("Updating listener stats in db and sending event.")
-            LOG.debug("Listener %s / Amphora %s stats: %s",
-                      listener_id, amphora_id, stats)
-            self.listener_stats_repo.replace(
-                session, listener_id, amphora_id, **stats)
-            self.emit('listener_stats', listener_id, stats)
+    def _update_stats(self, session, health_message):
+        amphora_id = health_message['id']
+        listeners = health_message['listeners']
+        for listener_id, listener in six.iteritems(listeners):
+            self._write_stats(session, listener_id, amphora_id,
+                              listener.get('stats'))
+
+    def _write_stats(self, session, listener_id, amphora_id, stats):
+        stats = {'bytes_in': stats['rx'], 'bytes_out': stats['tx'],
+                 'active_connections': stats['conns'],
+                 'total_connections': stats['totconns']}
+        LOG.debug("Updating listener stats in db and sending event.")
+        LOG.debug("Listener %s / Amphora %s stats: %s",
+                  listener_id, amphora_id, stats)
+        self.listener_stats_repo.replace(
+            session, listener_id, amphora_id, **stats)
+        self.emit('listener_stats', listener_id, stats)
@@ -73,7 +73,8 @@ class DatabaseCleanup(object):
             seconds=CONF.house_keeping.amphora_expiry_age)
 
         session = db_api.get_session()
-        amphora = self.amp_repo.get_all(session, status=constants.DELETED)
+        amphora = self.amp_repo.get_all(session, compact=True,
+                                        status=constants.DELETED)
 
         for amp in amphora:
             if self.amp_health_repo.check_amphora_expired(session, amp.id,
@@ -89,7 +90,7 @@ class DatabaseCleanup(object):
 
         session = db_api.get_session()
         load_balancers = self.lb_repo.get_all(
-            session, provisioning_status=constants.DELETED)
+            session, compact=True, provisioning_status=constants.DELETED)
 
         for lb in load_balancers:
             if self.lb_repo.check_load_balancer_expired(session, lb.id,
@@ -102,6 +102,16 @@ class Endpoint(object):
         LOG.info(_LI('Deleting member \'%s\'...') % member_id)
         self.worker.delete_member(member_id)
 
+    def batch_update_members(self, context, new_member_ids, updated_members,
+                             deleted_member_ids):
+        LOG.info(_LI('Batch updating members: new=%(new)s, updated=%(upd)s, '
+                     'deleted=%(del)s'),
+                 {'new': new_member_ids,
+                  'upd': [m['id'] for m in updated_members],
+                  'del': deleted_member_ids})
+        self.worker.batch_update_members(new_member_ids, updated_members,
+                                         deleted_member_ids)
+
     def create_l7policy(self, context, l7policy_id):
         LOG.info(_LI('Creating l7policy \'%s\'...') % l7policy_id)
         self.worker.create_l7policy(l7policy_id)
@@ -189,6 +189,7 @@ class ControllerWorker(base_taskflow.BaseTaskFlowEngine):
         :raises NoSuitableLB: Unable to find the load balancer
         """
         listener = self._listener_repo.get(db_apis.get_session(),
+                                           profile='listener_full_tree',
                                            id=listener_id)
         load_balancer = listener.load_balancer
 
@@ -210,6 +211,7 @@ class ControllerWorker(base_taskflow.BaseTaskFlowEngine):
         :raises ListenerNotFound: The referenced listener was not found
         """
         listener = self._listener_repo.get(db_apis.get_session(),
+                                           profile='listener_full_tree',
                                            id=listener_id)
         load_balancer = listener.load_balancer
 
@@ -230,6 +232,7 @@ class ControllerWorker(base_taskflow.BaseTaskFlowEngine):
         :raises ListenerNotFound: The referenced listener was not found
         """
         listener = self._listener_repo.get(db_apis.get_session(),
+                                           profile='listener_full_tree',
                                            id=listener_id)
 
         load_balancer = listener.load_balancer
@@ -295,7 +298,8 @@ class ControllerWorker(base_taskflow.BaseTaskFlowEngine):
         # blogan and sbalukoff asked to remove the else check here
         # as it is also checked later in the flow create code
 
-        lb = self._lb_repo.get(db_apis.get_session(), id=load_balancer_id)
+        lb = self._lb_repo.get(db_apis.get_session(),
+                               profile='lb_full_tree', id=load_balancer_id)
         allocate_amphorae_flow, post_lb_amp_assoc_flow = (
             self._get_create_load_balancer_flows(lb, topology)
         )
@@ -324,7 +328,7 @@ class ControllerWorker(base_taskflow.BaseTaskFlowEngine):
         :raises LBNotFound: The referenced load balancer was not found
         """
         lb = self._lb_repo.get(db_apis.get_session(),
-                               id=load_balancer_id)
+                               profile='lb_full_tree', id=load_balancer_id)
 
         if cascade:
             (flow,
@@ -348,7 +352,7 @@ class ControllerWorker(base_taskflow.BaseTaskFlowEngine):
         :raises LBNotFound: The referenced load balancer was not found
         """
         lb = self._lb_repo.get(db_apis.get_session(),
-                               id=load_balancer_id)
+                               profile='lb_full_tree', id=load_balancer_id)
         listeners = self._listener_repo.get_all(
             db_apis.get_session(),
             load_balancer_id=load_balancer_id)
@@ -435,6 +439,45 @@ class ControllerWorker(base_taskflow.BaseTaskFlowEngine):
                                                log=LOG):
             update_member_tf.run()
 
+    def batch_update_members(self, new_member_ids, updated_members,
+                             deleted_member_ids):
+        """Creates, updates and deletes several members of a pool.
+
+        :param new_member_ids: IDs of the members that were created
+        :param updated_members: Dicts of the updated attributes of the
+                                members to update, with their id
+        :param deleted_member_ids: IDs of the members to delete
+        :returns: None
+        """
+        member_ids = (new_member_ids + [m['id'] for m in updated_members] +
+                      deleted_member_ids)
+        session = db_apis.get_session()
+        member = self._member_repo.get(session, relationships=(),
+                                       id=member_ids[0])
+        # The members are taken from the pool so that the changes made to
+        # them in the flow show in the listeners that get rendered.
+        pool = self._pool_repo.get(session, id=member.pool_id)
+        pool_members = dict((m.id, m) for m in pool.members)
+
+        new_members = [pool_members[member_id]
+                       for member_id in new_member_ids]
+        updates = []
+        for member_updates in updated_members:
+            member_updates = dict(member_updates)
+            member_id = member_updates.pop('id')
+            updates.append((pool_members[member_id], member_updates))
+        deleted_members = [pool_members[member_id]
+                           for member_id in deleted_member_ids]
+
+        batch_update_members_tf = self._taskflow_load(
+            self._member_flows.get_batch_update_members_flow(
+                new_members, updates, deleted_members),
+            store={constants.LISTENERS: pool.listeners,
+                   constants.LOADBALANCER: pool.load_balancer})
+        with tf_logging.DynamicLoggingListener(batch_update_members_tf,
+                                               log=LOG):
+            batch_update_members_tf.run()
+
     def create_pool(self, pool_id):
         """Creates a node pool.
 
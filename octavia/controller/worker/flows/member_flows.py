@@ -87,3 +87,49 @@ class MemberFlows(object):
                                              constants.LISTENERS]))
 
         return update_member_flow
+
+    def get_batch_update_members_flow(self, new_members, updated_members,
+                                      deleted_members):
+        """Create a flow to create, update and delete several members
+
+        The members are changed in the model of the load balancer, so that
+        the listeners are updated on the amphorae only once.
+
+        :param new_members: The members that were created
+        :param updated_members: Tuples of a member and its update dict
+        :param deleted_members: The members to delete
+        :returns: The flow for updating a batch of members
+        """
+        batch_flow = linear_flow.Flow(constants.BATCH_UPDATE_MEMBERS_FLOW)
+        name_format = constants.BATCH_UPDATE_MEMBERS_FLOW + '-%s-%s'
+        for member in deleted_members:
+            batch_flow.add(model_tasks.DeleteModelObject(
+                name=name_format % ('delete-model', member.id),
+                inject={constants.OBJECT: member}))
+            batch_flow.add(database_tasks.DeleteMemberInDB(
+                name=name_format % ('delete-db', member.id),
+                inject={constants.MEMBER: member}))
+        for member, update_dict in updated_members:
+            batch_flow.add(model_tasks.UpdateAttributes(
+                name=name_format % ('update-model', member.id),
+                inject={constants.OBJECT: member,
+                        constants.UPDATE_DICT: update_dict}))
+        if new_members:
+            batch_flow.add(network_tasks.CalculateDelta(
+                requires=constants.LOADBALANCER,
+                provides=constants.DELTAS))
+            batch_flow.add(network_tasks.HandleNetworkDeltas(
+                requires=constants.DELTAS, provides=constants.ADDED_PORTS))
+            batch_flow.add(amphora_driver_tasks.AmphoraePostNetworkPlug(
+                requires=(constants.LOADBALANCER, constants.ADDED_PORTS)))
+        batch_flow.add(amphora_driver_tasks.ListenersUpdate(
+            requires=(constants.LOADBALANCER, constants.LISTENERS)))
+        for member, update_dict in updated_members:
+            batch_flow.add(database_tasks.UpdateMemberInDB(
+                name=name_format % ('update-db', member.id),
+                inject={constants.MEMBER: member,
+                        constants.UPDATE_DICT: update_dict}))
+        batch_flow.add(database_tasks.MarkLBAndListenersActiveInDB(
+            requires=(constants.LOADBALANCER, constants.LISTENERS)))
+
+        return batch_flow
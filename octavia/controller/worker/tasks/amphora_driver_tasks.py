@@ -50,10 +50,10 @@ class ListenersUpdate(BaseAmphoraTask):
     """Task to update amphora with all specified listeners' configurations."""
 
     def execute(self, loadbalancer, listeners):
-        """Execute updates per listener for an amphora."""
+        """Execute updates of all listeners for an amphora."""
         for listener in listeners:
             listener.load_balancer = loadbalancer
-            self.amphora_driver.update(listener, loadbalancer.vip)
+        self.amphora_driver.update_many(listeners, loadbalancer.vip)
 
     def revert(self, loadbalancer, *args, **kwargs):
         """Handle failed listeners updates."""
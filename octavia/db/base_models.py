@@ -16,8 +16,10 @@ from oslo_db.sqlalchemy import models
 from oslo_utils import uuidutils
 import six
 import sqlalchemy as sa
+from sqlalchemy import orm
 from sqlalchemy.ext import declarative
-from sqlalchemy.orm import collections
+
+from octavia.common import data_models
 
 
 def datetime_to_str(dct, attr_name):
@@ -30,85 +32,145 @@ class OctaviaBase(models.ModelBase):
 
     __data_model__ = None
 
+    # The columns whose values identify an object in a data model graph.
+    # Defaults to the primary key columns.
+    __unique_key__ = None
+
+    # Set by _set_conversion_metadata once the mappers are configured
+    _column_names = ()
+    _relationship_names = ()
+    _unique_key_names = None
+
     @staticmethod
     def _get_unique_key(obj):
         """Returns a unique key for passed object for data model building."""
-        # First handle all objects with their own ID, then handle subordinate
-        # objects.
-        if obj.__class__.__name__ in ['Member', 'Pool', 'LoadBalancer',
-                                      'Listener', 'Amphora', 'L7Policy',
-                                      'L7Rule']:
-            return obj.__class__.__name__ + obj.id
-        elif obj.__class__.__name__ in ['SessionPersistence', 'HealthMonitor']:
-            return obj.__class__.__name__ + obj.pool_id
-        elif obj.__class__.__name__ in ['ListenerStatistics']:
-            return obj.__class__.__name__ + obj.listener_id
-        elif obj.__class__.__name__ in ['VRRPGroup', 'Vip']:
-            return obj.__class__.__name__ + obj.load_balancer_id
-        elif obj.__class__.__name__ in ['AmphoraHealth']:
-            return obj.__class__.__name__ + obj.amphora_id
-        elif obj.__class__.__name__ in ['SNI']:
-            return (obj.__class__.__name__ +
-                    obj.listener_id + obj.tls_container_id)
-        else:
+        if obj._unique_key_names is None:
             raise NotImplementedError
+        return obj.__class__.__name__ + ''.join(
+            getattr(obj, name) for name in obj._unique_key_names)
 
-    def to_data_model(self, _graph_nodes=None):
+    def to_data_model(self, _graph_nodes=None, relationships=None):
         """Converts to a data model graph.
 
         In order to make the resulting data model graph usable no matter how
         many internal references are followed, we generate a complete graph of
         OctaviaBase nodes connected to the object passed to this method.
 
+        Following every relationship loads the whole graph from the
+        database, so callers that only need some attributes can ask for a
+        shallow conversion instead. Only the columns and the listed
+        relationships are then copied, and the related objects are
+        converted without their own relationships. The other relationships
+        keep the data model defaults.
+
         :param _graph_nodes: Used only for internal recursion of this
                              method. Should not be called from the outside.
                              Contains a dictionary of all OctaviaBase type
                              objects in the generated graph
+        :param relationships: None to convert the complete graph, else the
+                              names of the relationships to convert
+                              shallowly. An empty tuple only copies the
+                              columns.
         """
+        if relationships is not None:
+            return self._to_shallow_data_model(relationships)
         _graph_nodes = _graph_nodes or {}
         if not self.__data_model__:
             raise NotImplementedError
-        dm_kwargs = {}
-        for column in self.__table__.columns:
-            dm_kwargs[column.name] = getattr(self, column.name)
-            datetime_to_str(dm_kwargs, 'created_at')
-            datetime_to_str(dm_kwargs, 'updated_at')
-
-        attr_names = [attr_name for attr_name in dir(self)
-                      if not attr_name.startswith('_')]
         # Appending early, as any unique ID should be defined already and
         # the rest of this object will get filled out more fully later on,
         # and we need to add ourselves to the _graph_nodes before we
         # attempt recursion.
-        dm_self = self.__data_model__(**dm_kwargs)
-        dm_key = self._get_unique_key(dm_self)
-        _graph_nodes.update({dm_key: dm_self})
-        for attr_name in attr_names:
+        dm_self = self.__data_model__(**self._get_column_kwargs())
+        _graph_nodes[self._get_unique_key(self)] = dm_self
+        for attr_name in self._relationship_names:
             attr = getattr(self, attr_name)
-            if isinstance(attr, OctaviaBase) and attr.__class__:
+            if isinstance(attr, OctaviaBase):
                 # If this attr is already in the graph node list, just
                 # reference it there and don't recurse.
                 ukey = self._get_unique_key(attr)
-                if ukey in _graph_nodes.keys():
+                if ukey in _graph_nodes:
                     setattr(dm_self, attr_name, _graph_nodes[ukey])
                 else:
                     setattr(dm_self, attr_name, attr.to_data_model(
                         _graph_nodes=_graph_nodes))
-            elif isinstance(attr, (collections.InstrumentedList, list)):
-                setattr(dm_self, attr_name, [])
-                listref = getattr(dm_self, attr_name)
+            elif isinstance(attr, list):
+                listref = []
+                setattr(dm_self, attr_name, listref)
                 for item in attr:
-                    if isinstance(item, OctaviaBase) and item.__class__:
+                    if isinstance(item, OctaviaBase):
                         ukey = self._get_unique_key(item)
-                        if ukey in _graph_nodes.keys():
+                        if ukey in _graph_nodes:
                             listref.append(_graph_nodes[ukey])
                         else:
                             listref.append(
                                 item.to_data_model(_graph_nodes=_graph_nodes))
-                    elif not isinstance(item, OctaviaBase):
+                    else:
                         listref.append(item)
         return dm_self
 
+    def _get_column_kwargs(self):
+        dm_kwargs = dict((name, getattr(self, name))
+                         for name in self._column_names)
+        datetime_to_str(dm_kwargs, 'created_at')
+        datetime_to_str(dm_kwargs, 'updated_at')
+        return dm_kwargs
+
+    @classmethod
+    def to_compact_data_models(cls, query, fields=None, batch_size=None):
+        """Runs a query of this class and returns compact data models
+
+        Only the columns are selected, so no ORM objects are built, and the
+        rows are returned as read-only data_models.CompactDataModel objects.
+
+        :param query: A query of this model class
+        :param fields: The names of the columns to select, all the columns
+                       when None
+        :param batch_size: When given, an iterator is returned instead of a
+                           list, which fetches the rows in batches of this
+                           size from a server side cursor
+        :returns: [octavia.common.data_models.CompactDataModel]
+        """
+        if not cls.__data_model__:
+            raise NotImplementedError
+        orm.configure_mappers()
+        if fields is None:
+            fields = cls._column_names
+        compact_class = data_models.compact_class(cls.__data_model__, fields)
+        rows = query.with_entities(*[cls.__table__.columns[name]
+                                     for name in fields])
+        if batch_size:
+            return cls._iter_compact_data_models(
+                rows.yield_per(batch_size), fields, compact_class)
+        return list(cls._iter_compact_data_models(rows, fields,
+                                                  compact_class))
+
+    @staticmethod
+    def _iter_compact_data_models(rows, fields, compact_class):
+        for row in rows:
+            dm_kwargs = dict(zip(fields, row))
+            datetime_to_str(dm_kwargs, 'created_at')
+            datetime_to_str(dm_kwargs, 'updated_at')
+            yield compact_class(**dm_kwargs)
+
+    def _to_shallow_data_model(self, relationships):
+        if not self.__data_model__:
+            raise NotImplementedError
+        dm_self = self.__data_model__(**self._get_column_kwargs())
+        for attr_name in relationships:
+            attr = getattr(self, attr_name)
+            if isinstance(attr, OctaviaBase):
+                setattr(dm_self, attr_name,
+                        attr.to_data_model(relationships=()))
+            elif isinstance(attr, list):
+                setattr(dm_self, attr_name,
+                        [item.to_data_model(relationships=())
+                         if isinstance(item, OctaviaBase) else item
+                         for item in attr])
+            else:
+                setattr(dm_self, attr_name, attr)
+        return dm_self
+
 
 class LookupTableMixin(object):
     """Mixin to add to classes that are lookup tables."""
@@ -128,3 +190,29 @@ class ProjectMixin(object):
 
 
 BASE = declarative.declarative_base(cls=OctaviaBase)
+
+
+@sa.event.listens_for(orm.mapper, 'after_configured')
+def _set_conversion_metadata():
+    """Store what to_data_model needs to know about each mapped class
+
+    This runs once all of the mappers, and so all of the backrefs, are
+    configured. Besides the relationships, the public properties are
+    converted too, as some of them return lists of related objects.
+    """
+    for cls in BASE._decl_class_registry.values():
+        if not isinstance(cls, type) or not issubclass(cls, OctaviaBase):
+            continue
+        mapper = sa.inspect(cls)
+        cls._column_names = tuple(column.name
+                                  for column in cls.__table__.columns)
+        names = [name for name in mapper.relationships.keys()
+                 if not name.startswith('_')]
+        for klass in cls.__mro__:
+            for name, value in six.iteritems(vars(klass)):
+                if (isinstance(value, property) and
+                        not name.startswith('_') and name not in names):
+                    names.append(name)
+        cls._relationship_names = tuple(sorted(names))
+        cls._unique_key_names = cls.__unique_key__ or tuple(
+            column.name for column in mapper.primary_key)
@@ -0,0 +1,30 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Add an index on amphora_health busy and last_update
+
+Revision ID: a4c7d2e9f310
+Revises: 62816c232310
+Create Date: 2016-07-14 10:21:37.520183
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'a4c7d2e9f310'
+down_revision = '62816c232310'
+
+from alembic import op
+
+
+def upgrade():
+    op.create_index(u'idx_amphora_health_busy_last_update',
+                    u'amphora_health', [u'busy', u'last_update'])
@@ -0,0 +1,36 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""create health manager member table
+
+Revision ID: c8e3b1d7a2f4
+Revises: a4c7d2e9f310
+Create Date: 2016-07-21 15:02:44.130589
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'c8e3b1d7a2f4'
+down_revision = 'a4c7d2e9f310'
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.create_table(
+        u'health_manager_member',
+        sa.Column(u'member_id', sa.String(255), nullable=False,
+                  primary_key=True),
+        sa.Column(u'last_update', sa.DateTime(timezone=True),
+                  nullable=False)
+    )
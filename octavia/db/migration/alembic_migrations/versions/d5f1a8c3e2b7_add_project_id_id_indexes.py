@@ -0,0 +1,31 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Add project_id and id indexes for paginated lists
+
+Revision ID: d5f1a8c3e2b7
+Revises: c8e3b1d7a2f4
+Create Date: 2016-07-28 11:43:09.284716
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = 'd5f1a8c3e2b7'
+down_revision = 'c8e3b1d7a2f4'
+
+from alembic import op
+
+
+def upgrade():
+    for table in (u'load_balancer', u'listener', u'pool', u'member'):
+        op.create_index(u'idx_%s_project_id_id' % table, table,
+                        [u'project_id', u'id'])
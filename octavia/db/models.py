@@ -111,6 +111,7 @@ class SessionPersistence(base_models.BASE):
 class ListenerStatistics(base_models.BASE):
 
     __data_model__ = data_models.ListenerStatistics
+    __unique_key__ = ('listener_id',)
 
     __tablename__ = "listener_statistics"
 
@@ -161,6 +162,7 @@ class Member(base_models.BASE, base_models.IdMixin, base_models.ProjectMixin,
     __table_args__ = (
         sa.UniqueConstraint('pool_id', 'ip_address', 'protocol_port',
                             name='uq_member_pool_id_address_protocol_port'),
+        sa.Index('idx_member_project_id_id', 'project_id', 'id'),
     )
 
     pool_id = sa.Column(
@@ -217,6 +219,9 @@ class Pool(base_models.BASE, base_models.IdMixin, base_models.ProjectMixin,
     __data_model__ = data_models.Pool
 
     __tablename__ = "pool"
+    __table_args__ = (
+        sa.Index('idx_pool_project_id_id', 'project_id', 'id'),
+    )
 
     name = sa.Column(sa.String(255), nullable=True)
     description = sa.Column(sa.String(255), nullable=True)
@@ -267,6 +272,9 @@ class LoadBalancer(base_models.BASE, base_models.IdMixin,
     __data_model__ = data_models.LoadBalancer
 
     __tablename__ = "load_balancer"
+    __table_args__ = (
+        sa.Index('idx_load_balancer_project_id_id', 'project_id', 'id'),
+    )
 
     name = sa.Column(sa.String(255), nullable=True)
     description = sa.Column(sa.String(255), nullable=True)
@@ -343,6 +351,7 @@ class Listener(base_models.BASE, base_models.IdMixin,
     __table_args__ = (
         sa.UniqueConstraint('load_balancer_id', 'protocol_port',
                             name='uq_listener_load_balancer_id_protocol_port'),
+        sa.Index('idx_listener_project_id_id', 'project_id', 'id'),
     )
 
     name = sa.Column(sa.String(255), nullable=True)
@@ -462,6 +471,10 @@ class Amphora(base_models.BASE, base_models.IdMixin):
 class AmphoraHealth(base_models.BASE):
     __data_model__ = data_models.AmphoraHealth
     __tablename__ = "amphora_health"
+    __table_args__ = (
+        sa.Index('idx_amphora_health_busy_last_update', 'busy',
+                 'last_update'),
+    )
 
     amphora_id = sa.Column(
         sa.String(36), nullable=False, primary_key=True)
@@ -471,6 +484,16 @@ class AmphoraHealth(base_models.BASE):
     busy = sa.Column(sa.Boolean(), default=False, nullable=False)
 
 
+class HealthManagerMember(base_models.BASE):
+    __data_model__ = data_models.HealthManagerMember
+    __tablename__ = "health_manager_member"
+
+    member_id = sa.Column(
+        sa.String(255), nullable=False, primary_key=True)
+    last_update = sa.Column(sa.DateTime, default=func.now(),
+                            nullable=False)
+
+
 class L7Rule(base_models.BASE, base_models.IdMixin):
 
     __data_model__ = data_models.L7Rule
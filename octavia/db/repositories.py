@@ -21,7 +21,10 @@ reference
 import datetime
 
 from oslo_config import cfg
+from oslo_db.sqlalchemy import utils as db_utils
 from oslo_utils import uuidutils
+import sqlalchemy
+from sqlalchemy import orm
 
 from octavia.common import constants
 from octavia.common import data_models
@@ -34,9 +37,59 @@ CONF = cfg.CONF
 CONF.import_group('health_manager', 'octavia.common.config')
 CONF.import_group('house_keeping', 'octavia.common.config')
 
+# The relationships converted with the complete data model graph of a load
+# balancer, with the strategy used to load them eagerly. The many-to-one
+# back references are found in the session without a query.
+_LB_TREE = (
+    (orm.joinedload, 'vip'),
+    (orm.joinedload, 'vrrp_group'),
+    (orm.subqueryload, 'amphorae'),
+    (orm.subqueryload, 'amphorae.stats'),
+    (orm.subqueryload, 'listeners'),
+    (orm.subqueryload, 'listeners.stats'),
+    (orm.subqueryload, 'listeners.sni_containers'),
+    (orm.subqueryload, 'listeners.l7policies'),
+    (orm.subqueryload, 'listeners.l7policies.l7rules'),
+    (orm.subqueryload, 'pools'),
+    (orm.subqueryload, 'pools.members'),
+    (orm.subqueryload, 'pools.health_monitor'),
+    (orm.subqueryload, 'pools.session_persistence'),
+    (orm.subqueryload, 'pools.l7policies'),
+    (orm.subqueryload, 'pools._default_listeners'),
+)
+
+
+def _lb_tree_options(prefix=''):
+    """Returns the loader options for the complete tree of a load balancer
+
+    :param prefix: Path to the load balancer relationship, ending with a
+                   dot, when the query is not for load balancers
+    """
+    return tuple(strategy(prefix + path) for strategy, path in _LB_TREE)
+
 
 class BaseRepository(object):
     model_class = None
+    # Named sets of loader options that get, get_all and _query apply, so
+    # that the relationships a caller converts are loaded with a bounded
+    # number of queries instead of one lazy load per object.
+    load_profiles = {}
+
+    def _query(self, session, profile=None):
+        """Returns a query of the model class using a load profile
+
+        :param session: A Sql Alchemy database session.
+        :param profile: The name of an entry of load_profiles, or None for
+                        the default lazy loading.
+        :raises: ValueError if the profile does not exist
+        """
+        query = session.query(self.model_class)
+        if profile is None:
+            return query
+        if profile not in self.load_profiles:
+            raise ValueError("%s has no %s load profile" %
+                             (self.__class__.__name__, profile))
+        return query.options(*self.load_profiles[profile])
 
     def count(self, session, **filters):
         """Retrieves a count of entities from the database.
@@ -88,29 +141,154 @@ class BaseRepository(object):
             session.query(self.model_class).filter_by(
                 id=id).update(model_kwargs)
 
-    def get(self, session, **filters):
+    def get(self, session, relationships=None, profile=None, **filters):
         """Retrieves an entity from the database.
 
         :param session: A Sql Alchemy database session.
+        :param relationships: None to return the complete data model graph,
+                              else the names of the relationships to convert
+                              shallowly. See OctaviaBase.to_data_model.
+        :param profile: The load profile to use, see load_profiles.
         :param filters: Filters to decide which entity should be retrieved.
         :returns: octavia.common.data_model
         """
-        model = session.query(self.model_class).filter_by(**filters).first()
+        model = self._query(session, profile).filter_by(**filters).first()
         if not model:
             return
-        return model.to_data_model()
+        return model.to_data_model(relationships=relationships)
 
-    def get_all(self, session, **filters):
+    def get_all(self, session, relationships=None, compact=False,
+                profile=None, **filters):
         """Retrieves a list of entities from the database.
 
         :param session: A Sql Alchemy database session.
+        :param relationships: None to return the complete data model graphs,
+                              else the names of the relationships to convert
+                              shallowly. See OctaviaBase.to_data_model.
+        :param compact: Return read-only data models that only hold the
+                        columns, for bulk reads. See
+                        OctaviaBase.to_compact_data_models.
+        :param profile: The load profile to use, see load_profiles.
         :param filters: Filters to decide which entities should be retrieved.
         :returns: [octavia.common.data_model]
         """
-        model_list = session.query(self.model_class).filter_by(**filters).all()
-        data_model_list = [model.to_data_model() for model in model_list]
+        query = self._query(session, profile).filter_by(**filters)
+        if compact:
+            return self.model_class.to_compact_data_models(query)
+        model_list = query.all()
+        data_model_list = [model.to_data_model(relationships=relationships)
+                           for model in model_list]
         return data_model_list
 
+    def get_page(self, session, limit=None, marker=None, sort_keys=None,
+                 sort_dir='asc', fields=None, ids=None, relationships=None,
+                 compact=False, profile=None, batch_size=None, **filters):
+        """Retrieves one page of entities using keyset pagination.
+
+        The entities are ordered by the sort keys, then by id so that the
+        order is stable, and the page starts after the marker entity. The
+        sort keys must not be nullable. Pages of the entities of a project
+        are read from the (project_id, id) index with the default ordering.
+
+        :param session: A Sql Alchemy database session.
+        :param limit: The maximum number of entities to return, None for all.
+        :param marker: The id of the last entity of the previous page.
+        :param sort_keys: The columns to sort on, id when None.
+        :param sort_dir: The sort direction, 'asc' or 'desc'.
+        :param fields: The columns to load, which returns compact data
+                       models of only these columns. See
+                       OctaviaBase.to_compact_data_models.
+        :param ids: Only retrieve the entities with one of these ids.
+        :param relationships: The relationships to convert shallowly, see
+                              get_all.
+        :param compact: Return compact data models of all the columns, see
+                        get_all.
+        :param profile: The load profile to use, see load_profiles.
+        :param batch_size: When given, an iterator is returned instead of a
+                           list. Compact data models are then fetched in
+                           batches of this size from a server side cursor,
+                           other entities with one keyset paginated query
+                           per batch.
+        :param filters: Filters to decide which entities should be retrieved.
+        :returns: [octavia.common.data_model]
+        :raises: sqlalchemy.orm.exc.NoResultFound if the marker is not one of
+                 the filtered entities
+        """
+        sort_keys = list(sort_keys or ('id',))
+        if 'id' not in sort_keys:
+            sort_keys.append('id')
+        query = self._query(session, profile).filter_by(**filters)
+        if ids is not None:
+            query = query.filter(self.model_class.id.in_(ids))
+        marker_model = None
+        if marker is not None:
+            marker_model = query.filter_by(id=marker).one()
+        if batch_size and not compact and fields is None:
+            # The load profiles may use subquery eager loading, which does
+            # not work with yield_per, so the page is read in keyset
+            # paginated batches instead.
+            return self._iter_page(query, limit, sort_keys, marker_model,
+                                   sort_dir, relationships, batch_size)
+        query = db_utils.paginate_query(query, self.model_class, limit,
+                                        sort_keys, marker=marker_model,
+                                        sort_dir=sort_dir)
+        if compact or fields is not None:
+            return self.model_class.to_compact_data_models(
+                query, fields, batch_size=batch_size)
+        return [model.to_data_model(relationships=relationships)
+                for model in query]
+
+    def _iter_page(self, query, limit, sort_keys, marker_model, sort_dir,
+                   relationships, batch_size):
+        """Yields the data models of a page, batch_size rows per query."""
+        while limit is None or limit > 0:
+            size = batch_size if limit is None else min(batch_size, limit)
+            models = db_utils.paginate_query(
+                query, self.model_class, size, sort_keys,
+                marker=marker_model, sort_dir=sort_dir).all()
+            for model in models:
+                yield model.to_data_model(relationships=relationships)
+            if len(models) < size:
+                return
+            if limit is not None:
+                limit -= size
+            marker_model = models[-1]
+
+    def get_operating_statuses(self, session, ids):
+        """Retrieves the operating status of several entities in one query.
+
+        Only usable for entities that have an operating_status.
+
+        :param session: A Sql Alchemy database session.
+        :param ids: ids of the entities to look up.
+        :returns: dict of entity id to operating status. Entities that do not
+                  exist are left out.
+        """
+        if not ids:
+            return {}
+        rows = session.query(self.model_class.id,
+                             self.model_class.operating_status).filter(
+            self.model_class.id.in_(set(ids))).all()
+        return dict(rows)
+
+    def update_operating_statuses(self, session, statuses):
+        """Updates the operating status of several entities in one statement.
+
+        Only usable for entities that have an operating_status.
+
+        :param session: A Sql Alchemy database session.
+        :param statuses: dict of entity id to the new operating status.
+        :returns: None
+        """
+        if not statuses:
+            return
+        with session.begin(subtransactions=True):
+            session.query(self.model_class).filter(
+                self.model_class.id.in_(list(statuses))).update(
+                {self.model_class.operating_status: sqlalchemy.case(
+                    statuses, value=self.model_class.id)},
+                synchronize_session=False)
+
     def exists(self, session, id):
         """Determines whether an entity exists in the database by its id.
 
@@ -134,6 +312,7 @@ class Repositories(object):
         self.amphora = AmphoraRepository()
         self.sni = SNIRepository()
         self.amphorahealth = AmphoraHealthRepository()
+        self.health_manager_member = HealthManagerMemberRepository()
         self.vrrpgroup = VRRPGroupRepository()
         self.l7rule = L7RuleRepository()
         self.l7policy = L7PolicyRepository()
@@ -305,6 +484,12 @@ class Repositories(object):
 
 class LoadBalancerRepository(BaseRepository):
     model_class = models.LoadBalancer
+    load_profiles = {
+        # What the API shows for a load balancer
+        'lb_summary': (orm.joinedload('vip'),),
+        # The complete graph the controller worker converts
+        'lb_full_tree': _lb_tree_options(),
+    }
 
     def test_and_set_provisioning_status(self, session, id, status):
         """Tests and sets a load balancer and provisioning status.
@@ -393,6 +578,9 @@ class SessionPersistenceRepository(BaseRepository):
 
 class PoolRepository(BaseRepository):
     model_class = models.Pool
+    load_profiles = {
+        'pool_summary': (orm.joinedload('session_persistence'),),
+    }
 
 
 class MemberRepository(BaseRepository):
@@ -405,6 +593,11 @@ class MemberRepository(BaseRepository):
 
 class ListenerRepository(BaseRepository):
     model_class = models.Listener
+    load_profiles = {
+        'listener_summary': (orm.subqueryload('sni_containers'),),
+        'listener_full_tree': ((orm.joinedload('load_balancer'),) +
+                               _lb_tree_options('load_balancer.')),
+    }
 
     def _find_next_peer_port(self, session, lb_id):
         """Finds the next available peer port on the load balancer."""
@@ -556,6 +749,65 @@ class AmphoraRepository(BaseRepository):
             data_model_list = [model.to_data_model() for model in lb_list]
             return data_model_list
 
+    def get_lb_and_listener_count(self, session, amphora_id):
+        """Get the load balancer of an amphora and its listener count.
+
+        Both are looked up with one aggregate query, without loading the
+        load balancer graph.
+
+        :param session: A Sql Alchemy database session.
+        :param amphora_id: The amphora id to look up
+        :returns: tuple of (load_balancer_id, listener_count).
+                  (None, 0) if the amphora does not exist.
+        """
+        with session.begin(subtransactions=True):
+            row = (session.query(self.model_class.load_balancer_id,
+                                 sqlalchemy.func.count(models.Listener.id)).
+                   outerjoin(models.Listener,
+                             models.Listener.load_balancer_id ==
+                             self.model_class.load_balancer_id).
+                   filter(self.model_class.id == amphora_id).
+                   group_by(self.model_class.load_balancer_id).first())
+        if row is None:
+            return None, 0
+        return row[0], row[1]
+
+    def get_failover_details(self, session, amphora_ids):
+        """Get the role and the healthy peers of amphorae to fail over.
+
+        :param session: A Sql Alchemy database session.
+        :param amphora_ids: The ids of the amphorae to look up
+        :returns: dict of amphora id to (role, healthy_peers), where
+                  healthy_peers is the number of amphorae of the same load
+                  balancer that are neither stale nor being failed over.
+                  Amphorae that do not exist are left out.
+        """
+        if not amphora_ids:
+            return {}
+        expired_time = datetime.datetime.utcnow() - datetime.timedelta(
+            seconds=CONF.health_manager.heartbeat_timeout)
+        with session.begin(subtransactions=True):
+            rows = session.query(
+                self.model_class.id, self.model_class.role,
+                self.model_class.load_balancer_id).filter(
+                self.model_class.id.in_(amphora_ids)).all()
+            lb_ids = set(row.load_balancer_id for row in rows
+                         if row.load_balancer_id is not None)
+            healthy = {}
+            if lb_ids:
+                healthy = dict(session.query(
+                    self.model_class.load_balancer_id,
+                    sqlalchemy.func.count(self.model_class.id)).join(
+                    models.AmphoraHealth,
+                    models.AmphoraHealth.amphora_id ==
+                    self.model_class.id).filter(
+                    self.model_class.load_balancer_id.in_(lb_ids)).filter(
+                    sqlalchemy.not_(models.AmphoraHealth.busy)).filter(
+                    models.AmphoraHealth.last_update >= expired_time).group_by(
+                    self.model_class.load_balancer_id).all())
+        return dict((row.id, (row.role, healthy.get(row.load_balancer_id, 0)))
+                    for row in rows)
+
     def get_spare_amphora_count(self, session):
         """Get the count of the spare amphora.
 
@@ -646,7 +898,8 @@ class AmphoraHealthRepository(BaseRepository):
                 seconds=CONF.house_keeping.amphora_expiry_age)
 
         timestamp = datetime.datetime.utcnow() - exp_age
-        amphora_health = self.get(session, amphora_id=amphora_id)
+        amphora_health = self.get(session, relationships=(),
+                                  amphora_id=amphora_id)
         if amphora_health is not None:
             return amphora_health.last_update < timestamp
         else:
@@ -676,6 +929,106 @@ class AmphoraHealthRepository(BaseRepository):
 
         return amp.to_data_model()
 
+    def get_stale_amphora_ids(self, session):
+        """Retrieves the ids of all stale amphorae without claiming them.
+
+        :param session: A Sql Alchemy database session.
+        :returns: list of amphora ids, the longest stale first
+        """
+
+        timeout = CONF.health_manager.heartbeat_timeout
+        expired_time = datetime.datetime.utcnow() - datetime.timedelta(
+            seconds=timeout)
+
+        rows = session.query(self.model_class.amphora_id).filter_by(
+            busy=False).filter(
+            self.model_class.last_update < expired_time).order_by(
+            self.model_class.last_update).all()
+        return [row.amphora_id for row in rows]
+
+    def get_stale_amphorae(self, session, limit, amphora_ids=None):
+        """Claims a batch of stale amphorae from the health manager database.
+
+        Up to limit stale amphorae, the longest stale first, are locked with
+        one query and marked busy with one update, so concurrent health
+        managers never claim the same amphora.
+
+        :param session: A Sql Alchemy database session.
+        :param limit: The maximum number of amphorae to claim.
+        :param amphora_ids: Only claim amphorae from these ids.
+        :returns: list of the claimed amphora ids
+        """
+
+        timeout = CONF.health_manager.heartbeat_timeout
+        expired_time = datetime.datetime.utcnow() - datetime.timedelta(
+            seconds=timeout)
+
+        with session.begin(subtransactions=True):
+            query = session.query(
+                self.model_class.amphora_id).with_for_update().filter_by(
+                busy=False).filter(
+                self.model_class.last_update < expired_time)
+            if amphora_ids is not None:
+                query = query.filter(
+                    self.model_class.amphora_id.in_(amphora_ids))
+            rows = query.order_by(
+                self.model_class.last_update).limit(limit).all()
+            amphora_ids = [row.amphora_id for row in rows]
+
+            if not amphora_ids:
+                return []
+
+            session.query(self.model_class).filter(
+                self.model_class.amphora_id.in_(amphora_ids)).filter_by(
+                busy=False).update({'busy': True}, synchronize_session=False)
+
+        return amphora_ids
+
+
+class HealthManagerMemberRepository(BaseRepository):
+    model_class = models.HealthManagerMember
+
+    def replace(self, session, member_id, **model_kwargs):
+        """replace or insert health manager member into database."""
+        with session.begin(subtransactions=True):
+            count = session.query(self.model_class).filter_by(
+                member_id=member_id).count()
+            if count:
+                session.query(self.model_class).filter_by(
+                    member_id=member_id).update(model_kwargs,
+                                                synchronize_session=False)
+            else:
+                model_kwargs['member_id'] = member_id
+                self.create(session, **model_kwargs)
+
+    def get_live_members(self, session, timeout):
+        """Retrieves the health managers that checked in recently.
+
+        :param session: A Sql Alchemy database session.
+        :param timeout: Seconds after which a member is no longer live.
+        :returns: sorted list of member ids
+        """
+        expired_time = datetime.datetime.utcnow() - datetime.timedelta(
+            seconds=timeout)
+        rows = session.query(self.model_class.member_id).filter(
+            self.model_class.last_update >= expired_time).order_by(
+            self.model_class.member_id).all()
+        return [row.member_id for row in rows]
+
+    def delete_expired(self, session, timeout):
+        """Deletes the health managers that stopped checking in.
+
+        :param session: A Sql Alchemy database session.
+        :param timeout: Seconds after which a member is no longer live.
+        :returns: None
+        """
+        expired_time = datetime.datetime.utcnow() - datetime.timedelta(
+            seconds=timeout)
+        with session.begin(subtransactions=True):
+            session.query(self.model_class).filter(
+                self.model_class.last_update < expired_time).delete(
+                synchronize_session=False)
+
 
 class VRRPGroupRepository(BaseRepository):
     model_class = models.VRRPGroup
@@ -751,10 +1104,15 @@ class L7PolicyRepository(BaseRepository):
             self._pool_check(session, l7policy.redirect_pool_id,
                              listener.load_balancer_id, listener.project_id)
 
-    def get_all(self, session, **filters):
-        l7policy_list = session.query(self.model_class).filter_by(
-            **filters).order_by(self.model_class.position).all()
-        data_model_list = [p.to_data_model() for p in l7policy_list]
+    def get_all(self, session, relationships=None, compact=False,
+                profile=None, **filters):
+        query = self._query(session, profile).filter_by(
+            **filters).order_by(self.model_class.position)
+        if compact:
+            return self.model_class.to_compact_data_models(query)
+        l7policy_list = query.all()
+        data_model_list = [p.to_data_model(relationships=relationships)
+                           for p in l7policy_list]
         return data_model_list
 
     def update(self, session, id, **model_kwargs):
@@ -19,8 +19,11 @@ import socket
 import stat
 import subprocess
 
+import fixtures
 import mock
 import netifaces
+from oslo_config import cfg
+from oslo_config import fixture as oslo_fixture
 import six
 
 from octavia.amphorae.backends.agent import api_server
@@ -139,6 +142,277 @@ class ServerTestCase(base.TestCase):
                 stderr=-2)
             mock_remove.assert_called_once_with(file_name)
 
+    @mock.patch('os.path.exists')
+    @mock.patch('os.makedirs')
+    @mock.patch('os.rename')
+    @mock.patch('subprocess.check_output')
+    @mock.patch('os.remove')
+    @mock.patch('octavia.amphorae.backends.agent.api_server.listener.'
+                'vrrp_check_script_update')
+    @mock.patch('octavia.amphorae.backends.agent.api_server.listener.'
+                '_check_listener_status')
+    @mock.patch('octavia.amphorae.backends.agent.api_server.listener.'
+                '_running_config_md5', return_value=None)
+    @mock.patch('octavia.amphorae.backends.agent.api_server.listener.'
+                '_record_applied_config')
+    def test_haproxy_configs(self, mock_record, mock_md5, mock_status,
+                             mock_vrrp, mock_remove, mock_subprocess,
+                             mock_rename, mock_makedirs, mock_exists):
+        mock_exists.return_value = True
+        mock_status.side_effect = [consts.ACTIVE, consts.OFFLINE]
+        peer = octavia_utils.base64_sha1_string('amp_123').rstrip('=')
+        m = self.useFixture(test_utils.OpenFixture(
+            '/var/lib/octavia/123/haproxy.cfg.new')).mock_open
+
+        # happy case, one listener reloaded and one started
+        with mock.patch('os.open'), mock.patch.object(os, 'fdopen', m):
+            rv = self.app.put(
+                '/' + api_server.VERSION + '/haproxy/amp_123',
+                data={'123': (six.BytesIO(six.b('test1')), '123'),
+                      '456': (six.BytesIO(six.b('test2')), '456')},
+                content_type='multipart/form-data')
+        self.assertEqual(202, rv.status_code)
+        self.assertEqual(
+            {'message': 'OK',
+             'listeners': {
+                 '123': hashlib.md5(six.b('test1')).hexdigest(),
+                 '456': hashlib.md5(six.b('test2')).hexdigest()}},
+            json.loads(rv.data.decode('utf-8')))
+        for listener_id in ('123', '456'):
+            mock_subprocess.assert_any_call(
+                "haproxy -c -L {peer} -f {config_file}".format(
+                    config_file='/var/lib/octavia/{0}/haproxy.cfg.new'.format(
+                        listener_id), peer=peer).split(), stderr=-2)
+        mock_rename.assert_has_calls([
+            mock.call('/var/lib/octavia/{0}/haproxy.cfg.new'.format(l_id),
+                      '/var/lib/octavia/{0}/haproxy.cfg'.format(l_id))
+            for l_id in ('123', '456')], any_order=True)
+        mock_subprocess.assert_any_call(
+            ['/usr/sbin/service', 'haproxy-123', 'reload'], stderr=-2)
+        mock_subprocess.assert_any_call(
+            ['/usr/sbin/service', 'haproxy-456', 'start'], stderr=-2)
+        self.assertEqual(1, mock_vrrp.call_count)
+        mock_remove.assert_not_called()
+        mock_record.assert_has_calls([mock.call('123'), mock.call('456')],
+                                     any_order=True)
+
+        # unhappy case, one config fails the check and nothing is applied
+        mock_rename.reset_mock()
+        mock_subprocess.reset_mock()
+        mock_subprocess.side_effect = [
+            None, subprocess.CalledProcessError(7, 'test', RANDOM_ERROR)]
+        with mock.patch('os.open'), mock.patch.object(os, 'fdopen', m):
+            rv = self.app.put(
+                '/' + api_server.VERSION + '/haproxy/amp_123',
+                data={'123': (six.BytesIO(six.b('test1')), '123'),
+                      '456': (six.BytesIO(six.b('test2')), '456')},
+                content_type='multipart/form-data')
+        self.assertEqual(400, rv.status_code)
+        self.assertEqual(
+            {'message': 'Invalid request', 'details': RANDOM_ERROR},
+            json.loads(rv.data.decode('utf-8')))
+        self.assertEqual(2, mock_remove.call_count)
+        mock_rename.assert_not_called()
+        self.assertEqual(2, mock_subprocess.call_count)
+
+        # unhappy case, an init script fails and no config is renamed
+        conf = self.useFixture(oslo_fixture.Config(cfg.CONF))
+        conf.config(group='haproxy_amphora', use_upstart=False)
+        mock_remove.reset_mock()
+        mock_subprocess.reset_mock()
+        mock_subprocess.side_effect = [
+            None, None, None,
+            subprocess.CalledProcessError(7, 'test', RANDOM_ERROR)]
+        with mock.patch('os.open'), mock.patch.object(os, 'fdopen', m):
+            rv = self.app.put(
+                '/' + api_server.VERSION + '/haproxy/amp_123',
+                data={'123': (six.BytesIO(six.b('test1')), '123'),
+                      '456': (six.BytesIO(six.b('test2')), '456')},
+                content_type='multipart/form-data')
+        self.assertEqual(500, rv.status_code)
+        self.assertEqual(2, mock_remove.call_count)
+        mock_rename.assert_not_called()
+        self.assertEqual(4, mock_subprocess.call_count)
+
+        # no configuration uploaded
+        rv = self.app.put('/' + api_server.VERSION + '/haproxy/amp_123')
+        self.assertEqual(400, rv.status_code)
+
+        # invalid listener id
+        with mock.patch('os.open'), mock.patch.object(os, 'fdopen', m):
+            rv = self.app.put(
+                '/' + api_server.VERSION + '/haproxy/amp_123',
+                data={'../123': (six.BytesIO(six.b('test1')), '123')},
+                content_type='multipart/form-data')
+        self.assertEqual(400, rv.status_code)
+
+    @mock.patch('os.path.exists')
+    @mock.patch('os.makedirs')
+    @mock.patch('os.rename')
+    @mock.patch('subprocess.check_output')
+    @mock.patch('os.remove')
+    @mock.patch('octavia.amphorae.backends.agent.api_server.listener.'
+                'vrrp_check_script_update')
+    @mock.patch('octavia.amphorae.backends.agent.api_server.listener.'
+                '_check_listener_status')
+    @mock.patch('octavia.amphorae.backends.agent.api_server.listener.'
+                '_running_config_md5')
+    @mock.patch('octavia.amphorae.backends.agent.api_server.listener.'
+                '_record_applied_config')
+    def test_haproxy_unchanged(self, mock_record, mock_md5, mock_status,
+                               mock_vrrp, mock_remove, mock_subprocess,
+                               mock_rename, mock_makedirs, mock_exists):
+        mock_exists.return_value = True
+        md5 = hashlib.md5(six.b('test1')).hexdigest()
+        mock_md5.side_effect = lambda listener_id: {'123': md5}.get(
+            listener_id)
+        mock_status.return_value = consts.OFFLINE
+
+        # the listener already runs with the config
+        with mock.patch('os.open') as mock_open:
+            rv = self.app.put('/' + api_server.VERSION +
+                              '/listeners/amp_123/123/haproxy',
+                              data='test1',
+                              headers={'If-None-Match': '"%s"' % md5})
+        self.assertEqual(304, rv.status_code)
+        self.assertEqual(md5, rv.headers['ETag'].strip('"'))
+        mock_open.assert_not_called()
+        mock_subprocess.assert_not_called()
+
+        # only the changed listener is checked and started
+        m = self.useFixture(test_utils.OpenFixture(
+            '/var/lib/octavia/456/haproxy.cfg.new')).mock_open
+        with mock.patch('os.open'), mock.patch.object(os, 'fdopen', m):
+            rv = self.app.put(
+                '/' + api_server.VERSION + '/haproxy/amp_123',
+                data={'123': (six.BytesIO(six.b('test1')), '123'),
+                      '456': (six.BytesIO(six.b('test2')), '456')},
+                content_type='multipart/form-data')
+        self.assertEqual(202, rv.status_code)
+        mock_remove.assert_called_once_with(
+            '/var/lib/octavia/123/haproxy.cfg.new')
+        mock_rename.assert_called_once_with(
+            '/var/lib/octavia/456/haproxy.cfg.new',
+            '/var/lib/octavia/456/haproxy.cfg')
+        mock_subprocess.assert_called_with(
+            ['/usr/sbin/service', 'haproxy-456', 'start'], stderr=-2)
+        self.assertEqual(2, mock_subprocess.call_count)
+        mock_record.assert_called_once_with('456')
+
+        # nothing changed
+        mock_remove.reset_mock()
+        mock_subprocess.reset_mock()
+        mock_vrrp.reset_mock()
+        with mock.patch('os.open'), mock.patch.object(os, 'fdopen', m):
+            rv = self.app.put(
+                '/' + api_server.VERSION + '/haproxy/amp_123',
+                data={'123': (six.BytesIO(six.b('test1')), '123')},
+                content_type='multipart/form-data')
+        self.assertEqual(202, rv.status_code)
+        mock_remove.assert_called_once_with(
+            '/var/lib/octavia/123/haproxy.cfg.new')
+        mock_subprocess.assert_not_called()
+        mock_vrrp.assert_not_called()
+
+    @mock.patch('subprocess.check_output')
+    @mock.patch('octavia.amphorae.backends.agent.api_server.listener.'
+                '_install_init_script', return_value=None)
+    @mock.patch('octavia.amphorae.backends.agent.api_server.listener.'
+                '_check_listener_status', return_value=consts.ACTIVE)
+    @mock.patch('octavia.amphorae.backends.agent.api_server.listener.'
+                '_write_haproxy_config')
+    def test_haproxy_applied_config(self, mock_write, mock_status, mock_init,
+                                    mock_subprocess):
+        conf = self.useFixture(oslo_fixture.Config(cfg.CONF))
+        conf.config(group='haproxy_amphora',
+                    base_path=self.useFixture(fixtures.TempDir()).path,
+                    base_cert_dir=self.useFixture(fixtures.TempDir()).path)
+        os.makedirs(util.haproxy_dir('123'))
+        cert_dir = os.path.join(cfg.CONF.haproxy_amphora.base_cert_dir, '123')
+        os.makedirs(cert_dir)
+
+        def write_cert(name, pem):
+            # as update_certificates does, the config does not change
+            with open(os.path.join(cert_dir, name), 'w') as file:
+                file.write(pem)
+
+        def write_config(listener_id, stream):
+            name = util.config_path(listener_id) + '.new'
+            with open(name, 'wb') as file:
+                file.write(stream.read(-1))
+            return name
+        mock_write.side_effect = write_config
+        md5 = dict((config, hashlib.md5(six.b(config)).hexdigest())
+                   for config in ('test1', 'test2'))
+
+        def upload(config):
+            return self.app.put(
+                '/' + api_server.VERSION + '/listeners/amp_123/123/haproxy',
+                data=config, headers={'If-None-Match': '"%s"' % md5[config]})
+
+        def reload():
+            return self.app.put(
+                '/' + api_server.VERSION + '/listeners/123/reload')
+
+        def upload_all(config):
+            return self.app.put(
+                '/' + api_server.VERSION + '/haproxy/amp_123',
+                data={'123': (six.BytesIO(six.b(config)), '123')},
+                content_type='multipart/form-data')
+
+        # an installed config is not running until haproxy is reloaded
+        self.assertEqual(202, upload('test1').status_code)
+        self.assertEqual(202, upload('test1').status_code)
+        self.assertEqual(202, reload().status_code)
+        self.assertEqual(304, upload('test1').status_code)
+
+        # a config that haproxy failed to reload with is uploaded again
+        self.assertEqual(202, upload('test2').status_code)
+        mock_subprocess.side_effect = subprocess.CalledProcessError(
+            7, 'test', RANDOM_ERROR)
+        self.assertEqual(500, reload().status_code)
+        mock_subprocess.side_effect = None
+        self.assertEqual(202, upload('test2').status_code)
+        self.assertEqual(202, reload().status_code)
+        self.assertEqual(304, upload('test2').status_code)
+
+        # a failed reload of several listeners is retried as well
+        mock_subprocess.side_effect = [
+            None, subprocess.CalledProcessError(7, 'test', RANDOM_ERROR)]
+        self.assertEqual(500, upload_all('test1').status_code)
+        mock_subprocess.side_effect = None
+        mock_subprocess.reset_mock()
+        self.assertEqual(202, upload_all('test1').status_code)
+        mock_subprocess.assert_called_with(
+            ['/usr/sbin/service', 'haproxy-123', 'reload'], stderr=-2)
+        mock_subprocess.reset_mock()
+        self.assertEqual(202, upload_all('test1').status_code)
+        mock_subprocess.assert_not_called()
+        self.assertEqual(304, upload('test1').status_code)
+
+        # a renewed certificate with the same CN is applied with a reload
+        write_cert('www.example.com.pem', 'cert1')
+        self.assertEqual(202, upload('test1').status_code)
+        self.assertEqual(202, reload().status_code)
+        self.assertEqual(304, upload('test1').status_code)
+        write_cert('www.example.com.pem', 'cert2')
+        mock_subprocess.reset_mock()
+        self.assertEqual(202, upload_all('test1').status_code)
+        mock_subprocess.assert_called_with(
+            ['/usr/sbin/service', 'haproxy-123', 'reload'], stderr=-2)
+        self.assertEqual(304, upload('test1').status_code)
+
+        # so is a removed SNI certificate
+        write_cert('sni.example.com.pem', 'cert3')
+        self.assertEqual(202, reload().status_code)
+        self.assertEqual(304, upload('test1').status_code)
+        os.remove(os.path.join(cert_dir, 'sni.example.com.pem'))
+        self.assertEqual(202, upload('test1').status_code)
+
+        # a listener that is not running does not run any config
+        mock_status.return_value = consts.OFFLINE
+        self.assertEqual(202, upload('test1').status_code)
+
     @mock.patch('os.path.exists')
     @mock.patch('octavia.amphorae.backends.agent.api_server.listener.'
                 'vrrp_check_script_update')
@@ -473,6 +747,72 @@ class ServerTestCase(base.TestCase):
             handle.write.assert_called_once_with(six.b('TestTest'))
             mock_makedir.assert_called_once_with('/var/lib/octavia/certs/123')
 
+    @mock.patch('os.path.exists')
+    @mock.patch('os.listdir')
+    def test_get_certificates_md5(self, mock_listdir, mock_exists):
+        CONTENT = "TestTest"
+
+        # no certificate directory
+        mock_exists.return_value = False
+        rv = self.app.get('/' + api_server.VERSION + '/certificates/123')
+        self.assertEqual(200, rv.status_code)
+        self.assertEqual({'certificates': {}},
+                         json.loads(rv.data.decode('utf-8')))
+
+        mock_exists.return_value = True
+        mock_listdir.return_value = ['test.pem', 'test.bla']
+        path = listener._cert_file_path('123', 'test.pem')
+        self.useFixture(test_utils.OpenFixture(path, CONTENT))
+        rv = self.app.get('/' + api_server.VERSION + '/certificates/123')
+        self.assertEqual(200, rv.status_code)
+        self.assertEqual(
+            {'certificates': {
+                'test.pem': hashlib.md5(six.b(CONTENT)).hexdigest()}},
+            json.loads(rv.data.decode('utf-8')))
+        mock_listdir.assert_called_once_with('/var/lib/octavia/certs/123')
+
+    @mock.patch('os.path.exists')
+    @mock.patch('os.makedirs')
+    @mock.patch('os.remove')
+    def test_update_certificates(self, mock_remove, mock_makedir,
+                                 mock_exists):
+        # wrong file names
+        for name in ('test.bla', '../../test.pem'):
+            rv = self.app.put(
+                '/' + api_server.VERSION + '/certificates/123',
+                data={name: (six.BytesIO(six.b('TestTest')), name)},
+                content_type='multipart/form-data')
+            self.assertEqual(400, rv.status_code)
+        rv = self.app.put('/' + api_server.VERSION + '/certificates/123',
+                          data={'delete': ['test.bla']})
+        self.assertEqual(400, rv.status_code)
+        mock_remove.assert_not_called()
+
+        mock_exists.side_effect = lambda path: path.endswith('old.pem')
+        path = listener._cert_file_path('123', 'test.pem')
+        m = self.useFixture(test_utils.OpenFixture(path)).mock_open
+        with mock.patch('os.open') as mock_open, mock.patch.object(
+                os, 'fdopen', m):
+            rv = self.app.put(
+                '/' + api_server.VERSION + '/certificates/123',
+                data={'test.pem': (six.BytesIO(six.b('TestTest')),
+                                   'test.pem'),
+                      'delete': ['old.pem', 'gone.pem']},
+                content_type='multipart/form-data')
+        self.assertEqual(200, rv.status_code)
+        self.assertEqual(
+            {'message': 'OK',
+             'certificates': {
+                 'test.pem': hashlib.md5(six.b('TestTest')).hexdigest()}},
+            json.loads(rv.data.decode('utf-8')))
+        mock_makedir.assert_called_once_with('/var/lib/octavia/certs/123')
+        mock_open.assert_called_once_with(
+            path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC,
+            stat.S_IRUSR | stat.S_IWUSR)
+        m().write.assert_called_once_with(six.b('TestTest'))
+        mock_remove.assert_called_once_with(
+            listener._cert_file_path('123', 'old.pem'))
+
     def test_upload_server_certificate(self):
         certificate_update.BUFFER = 5  # test the while loop
         path = '/etc/octavia/certs/server.pem'
@@ -15,6 +15,8 @@
 import copy
 
 import mock
+from oslo_config import cfg
+from oslo_config import fixture as oslo_fixture
 from oslo_utils import uuidutils
 
 from octavia.common import constants
@@ -74,6 +76,54 @@ class TestLoadBalancer(base.BaseAPITest):
         self.assertIn((lb2.get('id'), lb2.get('name')), lb_id_names)
         self.assertIn((lb3.get('id'), lb3.get('name')), lb_id_names)
 
+    def test_get_all_paginated(self):
+        project_id = uuidutils.generate_uuid()
+        lb_ids = sorted(
+            self.create_load_balancer({}, name='lb%d' % i,
+                                      project_id=project_id).get('id')
+            for i in range(3))
+        response = self.get(self.LBS_PATH, params={'project_id': project_id,
+                                                   'limit': 2})
+        self.assertEqual(lb_ids[:2], [lb.get('id') for lb in response.json])
+        response = self.get(self.LBS_PATH, params={'project_id': project_id,
+                                                   'limit': 2,
+                                                   'marker': lb_ids[1]})
+        self.assertEqual(lb_ids[2:], [lb.get('id') for lb in response.json])
+
+    def test_get_all_pagination_max_limit(self):
+        conf = self.useFixture(oslo_fixture.Config(cfg.CONF))
+        conf.config(pagination_max_limit='2')
+        for i in range(3):
+            self.create_load_balancer({}, name='lb%d' % i)
+        response = self.get(self.LBS_PATH)
+        self.assertEqual(2, len(response.json))
+        response = self.get(self.LBS_PATH, params={'limit': 10})
+        self.assertEqual(2, len(response.json))
+
+    def test_get_all_pagination_not_allowed(self):
+        conf = self.useFixture(oslo_fixture.Config(cfg.CONF))
+        conf.config(allow_pagination=False)
+        for i in range(3):
+            self.create_load_balancer({}, name='lb%d' % i)
+        response = self.get(self.LBS_PATH, params={'limit': 1})
+        self.assertEqual(3, len(response.json))
+
+    def test_get_all_sorted(self):
+        lb_ids = sorted(self.create_load_balancer({}, name='lb%d' % i).get(
+            'id') for i in range(3))
+        response = self.get(self.LBS_PATH, params={'sort_key': 'id',
+                                                   'sort_dir': 'desc'})
+        self.assertEqual(lb_ids[::-1],
+                         [lb.get('id') for lb in response.json])
+        self.get(self.LBS_PATH, params={'sort_key': 'name'}, status=400)
+
+    def test_get_all_fields(self):
+        lb = self.create_load_balancer({}, name='lb1')
+        response = self.get(self.LBS_PATH, params={'fields': 'id,name'})
+        self.assertEqual([{'id': lb.get('id'), 'name': 'lb1'}],
+                         response.json)
+        self.get(self.LBS_PATH, params={'fields': 'vip'}, status=400)
+
     def test_get_all_by_project_id(self):
         project1_id = uuidutils.generate_uuid()
         project2_id = uuidutils.generate_uuid()
@@ -13,6 +13,8 @@
 #    under the License.
 
 import mock
+from oslo_config import cfg
+from oslo_config import fixture as oslo_fixture
 from oslo_utils import uuidutils
 
 from octavia.common import constants
@@ -82,6 +84,78 @@ class TestMember(base.BaseAPITest):
         self.assertIn(api_m_1, response_body)
         self.assertIn(api_m_2, response_body)
 
+    def test_get_all_paginated(self):
+        member_ids = []
+        for i in range(3):
+            member_ids.append(self.create_member(
+                self.lb.get('id'), self.pool.get('id'),
+                '10.0.0.%d' % (i + 1), 80).get('id'))
+            self.set_lb_status(self.lb.get('id'))
+        member_ids.sort()
+        response = self.get(self.members_path, params={'limit': 2})
+        self.assertEqual(member_ids[:2], [m['id'] for m in response.json])
+        response = self.get(self.members_path,
+                            params={'limit': 2, 'marker': member_ids[1]})
+        self.assertEqual(member_ids[2:], [m['id'] for m in response.json])
+
+    def test_get_all_sorted(self):
+        for i in range(3):
+            self.create_member(self.lb.get('id'), self.pool.get('id'),
+                               '10.0.0.%d' % (i + 1), 80)
+            self.set_lb_status(self.lb.get('id'))
+        response = self.get(self.members_path,
+                            params={'sort_key': 'ip_address',
+                                    'sort_dir': 'desc'})
+        self.assertEqual(['10.0.0.3', '10.0.0.2', '10.0.0.1'],
+                         [m['ip_address'] for m in response.json])
+
+    def test_get_all_fields(self):
+        api_member = self.create_member(self.lb.get('id'),
+                                        self.pool.get('id'),
+                                        '10.0.0.1', 80)
+        response = self.get(self.members_path,
+                            params={'fields': 'id,ip_address'})
+        self.assertEqual([{'id': api_member.get('id'),
+                           'ip_address': '10.0.0.1'}], response.json)
+
+    def test_get_all_streamed(self):
+        for i in range(3):
+            self.create_member(self.lb.get('id'), self.pool.get('id'),
+                               '10.0.0.%d' % (i + 1), 80)
+            self.set_lb_status(self.lb.get('id'))
+        conf = self.useFixture(oslo_fixture.Config(cfg.CONF))
+        conf.config(list_stream_batch_size=2)
+        streamed = self.get(self.members_path, params={'sort_key': 'id'})
+        conf.config(list_stream_batch_size=0)
+        built = self.get(self.members_path, params={'sort_key': 'id'})
+        self.assertEqual('application/json', streamed.content_type)
+        self.assertEqual(3, len(streamed.json))
+        self.assertEqual(built.body, streamed.body)
+
+        # Only JSON is streamed
+        conf.config(list_stream_batch_size=2)
+        response = self.get(self.members_path,
+                            headers={'Accept': 'application/xml'})
+        self.assertEqual('application/xml', response.content_type)
+        self.assertEqual(3, response.body.count(b'<item>'))
+
+    def test_get_all_streamed_error(self):
+        self.create_member(self.lb.get('id'), self.pool.get('id'),
+                           '10.0.0.1', 80)
+        self.set_lb_status(self.lb.get('id'))
+        conf = self.useFixture(oslo_fixture.Config(cfg.CONF))
+        conf.config(list_stream_batch_size=2)
+        # An error in the first batch is sent before the status
+        with mock.patch('octavia.api.v1.types.member.MemberResponse.'
+                        'from_data_model', side_effect=ValueError):
+            self.get(self.members_path, status=500)
+
+    def test_get_all_bad_options(self):
+        for params in ({'limit': 0}, {'marker': uuidutils.generate_uuid()},
+                       {'sort_key': 'pool'}, {'sort_dir': 'up'},
+                       {'fields': 'id,pool_id'}):
+            self.get(self.members_path, params=params, status=400)
+
     def test_empty_get_all(self):
         response = self.get(self.members_path)
         response_body = response.json
@@ -332,6 +406,103 @@ class TestMember(base.BaseAPITest):
                                             constants.PENDING_UPDATE,
                                             constants.ERROR)
 
+    def test_batch(self):
+        api_m_1 = self.create_member_with_listener(
+            self.lb.get('id'), self.listener.get('id'),
+            self.pool_with_listener.get('id'), '10.0.0.1', 80)
+        self.set_lb_status(self.lb.get('id'))
+        api_m_2 = self.create_member_with_listener(
+            self.lb.get('id'), self.listener.get('id'),
+            self.pool_with_listener.get('id'), '10.0.0.2', 80)
+        self.set_lb_status(self.lb.get('id'))
+        members_path = self.MEMBERS_PATH.format(
+            lb_id=self.lb.get('id'),
+            pool_id=self.pool_with_listener.get('id'))
+        body = {'create': [{'ip_address': '10.0.0.3', 'protocol_port': 80},
+                           {'ip_address': '10.0.0.4', 'protocol_port': 80}],
+                'update': [{'id': api_m_1.get('id'), 'weight': 5}],
+                'delete': [api_m_2.get('id')]}
+        response = self.post(members_path + '/batch', body)
+        self.assertEqual(
+            ['10.0.0.1', '10.0.0.3', '10.0.0.4'],
+            sorted(m.get('ip_address') for m in response.json))
+        self.assert_correct_lb_status(self.lb.get('id'),
+                                      constants.PENDING_UPDATE,
+                                      constants.ONLINE)
+        self.assert_correct_listener_status(self.lb.get('id'),
+                                            self.listener.get('id'),
+                                            constants.PENDING_UPDATE,
+                                            constants.ONLINE)
+        batch_update = self.handler_mock().member.batch_update
+        self.assertEqual(1, batch_update.call_count)
+        new_members, updated_members, deleted_members = (
+            batch_update.call_args[0])
+        self.assertEqual(['10.0.0.3', '10.0.0.4'],
+                         sorted(m.ip_address for m in new_members))
+        self.assertEqual(1, len(updated_members))
+        self.assertEqual(api_m_1.get('id'), updated_members[0][0].id)
+        self.assertEqual(5, updated_members[0][1].weight)
+        self.assertEqual([api_m_2.get('id')],
+                         [m.id for m in deleted_members])
+
+    def test_batch_empty(self):
+        response = self.post(self.members_path + '/batch', {})
+        self.assertEqual([], response.json)
+        self.assertFalse(self.handler_mock().member.batch_update.called)
+        self.assert_correct_lb_status(self.lb.get('id'),
+                                      constants.ACTIVE,
+                                      constants.ONLINE)
+
+    def test_batch_unknown_member(self):
+        self.post(self.members_path + '/batch',
+                  {'delete': [uuidutils.generate_uuid()]}, status=404)
+        self.assert_correct_lb_status(self.lb.get('id'),
+                                      constants.ACTIVE,
+                                      constants.ONLINE)
+
+    def test_batch_same_member_twice(self):
+        api_member = self.create_member(self.lb.get('id'),
+                                        self.pool.get('id'),
+                                        '10.0.0.1', 80)
+        self.set_lb_status(self.lb.get('id'))
+        self.post(self.members_path + '/batch',
+                  {'update': [{'id': api_member.get('id'), 'weight': 5}],
+                   'delete': [api_member.get('id')]}, status=400)
+
+    def test_batch_duplicate_create(self):
+        self.create_member(self.lb.get('id'), self.pool.get('id'),
+                           '10.0.0.1', 80)
+        self.set_lb_status(self.lb.get('id'))
+        body = {'create': [{'ip_address': '10.0.0.2', 'protocol_port': 80},
+                           {'ip_address': '10.0.0.1', 'protocol_port': 80}]}
+        self.post(self.members_path + '/batch', body, status=409)
+        self.assert_correct_lb_status(self.lb.get('id'),
+                                      constants.ACTIVE,
+                                      constants.ONLINE)
+        response = self.get(self.members_path)
+        self.assertEqual(['10.0.0.1'],
+                         [m.get('ip_address') for m in response.json])
+
+    def test_batch_with_bad_handler(self):
+        members_path = self.MEMBERS_PATH.format(
+            lb_id=self.lb.get('id'),
+            pool_id=self.pool_with_listener.get('id'))
+        self.handler_mock().member.batch_update.side_effect = Exception()
+        self.post(members_path + '/batch',
+                  {'create': [{'ip_address': '10.0.0.1',
+                               'protocol_port': 80}]})
+        self.assert_correct_listener_status(self.lb.get('id'),
+                                            self.listener.get('id'),
+                                            constants.PENDING_UPDATE,
+                                            constants.ERROR)
+
+    def test_batch_when_lb_pending_update(self):
+        self.put(self.LB_PATH.format(lb_id=self.lb.get('id')),
+                 body={'name': 'test_name_change'})
+        self.post(self.members_path + '/batch',
+                  {'create': [{'ip_address': '10.0.0.1',
+                               'protocol_port': 80}]}, status=409)
+
     def test_create_when_lb_pending_update(self):
         self.create_member(self.lb.get('id'),
                            self.pool.get('id'), ip_address="10.0.0.2",
@@ -945,6 +945,37 @@ class TestDataModelConversionTest(base.OctaviaDBTestBase, ModelTestMixin):
         self.assertEqual(lb_graph_count, p_graph_count)
         self.assertEqual(lb_graph_count, mem_graph_count)
 
+    def test_conversion_metadata(self):
+        self.assertIn('listeners', models.Pool._relationship_names)
+        self.assertIn('members', models.Pool._relationship_names)
+        self.assertIn('sni_containers', models.Listener._relationship_names)
+        self.assertNotIn('_default_listeners',
+                         models.Pool._relationship_names)
+        self.assertIn('ip_address', models.Member._column_names)
+        self.assertEqual(('listener_id',),
+                         models.ListenerStatistics._unique_key_names)
+        self.assertEqual(('listener_id', 'tls_container_id'),
+                         models.SNI._unique_key_names)
+
+    def test_shallow_data_model(self):
+        mem_dm = self.session.query(models.Member).filter_by(
+            id=self.member.id).first().to_data_model(relationships=())
+        self.assertEqual(1, self.count_graph_nodes(mem_dm))
+        self.assertEqual(self.member.id, mem_dm.id)
+        self.assertEqual(self.pool.id, mem_dm.pool_id)
+        self.assertIsNone(mem_dm.pool)
+
+        lb_dm = self.session.query(models.LoadBalancer).filter_by(
+            id=self.lb.id).first().to_data_model(
+                relationships=('vip', 'listeners'))
+        self.assertEqual(3, self.count_graph_nodes(lb_dm))
+        self.assertEqual(self.vip.ip_address, lb_dm.vip.ip_address)
+        self.assertEqual([self.listener.id],
+                         [listener.id for listener in lb_dm.listeners])
+        self.assertIsNone(lb_dm.vip.load_balancer)
+        self.assertIsNone(lb_dm.listeners[0].default_pool)
+        self.assertEqual([], lb_dm.pools)
+
     def test_data_model_graph_traversal(self):
         lb_dm = self.session.query(models.LoadBalancer).filter_by(
             id=self.lb.id).first().to_data_model()
@@ -15,12 +15,17 @@
 import datetime
 import random
 
+import mock
 from oslo_config import cfg
+from oslo_db.sqlalchemy import utils as db_utils
 from oslo_utils import uuidutils
+import sqlalchemy
 
 from octavia.common import constants
 from octavia.common import data_models as models
 from octavia.common import exceptions
+from octavia.db import api as db_api
+from octavia.db import models as db_models
 from octavia.db import repositories as repo
 from octavia.tests.functional.db import base
 
@@ -50,6 +55,7 @@ class BaseRepositoryTest(base.OctaviaDBTestBase):
         self.sni_repo = repo.SNIRepository()
         self.amphora_repo = repo.AmphoraRepository()
         self.amphora_health_repo = repo.AmphoraHealthRepository()
+        self.hm_member_repo = repo.HealthManagerMemberRepository()
         self.vrrp_group_repo = repo.VRRPGroupRepository()
         self.l7policy_repo = repo.L7PolicyRepository()
         self.l7rule_repo = repo.L7RuleRepository()
@@ -92,7 +98,8 @@ class AllRepositoriesTest(base.OctaviaDBTestBase):
         repo_attr_names = ('load_balancer', 'vip', 'health_monitor',
                            'session_persistence', 'pool', 'member', 'listener',
                            'listener_stats', 'amphora', 'sni',
-                           'amphorahealth', 'vrrpgroup', 'l7rule', 'l7policy')
+                           'amphorahealth', 'health_manager_member',
+                           'vrrpgroup', 'l7rule', 'l7policy')
         for repo_attr in repo_attr_names:
             single_repo = getattr(self.repos, repo_attr, None)
             message = ("Class Repositories should have %s instance"
@@ -408,8 +415,8 @@ class PoolRepositoryTest(BaseRepositoryTest):
                                            project_id=self.FAKE_UUID_2)
         self.assertIsInstance(pool_list, list)
         self.assertEqual(2, len(pool_list))
-        self.assertEqual(pool_one, pool_list[0])
-        self.assertEqual(pool_two, pool_list[1])
+        self.assertIn(pool_one, pool_list)
+        self.assertIn(pool_two, pool_list)
 
     def test_create(self):
         pool = self.create_pool(pool_id=self.FAKE_UUID_1,
@@ -549,8 +556,116 @@ class MemberRepositoryTest(BaseRepositoryTest):
                                                project_id=self.FAKE_UUID_2)
         self.assertIsInstance(member_list, list)
         self.assertEqual(2, len(member_list))
-        self.assertEqual(member_one, member_list[0])
-        self.assertEqual(member_two, member_list[1])
+        self.assertIn(member_one, member_list)
+        self.assertIn(member_two, member_list)
+
+    def test_get_all_compact(self):
+        member = self.create_member(self.FAKE_UUID_1, self.FAKE_UUID_2,
+                                    self.pool.id, "10.0.0.1")
+        member_list = self.member_repo.get_all(self.session, compact=True,
+                                               project_id=self.FAKE_UUID_2)
+        self.assertEqual(1, len(member_list))
+        compact_member = member_list[0]
+        self.assertIsInstance(compact_member, models.CompactDataModel)
+        self.assertEqual('Member', compact_member.__class__.__name__)
+        self.assertFalse(hasattr(compact_member, '__dict__'))
+        self.assertEqual(member.ip_address, compact_member.ip_address)
+        self.assertEqual(self.pool.id, compact_member.pool_id)
+        expected = member.to_dict()
+        del expected['pool']
+        self.assertEqual(expected, compact_member.to_dict())
+        self.assertRaises(AttributeError, setattr, compact_member,
+                          'weight', 2)
+
+    def test_get_page(self):
+        member_ids = sorted(uuidutils.generate_uuid() for i in range(5))
+        for i, member_id in enumerate(member_ids):
+            self.create_member(member_id, self.FAKE_UUID_2, self.pool.id,
+                               "10.0.0.%d" % (5 - i))
+        page = self.member_repo.get_page(self.session, limit=2,
+                                         pool_id=self.pool.id)
+        self.assertEqual(member_ids[:2], [member.id for member in page])
+        page = self.member_repo.get_page(self.session, limit=2,
+                                         marker=page[-1].id,
+                                         pool_id=self.pool.id)
+        self.assertEqual(member_ids[2:4], [member.id for member in page])
+        page = self.member_repo.get_page(self.session, limit=2,
+                                         marker=page[-1].id,
+                                         pool_id=self.pool.id)
+        self.assertEqual(member_ids[4:], [member.id for member in page])
+        page = self.member_repo.get_page(self.session, marker=page[-1].id,
+                                         pool_id=self.pool.id)
+        self.assertEqual([], page)
+
+    def test_get_page_batches(self):
+        member_ids = sorted(uuidutils.generate_uuid() for i in range(5))
+        for i, member_id in enumerate(member_ids):
+            self.create_member(member_id, self.FAKE_UUID_2, self.pool.id,
+                               "10.0.0.%d" % (5 - i))
+        with mock.patch.object(db_utils, 'paginate_query',
+                               wraps=db_utils.paginate_query) as paginate:
+            page = self.member_repo.get_page(self.session, batch_size=2,
+                                             pool_id=self.pool.id)
+            self.assertNotIsInstance(page, list)
+            self.assertEqual(member_ids, [member.id for member in page])
+            # Three full or partial batches of at most two rows
+            self.assertEqual(3, paginate.call_count)
+            self.assertEqual([2, 2, 2], [call[0][2] for call in
+                                         paginate.call_args_list])
+
+            paginate.reset_mock()
+            page = self.member_repo.get_page(
+                self.session, batch_size=2, limit=3, marker=member_ids[0],
+                sort_keys=['ip_address'], sort_dir='desc',
+                pool_id=self.pool.id)
+            self.assertEqual(member_ids[1:4], [member.id for member in page])
+            self.assertEqual([2, 1], [call[0][2] for call in
+                                      paginate.call_args_list])
+
+    def test_get_page_sorted(self):
+        member_ids = sorted(uuidutils.generate_uuid() for i in range(3))
+        for i, member_id in enumerate(member_ids):
+            self.create_member(member_id, self.FAKE_UUID_2, self.pool.id,
+                               "10.0.0.%d" % (3 - i))
+        page = self.member_repo.get_page(self.session,
+                                         sort_keys=['ip_address'],
+                                         pool_id=self.pool.id)
+        self.assertEqual(member_ids[::-1], [member.id for member in page])
+        page = self.member_repo.get_page(self.session, limit=1,
+                                         marker=member_ids[2],
+                                         sort_keys=['ip_address'],
+                                         pool_id=self.pool.id)
+        self.assertEqual([member_ids[1]], [member.id for member in page])
+        page = self.member_repo.get_page(self.session, sort_dir='desc',
+                                         pool_id=self.pool.id)
+        self.assertEqual(member_ids[::-1], [member.id for member in page])
+
+    def test_get_page_fields(self):
+        member = self.create_member(self.FAKE_UUID_1, self.FAKE_UUID_2,
+                                    self.pool.id, "10.0.0.1")
+        page = self.member_repo.get_page(self.session,
+                                         fields=['id', 'ip_address'],
+                                         pool_id=self.pool.id)
+        self.assertEqual(1, len(page))
+        self.assertIsInstance(page[0], models.CompactDataModel)
+        self.assertEqual({'id': member.id, 'ip_address': '10.0.0.1'},
+                         page[0].to_dict())
+
+    def test_get_page_ids(self):
+        self.create_member(self.FAKE_UUID_1, self.FAKE_UUID_2,
+                           self.pool.id, "10.0.0.1")
+        self.create_member(self.FAKE_UUID_3, self.FAKE_UUID_2,
+                           self.pool.id, "10.0.0.2")
+        page = self.member_repo.get_page(self.session,
+                                         ids=[self.FAKE_UUID_3])
+        self.assertEqual([self.FAKE_UUID_3], [member.id for member in page])
+
+    def test_get_page_unknown_marker(self):
+        self.create_member(self.FAKE_UUID_1, self.FAKE_UUID_2,
+                           self.pool.id, "10.0.0.1")
+        self.assertRaises(sqlalchemy.orm.exc.NoResultFound,
+                          self.member_repo.get_page, self.session,
+                          marker=self.FAKE_UUID_3, pool_id=self.pool.id)
 
     def test_create(self):
         member = self.create_member(self.FAKE_UUID_1, self.FAKE_UUID_2,
@@ -582,6 +697,42 @@ class MemberRepositoryTest(BaseRepositoryTest):
         self.assertIsNotNone(new_pool)
         self.assertEqual(0, len(new_pool.members))
 
+    def test_get_operating_statuses(self):
+        self.create_member(self.FAKE_UUID_1, self.FAKE_UUID_2,
+                           self.pool.id, "10.0.0.1")
+        self.create_member(self.FAKE_UUID_3, self.FAKE_UUID_2,
+                           self.pool.id, "10.0.0.2")
+        statuses = self.member_repo.get_operating_statuses(
+            self.session, [self.FAKE_UUID_1, self.FAKE_UUID_3,
+                           self.FAKE_UUID_4])
+        self.assertEqual({self.FAKE_UUID_1: constants.ONLINE,
+                          self.FAKE_UUID_3: constants.ONLINE}, statuses)
+        self.assertEqual({}, self.member_repo.get_operating_statuses(
+            self.session, []))
+
+    def test_update_operating_statuses(self):
+        self.create_member(self.FAKE_UUID_1, self.FAKE_UUID_2,
+                           self.pool.id, "10.0.0.1")
+        self.create_member(self.FAKE_UUID_3, self.FAKE_UUID_2,
+                           self.pool.id, "10.0.0.2")
+        self.create_member(self.FAKE_UUID_4, self.FAKE_UUID_2,
+                           self.pool.id, "10.0.0.3")
+        self.member_repo.update_operating_statuses(
+            self.session, {self.FAKE_UUID_1: constants.ERROR,
+                           self.FAKE_UUID_3: constants.NO_MONITOR})
+        self.assertEqual(
+            constants.ERROR,
+            self.member_repo.get(self.session,
+                                 id=self.FAKE_UUID_1).operating_status)
+        self.assertEqual(
+            constants.NO_MONITOR,
+            self.member_repo.get(self.session,
+                                 id=self.FAKE_UUID_3).operating_status)
+        self.assertEqual(
+            constants.ONLINE,
+            self.member_repo.get(self.session,
+                                 id=self.FAKE_UUID_4).operating_status)
+
 
 class SessionPersistenceRepositoryTest(BaseRepositoryTest):
 
@@ -685,8 +836,8 @@ class TestListenerRepositoryTest(BaseRepositoryTest):
                                                    project_id=self.FAKE_UUID_2)
         self.assertIsInstance(listener_list, list)
         self.assertEqual(2, len(listener_list))
-        self.assertEqual(listener_one, listener_list[0])
-        self.assertEqual(listener_two, listener_list[1])
+        self.assertIn(listener_one, listener_list)
+        self.assertIn(listener_two, listener_list)
 
     def test_create(self):
         listener = self.create_listener(self.FAKE_UUID_1, 80)
@@ -1066,8 +1217,8 @@ class LoadBalancerRepositoryTest(BaseRepositoryTest):
         lb_list = self.lb_repo.get_all(self.session,
                                        project_id=self.FAKE_UUID_2)
         self.assertEqual(2, len(lb_list))
-        self.assertEqual(lb_one, lb_list[0])
-        self.assertEqual(lb_two, lb_list[1])
+        self.assertIn(lb_one, lb_list)
+        self.assertIn(lb_two, lb_list)
 
     def test_create(self):
         lb = self.create_loadbalancer(self.FAKE_UUID_1)
@@ -1427,6 +1578,34 @@ class AmphoraRepositoryTest(BaseRepositoryTest):
         exist = self.amphora_repo.exists(self.session, id='test')
         self.assertFalse(exist)
 
+    def test_get_failover_details(self):
+        self.assertEqual({}, self.amphora_repo.get_failover_details(
+            self.session, []))
+        master = self.create_amphora(self.FAKE_UUID_1)
+        backup = self.create_amphora(self.FAKE_UUID_2)
+        self.amphora_repo.update(self.session, backup.id,
+                                 role=constants.ROLE_BACKUP)
+        for amphora in (master, backup):
+            self.amphora_repo.associate(self.session, self.lb.id, amphora.id)
+        stale = datetime.datetime.utcnow() - datetime.timedelta(minutes=10)
+        self.amphora_health_repo.create(self.session, amphora_id=master.id,
+                                        last_update=stale, busy=True)
+        self.amphora_health_repo.create(
+            self.session, amphora_id=backup.id,
+            last_update=datetime.datetime.utcnow(), busy=False)
+
+        details = self.amphora_repo.get_failover_details(
+            self.session, [master.id, 'gone'])
+        self.assertEqual({master.id: (constants.ROLE_MASTER, 1)}, details)
+
+        # The backup is stale too, so nothing is left of the load balancer
+        self.amphora_health_repo.update(self.session, backup.id,
+                                        last_update=stale)
+        details = self.amphora_repo.get_failover_details(
+            self.session, [master.id, backup.id])
+        self.assertEqual({master.id: (constants.ROLE_MASTER, 0),
+                          backup.id: (constants.ROLE_BACKUP, 0)}, details)
+
     def test_update(self):
         status_change = constants.PENDING_UPDATE
         amphora = self.create_amphora(self.FAKE_UUID_1)
@@ -1477,6 +1656,29 @@ class AmphoraRepositoryTest(BaseRepositoryTest):
         self.assertIsNotNone(lb_list)
         self.assertIn(self.lb, lb_list)
 
+    def test_get_lb_and_listener_count(self):
+        self.assertEqual((None, 0),
+                         self.amphora_repo.get_lb_and_listener_count(
+                             self.session, self.FAKE_UUID_1))
+        amphora = self.create_amphora(self.FAKE_UUID_1)
+        self.assertEqual((None, 0),
+                         self.amphora_repo.get_lb_and_listener_count(
+                             self.session, amphora.id))
+        self.amphora_repo.associate(self.session, self.lb.id, amphora.id)
+        self.assertEqual((self.lb.id, 0),
+                         self.amphora_repo.get_lb_and_listener_count(
+                             self.session, amphora.id))
+        for port in (80, 443):
+            self.listener_repo.create(
+                self.session, id=uuidutils.generate_uuid(),
+                project_id=self.FAKE_UUID_2, load_balancer_id=self.lb.id,
+                protocol=constants.PROTOCOL_HTTP, protocol_port=port,
+                provisioning_status=constants.ACTIVE,
+                operating_status=constants.ONLINE, enabled=True)
+        self.assertEqual((self.lb.id, 2),
+                         self.amphora_repo.get_lb_and_listener_count(
+                             self.session, amphora.id))
+
     def test_get_spare_amphora_count(self):
         count = self.amphora_repo.get_spare_amphora_count(self.session)
         self.assertEqual(0, count)
@@ -1602,6 +1804,47 @@ class AmphoraHealthRepositoryTest(BaseRepositoryTest):
             self.session)
         self.assertEqual(self.amphora.id, stale_amphora.amphora_id)
 
+    def test_get_stale_amphora_ids(self):
+        self.assertEqual([], self.amphora_health_repo.get_stale_amphora_ids(
+            self.session))
+        self.create_amphora_health(self.FAKE_UUID_1)
+        self.create_amphora_health(self.FAKE_UUID_2)
+        self.assertEqual(
+            sorted([self.FAKE_UUID_1, self.FAKE_UUID_2]),
+            sorted(self.amphora_health_repo.get_stale_amphora_ids(
+                self.session)))
+
+        # Only the given amphorae are claimed
+        self.assertEqual([self.FAKE_UUID_2],
+                         self.amphora_health_repo.get_stale_amphorae(
+                             self.session, 10,
+                             amphora_ids=[self.FAKE_UUID_2]))
+        self.assertEqual([self.FAKE_UUID_1],
+                         self.amphora_health_repo.get_stale_amphora_ids(
+                             self.session))
+
+    def test_get_stale_amphorae(self):
+        self.assertEqual([], self.amphora_health_repo.get_stale_amphorae(
+            self.session, 10))
+
+        amphora_ids = [self.FAKE_UUID_1, self.FAKE_UUID_2,
+                       self.FAKE_UUID_3]
+        for amphora_id in amphora_ids:
+            self.create_amphora_health(amphora_id)
+        stale_amphorae = self.amphora_health_repo.get_stale_amphorae(
+            self.session, 2)
+        self.assertEqual(2, len(stale_amphorae))
+
+        # The claimed amphorae are busy, only the last one is left
+        stale_amphorae.extend(self.amphora_health_repo.get_stale_amphorae(
+            self.session, 2))
+        self.assertEqual(sorted(amphora_ids), sorted(stale_amphorae))
+        self.assertEqual([], self.amphora_health_repo.get_stale_amphorae(
+            self.session, 2))
+        for amphora_id in amphora_ids:
+            self.assertTrue(self.amphora_health_repo.get(
+                self.session, amphora_id=amphora_id).busy)
+
     def test_create(self):
         amphora_health = self.create_amphora_health(self.FAKE_UUID_1)
         self.assertEqual(self.FAKE_UUID_1, amphora_health.amphora_id)
@@ -1629,6 +1872,39 @@ class AmphoraHealthRepositoryTest(BaseRepositoryTest):
             self.session, amphora_id=amphora_health.amphora_id))
 
 
+class HealthManagerMemberRepositoryTest(BaseRepositoryTest):
+
+    def test_replace(self):
+        old_date = datetime.datetime.utcnow() - datetime.timedelta(minutes=10)
+        self.hm_member_repo.replace(self.session, 'hm1',
+                                    last_update=old_date)
+        self.assertEqual(old_date, self.hm_member_repo.get(
+            self.session, member_id='hm1').last_update)
+
+        new_date = datetime.datetime.utcnow()
+        self.hm_member_repo.replace(self.session, 'hm1',
+                                    last_update=new_date)
+        self.assertEqual(new_date, self.hm_member_repo.get(
+            self.session, member_id='hm1').last_update)
+
+    def test_get_live_members(self):
+        old_date = datetime.datetime.utcnow() - datetime.timedelta(minutes=10)
+        self.hm_member_repo.replace(self.session, 'hm2',
+                                    last_update=datetime.datetime.utcnow())
+        self.hm_member_repo.replace(self.session, 'hm1',
+                                    last_update=datetime.datetime.utcnow())
+        self.hm_member_repo.replace(self.session, 'hm3',
+                                    last_update=old_date)
+        self.assertEqual(['hm1', 'hm2'], self.hm_member_repo.get_live_members(
+            self.session, 60))
+
+        self.hm_member_repo.delete_expired(self.session, 60)
+        self.assertIsNone(self.hm_member_repo.get(self.session,
+                                                  member_id='hm3'))
+        self.assertIsNotNone(self.hm_member_repo.get(self.session,
+                                                     member_id='hm1'))
+
+
 class VRRPGroupRepositoryTest(BaseRepositoryTest):
     def setUp(self):
         super(VRRPGroupRepositoryTest, self).setUp()
@@ -2410,3 +2686,143 @@ class L7RuleRepositoryTest(BaseRepositoryTest):
             type=constants.L7RULE_TYPE_FILE_TYPE,
             compare_type=constants.L7RULE_COMPARE_TYPE_STARTS_WITH,
             value='png|jpg')
+
+
+class LoadProfileQueryCountTest(BaseRepositoryTest):
+    """Upper bounds of the queries run by each load profile
+
+    The bounds do not depend on the number of objects in the tree, which is
+    checked by growing the tree between two reads.
+    """
+
+    # profile: (repository attribute, relationships, max queries)
+    PROFILE_BOUNDS = {
+        'lb_summary': ('lb_repo', ('vip',), 1),
+        'lb_full_tree': ('lb_repo', None, 14),
+        'listener_summary': ('listener_repo', ('sni_containers',), 2),
+        'listener_full_tree': ('listener_repo', None, 14),
+        'pool_summary': ('pool_repo', ('session_persistence',), 1),
+    }
+
+    def setUp(self):
+        super(LoadProfileQueryCountTest, self).setUp()
+        self.lb_id = uuidutils.generate_uuid()
+        self.project_id = uuidutils.generate_uuid()
+        self.listener_ids = []
+        self.pool_ids = []
+        self._add(db_models.LoadBalancer, id=self.lb_id,
+                  project_id=self.project_id,
+                  provisioning_status=constants.ACTIVE,
+                  operating_status=constants.ONLINE, enabled=True)
+        self._add(db_models.Vip, load_balancer_id=self.lb_id,
+                  ip_address=self.FAKE_IP)
+        self._add_listeners()
+
+    def _add(self, model_class, **kwargs):
+        with self.session.begin(subtransactions=True):
+            self.session.add(model_class(**kwargs))
+
+    def _add_listeners(self, count=2, members=2):
+        for i in range(count):
+            amphora_id = uuidutils.generate_uuid()
+            self._add(db_models.Amphora, id=amphora_id,
+                      load_balancer_id=self.lb_id, status=constants.ACTIVE,
+                      cert_busy=False)
+            pool_id = uuidutils.generate_uuid()
+            self._add(db_models.Pool, id=pool_id, load_balancer_id=self.lb_id,
+                      protocol=constants.PROTOCOL_HTTP,
+                      lb_algorithm=constants.LB_ALGORITHM_ROUND_ROBIN,
+                      operating_status=constants.ONLINE, enabled=True)
+            self._add(db_models.HealthMonitor, pool_id=pool_id,
+                      type=constants.HEALTH_MONITOR_HTTP, delay=1, timeout=1,
+                      fall_threshold=1, rise_threshold=1, enabled=True)
+            self._add(db_models.SessionPersistence, pool_id=pool_id,
+                      type=constants.SESSION_PERSISTENCE_HTTP_COOKIE,
+                      cookie_name='cookie')
+            for j in range(members):
+                self._add(db_models.Member, id=uuidutils.generate_uuid(),
+                          pool_id=pool_id, ip_address=self.FAKE_IP,
+                          protocol_port=80 + j, enabled=True,
+                          operating_status=constants.ONLINE)
+            listener_id = uuidutils.generate_uuid()
+            self._add(db_models.Listener, id=listener_id,
+                      load_balancer_id=self.lb_id, default_pool_id=pool_id,
+                      protocol=constants.PROTOCOL_HTTP,
+                      protocol_port=len(self.listener_ids) + 80,
+                      provisioning_status=constants.ACTIVE,
+                      operating_status=constants.ONLINE, enabled=True)
+            self._add(db_models.ListenerStatistics, listener_id=listener_id,
+                      amphora_id=amphora_id, bytes_in=0, bytes_out=0,
+                      active_connections=0, total_connections=0)
+            self._add(db_models.SNI, listener_id=listener_id,
+                      tls_container_id=uuidutils.generate_uuid())
+            l7policy_id = uuidutils.generate_uuid()
+            self._add(db_models.L7Policy, id=l7policy_id,
+                      listener_id=listener_id, redirect_pool_id=pool_id,
+                      action=constants.L7POLICY_ACTION_REDIRECT_TO_POOL,
+                      position=1, enabled=True)
+            self._add(db_models.L7Rule, id=uuidutils.generate_uuid(),
+                      l7policy_id=l7policy_id, type=constants.L7RULE_TYPE_PATH,
+                      compare_type=constants.L7RULE_COMPARE_TYPE_STARTS_WITH,
+                      value='/api')
+            self.listener_ids.append(listener_id)
+            self.pool_ids.append(pool_id)
+
+    def _count_queries(self, read):
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            # Leave out the connection checks of oslo.db
+            if statement != 'SELECT 1':
+                statements.append(statement)
+
+        engine = db_api.get_engine()
+        self.session.expunge_all()
+        sqlalchemy.event.listen(engine, 'before_cursor_execute', count)
+        try:
+            read()
+        finally:
+            sqlalchemy.event.remove(engine, 'before_cursor_execute', count)
+        return len(statements)
+
+    def _read_with_profile(self, profile):
+        repo_name, relationships, max_queries = self.PROFILE_BOUNDS[profile]
+        object_id = {'lb_repo': self.lb_id,
+                     'listener_repo': self.listener_ids[0],
+                     'pool_repo': self.pool_ids[0]}[repo_name]
+        return self._count_queries(
+            lambda: getattr(self, repo_name).get(
+                self.session, relationships=relationships, profile=profile,
+                id=object_id))
+
+    def test_profile_query_bounds(self):
+        for profile, (repo_name, relationships, max_queries) in (
+                self.PROFILE_BOUNDS.items()):
+            self.assertLessEqual(self._read_with_profile(profile),
+                                 max_queries, profile)
+        self._add_listeners(count=3, members=10)
+        for profile, (repo_name, relationships, max_queries) in (
+                self.PROFILE_BOUNDS.items()):
+            self.assertLessEqual(self._read_with_profile(profile),
+                                 max_queries, profile)
+
+    def test_full_tree_profile_graph(self):
+        lazy = self.lb_repo.get(self.session, id=self.lb_id)
+        lazy_queries = self._count_queries(
+            lambda: self.lb_repo.get(self.session, id=self.lb_id))
+        self.session.expunge_all()
+        eager = self.lb_repo.get(self.session, profile='lb_full_tree',
+                                 id=self.lb_id)
+        self.assertLess(self._read_with_profile('lb_full_tree'),
+                        lazy_queries)
+        self.assertEqual(len(lazy.listeners), len(eager.listeners))
+        self.assertEqual(
+            sorted(m.id for p in lazy.pools for m in p.members),
+            sorted(m.id for p in eager.pools for m in p.members))
+        self.assertEqual(self.lb_id,
+                         eager.listeners[0].default_pool.members[0].pool.
+                         load_balancer.id)
+
+    def test_unknown_profile(self):
+        self.assertRaises(ValueError, self.member_repo.get, self.session,
+                          profile='lb_full_tree', id=self.FAKE_UUID_1)
@@ -68,7 +68,9 @@ class AgentJinjaTestCase(base.TestCase):
                            '[health_manager]\n'
                            'controller_ip_port_list = 192.0.2.10:5555\n'
                            'heartbeat_interval = 10\n'
-                           'heartbeat_key = TEST\n\n'
+                           'heartbeat_key = TEST\n'
+                           'heartbeat_version = 0\n'
+                           'heartbeat_snapshot_interval = 0\n\n'
                            '[amphora_agent]\n'
                            'agent_server_ca = '
                            '/etc/octavia/certs/client_ca.pem\n'
@@ -99,7 +101,9 @@ class AgentJinjaTestCase(base.TestCase):
                            '[health_manager]\n'
                            'controller_ip_port_list = 192.0.2.10:5555\n'
                            'heartbeat_interval = 10\n'
-                           'heartbeat_key = TEST\n\n'
+                           'heartbeat_key = TEST\n'
+                           'heartbeat_version = 0\n'
+                           'heartbeat_snapshot_interval = 0\n\n'
                            '[amphora_agent]\n'
                            'agent_server_ca = '
                            '/etc/octavia/certs/client_ca.pem\n'
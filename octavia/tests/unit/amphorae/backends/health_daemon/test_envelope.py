@@ -15,6 +15,7 @@
 import uuid
 
 from octavia.amphorae.backends.health_daemon import status_message
+from octavia.common import constants
 from octavia.common import exceptions
 from octavia.tests.unit import base
 
@@ -37,3 +38,54 @@ class TestEnvelope(base.TestCase):
             args = (envelope, 'samplekey?')
             self.assertRaises(exceptions.InvalidHMACException,
                               status_message.unwrap_envelope, *args)
+
+    def _build_health(self):
+        return {'id': str(uuid.uuid4()), 'seq': 300, 'listeners': {
+            str(uuid.uuid4()): {
+                'status': constants.OPEN,
+                'stats': {'conns': 3, 'totconns': 2 ** 40, 'rx': 0,
+                          'tx': 127},
+                'pools': {str(uuid.uuid4()): {
+                    'status': constants.UP,
+                    'members': {str(uuid.uuid4()): constants.UP,
+                                str(uuid.uuid4()): constants.NO_CHECK,
+                                str(uuid.uuid4()): 'MAINT'}}}},
+            str(uuid.uuid4()): {
+                'status': constants.FULL,
+                'stats': {'conns': 0, 'totconns': 0, 'rx': 0, 'tx': 0},
+                'pools': {}}}}
+
+    def test_binary_round_trip(self):
+        health = self._build_health()
+        health['extra'] = {'key': 'value'}
+        envelope = status_message.wrap_envelope(
+            health, 'samplekey1', status_message.BINARY_VERSION)
+        self.assertEqual(status_message.BINARY_MAGIC, envelope[:1])
+        self.assertLess(len(envelope), len(status_message.wrap_envelope(
+            health, 'samplekey1')))
+        obj = status_message.unwrap_envelope(envelope, 'samplekey1')
+        self.assertEqual(health, obj)
+        self.assertRaises(exceptions.InvalidHMACException,
+                          status_message.unwrap_envelope, envelope,
+                          'samplekey?')
+
+    def test_binary_falls_back_to_json(self):
+        health = self._build_health()
+        health['id'] = 'not-a-uuid'
+        payload = status_message.encode_obj(health,
+                                            status_message.BINARY_VERSION)
+        self.assertNotEqual(status_message.BINARY_MAGIC, payload[:1])
+        self.assertEqual(health, status_message.decode_obj(payload))
+
+        health = self._build_health()
+        listener = list(health['listeners'].values())[0]
+        listener['stats']['rx'] = -1
+        payload = status_message.encode_obj(health,
+                                            status_message.BINARY_VERSION)
+        self.assertEqual(health, status_message.decode_obj(payload))
+
+    def test_binary_unknown_version(self):
+        payload = status_message.encode_binary_obj(self._build_health())
+        payload = payload[:1] + b'\x07' + payload[2:]
+        self.assertRaises(exceptions.InvalidHeartbeatVersion,
+                          status_message.decode_obj, payload)
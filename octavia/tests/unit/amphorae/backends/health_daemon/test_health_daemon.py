@@ -126,8 +126,8 @@ class TestHealthDaemon(base.TestCase):
 
     def setUp(self):
         super(TestHealthDaemon, self).setUp()
-        conf = oslo_fixture.Config(cfg.CONF)
-        conf.config(group="haproxy_amphora", base_path=BASE_PATH)
+        self.conf = self.useFixture(oslo_fixture.Config(cfg.CONF))
+        self.conf.config(group="haproxy_amphora", base_path=BASE_PATH)
 
     @mock.patch('octavia.amphorae.backends.agent.'
                 'api_server.util.get_listeners')
@@ -255,3 +255,90 @@ class TestHealthDaemon(base.TestCase):
         msg = health_daemon.build_stats_message()
 
         self.assertEqual(msg['listeners'][LISTENER_ID1]['pools'], {})
+
+    @mock.patch('time.sleep')
+    @mock.patch('octavia.amphorae.backends.health_daemon.'
+                'health_daemon.build_stats_message')
+    @mock.patch('octavia.amphorae.backends.health_daemon.'
+                'health_sender.UDPStatusSender')
+    def test_run_sender_delta(self, mock_UDPStatusSender, mock_build_msg,
+                              mock_sleep):
+        self.conf.config(group="health_manager",
+                         heartbeat_snapshot_interval=2)
+        sender_mock = mock.MagicMock()
+        sender_mock.snapshot_requested.return_value = False
+        mock_UDPStatusSender.return_value = sender_mock
+        msg1 = dict(SAMPLE_STATS_MSG, seq=1)
+        msg2 = dict(SAMPLE_STATS_MSG, seq=2)
+        mock_build_msg.side_effect = [msg1, msg2, Exception('break')]
+
+        self.assertRaisesRegexp(Exception, 'break',
+                                health_daemon.run_sender, queue.Queue())
+
+        self.assertEqual(2, sender_mock.dosend.call_count)
+        sender_mock.dosend.assert_any_call(msg1, to_all=True)
+        delta = sender_mock.dosend.call_args_list[1][0][0]
+        self.assertEqual(1, delta['delta'])
+        self.assertFalse(sender_mock.dosend.call_args_list[1][1]['to_all'])
+
+    def test_delta_builder(self):
+        pool_id = '432fc8b3-d446-48d4-bb64-13beb90e22bc'
+
+        def _msg(seq, members):
+            return {'id': 'amp1', 'seq': seq, 'listeners': {
+                LISTENER_ID1: {'status': 'OPEN', 'stats': {
+                    'totconns': seq, 'conns': 0, 'tx': 0, 'rx': 0},
+                    'pools': {pool_id: {'status': 'UP',
+                                        'members': members}}}}}
+
+        builder = health_daemon.DeltaBuilder(3)
+        snapshot = _msg(1, {'m1': 'UP', 'm2': 'UP', 'm3': 'DOWN'})
+        self.assertEqual(snapshot, builder.build(snapshot))
+
+        # Only the changed and DOWN members are sent, with all of the stats
+        delta = builder.build(_msg(2, {'m1': 'UP', 'm2': 'DOWN',
+                                       'm3': 'DOWN', 'm4': 'UP'}))
+        self.assertEqual(1, delta['delta'])
+        self.assertEqual(2, delta['seq'])
+        listener = delta['listeners'][LISTENER_ID1]
+        self.assertEqual('OPEN', listener['status'])
+        self.assertEqual(2, listener['stats']['totconns'])
+        self.assertEqual({'status': 'UP',
+                          'members': {'m2': 'DOWN', 'm3': 'DOWN',
+                                      'm4': 'UP'}},
+                         listener['pools'][pool_id])
+
+        # Deltas are relative to the snapshot, members that changed back
+        # are still sent
+        delta = builder.build(_msg(3, {'m1': 'UP', 'm2': 'UP',
+                                       'm3': 'UP'}))
+        self.assertEqual(1, delta['delta'])
+        self.assertEqual({'m2': 'UP', 'm3': 'UP'},
+                         delta['listeners'][LISTENER_ID1]['pools'][pool_id][
+                             'members'])
+
+        # The interval is over, send a new snapshot
+        msg = _msg(4, {'m1': 'UP'})
+        self.assertEqual(msg, builder.build(msg))
+        self.assertIn('delta', builder.build(_msg(5, {'m1': 'UP'})))
+
+        # A member going DOWN and back UP is sent in every delta until the
+        # next snapshot, even if the delta with the recovery is lost
+        builder = health_daemon.DeltaBuilder(5)
+        builder.build(_msg(1, {'m1': 'UP', 'm2': 'UP'}))
+        for seq, status in ((2, 'DOWN'), (3, 'UP'), (4, 'UP'), (5, 'UP')):
+            delta = builder.build(_msg(seq, {'m1': 'UP', 'm2': status}))
+            self.assertEqual({'m2': status},
+                             delta['listeners'][LISTENER_ID1]['pools'][
+                                 pool_id]['members'])
+        msg = _msg(6, {'m1': 'UP', 'm2': 'UP'})
+        self.assertEqual(msg, builder.build(msg))
+        delta = builder.build(_msg(7, {'m1': 'UP', 'm2': 'UP'}))
+        self.assertEqual({}, delta['listeners'][LISTENER_ID1]['pools'][
+            pool_id]['members'])
+
+        # A requested snapshot is sent right away
+        builder.request_snapshot()
+        msg = _msg(6, {'m1': 'UP'})
+        self.assertEqual(msg, builder.build(msg))
+        self.assertEqual(6, builder.build(_msg(7, {'m1': 'UP'}))['delta'])
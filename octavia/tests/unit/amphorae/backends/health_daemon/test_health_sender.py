@@ -21,6 +21,7 @@ from oslo_config import cfg
 from oslo_config import fixture as oslo_fixture
 
 from octavia.amphorae.backends.health_daemon import health_sender
+from octavia.amphorae.backends.health_daemon import status_message
 from octavia.tests.unit import base
 
 
@@ -118,3 +119,59 @@ class TestHealthSender(base.TestCase):
 
         # Should not raise an exception
         sender.dosend(SAMPLE_MSG)
+
+    @mock.patch('socket.getaddrinfo')
+    @mock.patch('socket.socket')
+    def test_sender_to_all(self, mock_socket, mock_getaddrinfo):
+        socket_mock = mock.MagicMock()
+        mock_socket.return_value = socket_mock
+        mock_getaddrinfo.side_effect = [
+            [(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP, '',
+              ('192.0.2.20', 80))],
+            [(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP, '',
+              ('192.0.2.21', 80))]]
+
+        sender = health_sender.UDPStatusSender()
+        sender.dosend(SAMPLE_MSG, to_all=True)
+
+        socket_mock.sendto.assert_has_calls(
+            [mock.call(SAMPLE_MSG_BIN, ('192.0.2.20', 80)),
+             mock.call(SAMPLE_MSG_BIN, ('192.0.2.21', 80))])
+        self.assertEqual(2, socket_mock.sendto.call_count)
+
+    @mock.patch('select.select')
+    @mock.patch('socket.getaddrinfo')
+    @mock.patch('socket.socket')
+    def test_snapshot_requested(self, mock_socket, mock_getaddrinfo,
+                                mock_select):
+        self.conf.config(group="amphora_agent", amphora_id='amp1')
+        socket_mock = mock.MagicMock()
+        mock_socket.return_value = socket_mock
+        mock_getaddrinfo.return_value = []
+        sender = health_sender.UDPStatusSender()
+
+        # Nothing received
+        mock_select.return_value = ([], [], [])
+        self.assertFalse(sender.snapshot_requested())
+
+        # A request for this amphora
+        request = status_message.wrap_envelope(
+            {'id': 'amp1', 'request': status_message.SNAPSHOT_REQUEST}, KEY)
+        mock_select.side_effect = [([socket_mock], [], []), ([], [], [])]
+        socket_mock.recvfrom.return_value = (request, ('192.0.2.10', 5555))
+        self.assertTrue(sender.snapshot_requested())
+
+        # A request for another amphora
+        request = status_message.wrap_envelope(
+            {'id': 'amp2', 'request': status_message.SNAPSHOT_REQUEST}, KEY)
+        mock_select.side_effect = [([socket_mock], [], []), ([], [], [])]
+        socket_mock.recvfrom.return_value = (request, ('192.0.2.10', 5555))
+        self.assertFalse(sender.snapshot_requested())
+
+        # A request signed with another key is dropped
+        request = status_message.wrap_envelope(
+            {'id': 'amp1', 'request': status_message.SNAPSHOT_REQUEST},
+            'BOGUS')
+        mock_select.side_effect = [([socket_mock], [], []), ([], [], [])]
+        socket_mock.recvfrom.return_value = (request, ('192.0.2.10', 5555))
+        self.assertFalse(sender.snapshot_requested())
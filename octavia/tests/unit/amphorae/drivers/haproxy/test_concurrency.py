@@ -0,0 +1,109 @@
+# Copyright 2016 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import threading
+
+from concurrent import futures
+import mock
+
+from octavia.amphorae.drivers.haproxy import concurrency
+from octavia.common import data_models
+from octavia.tests.unit import base
+
+
+class TestMapAmphorae(base.TestCase):
+
+    def setUp(self):
+        super(TestMapAmphorae, self).setUp()
+        self.amps = [data_models.Amphora(id='amp1'),
+                     data_models.Amphora(id='amp2'),
+                     data_models.Amphora(id='amp3')]
+
+    @mock.patch('octavia.amphorae.drivers.haproxy.concurrency._get_executor')
+    def test_map_amphorae_single(self, mock_executor):
+        func = mock.Mock(return_value='ok')
+        self.assertEqual(['ok'], concurrency.map_amphorae(
+            func, self.amps[:1], 'arg'))
+        func.assert_called_once_with(self.amps[0], 'arg')
+        self.assertEqual([], concurrency.map_amphorae(func, []))
+        mock_executor.assert_not_called()
+
+    def test_map_amphorae_concurrent(self):
+        started = threading.Event()
+
+        def func(amp, arg):
+            # The first call only returns once the last one has started,
+            # which can not happen when the calls are made one by one
+            if amp is self.amps[-1]:
+                started.set()
+            else:
+                self.assertTrue(started.wait(10))
+            return amp.id + arg
+
+        self.assertEqual(['amp1-x', 'amp2-x', 'amp3-x'],
+                         concurrency.map_amphorae(func, self.amps, '-x'))
+
+    @mock.patch('octavia.amphorae.drivers.haproxy.concurrency.LOG')
+    def test_map_amphorae_failures(self, mock_log):
+        calls = []
+        all_started = threading.Event()
+
+        def func(amp):
+            calls.append(amp.id)
+            if len(calls) == len(self.amps):
+                all_started.set()
+            if amp.id != 'amp1':
+                # Fail once no call is left to cancel
+                self.assertTrue(all_started.wait(10))
+                raise ValueError(amp.id)
+
+        error = self.assertRaises(ValueError, concurrency.map_amphorae,
+                                  func, self.amps)
+        self.assertEqual('amp2', str(error))
+        self.assertEqual(['amp1', 'amp2', 'amp3'], sorted(calls))
+        self.assertEqual(1, mock_log.warning.call_count)
+        # The calls already running when one fails are completed
+        self.assertEqual([self.amps[0]], error.amphorae_succeeded)
+        self.assertEqual([(amp, mock.ANY) for amp in self.amps[1:]],
+                         error.amphorae_failed)
+        self.assertEqual([], error.amphorae_skipped)
+
+        # Only the first amphora was called
+        func = mock.Mock(side_effect=ValueError('amp1'))
+        error = self.assertRaises(ValueError, concurrency.map_amphorae,
+                                  func, self.amps[:1])
+        self.assertEqual([], error.amphorae_succeeded)
+        self.assertEqual([(self.amps[0], error)], error.amphorae_failed)
+
+    @mock.patch('octavia.amphorae.drivers.haproxy.concurrency.LOG')
+    @mock.patch('octavia.amphorae.drivers.haproxy.concurrency._get_executor')
+    def test_map_amphorae_failure_cancels_queued(self, mock_executor,
+                                                 mock_log):
+        # amp1 failed, amp2 is still queued and amp3 succeeded
+        failed = futures.Future()
+        failed.set_exception(ValueError('amp1'))
+        queued = futures.Future()
+        succeeded = futures.Future()
+        succeeded.set_result('ok')
+        mock_executor.return_value.submit.side_effect = [
+            failed, queued, succeeded]
+
+        error = self.assertRaises(ValueError, concurrency.map_amphorae,
+                                  mock.Mock(), self.amps)
+        self.assertEqual('amp1', str(error))
+        # The queued call is not made, as when calling one after another
+        self.assertTrue(queued.cancelled())
+        self.assertEqual([self.amps[2]], error.amphorae_succeeded)
+        self.assertEqual([(self.amps[0], error)], error.amphorae_failed)
+        self.assertEqual([self.amps[1]], error.amphorae_skipped)
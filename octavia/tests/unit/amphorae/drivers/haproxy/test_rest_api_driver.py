@@ -13,16 +13,21 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import hashlib
+import threading
+
 import mock
 from oslo_config import cfg
 from oslo_config import fixture as oslo_fixture
 from oslo_utils import uuidutils
+import requests
 import requests_mock
 import six
 
 from octavia.amphorae.driver_exceptions import exceptions as driver_except
 from octavia.amphorae.drivers.haproxy import exceptions as exc
 from octavia.amphorae.drivers.haproxy import rest_api_driver as driver
+from octavia.common.tls_utils import cert_parser
 from octavia.db import models
 from octavia.network import data_models as network_models
 from octavia.tests.unit import base as base
@@ -68,6 +73,8 @@ class TestHaproxyAmphoraLoadBalancerDriverTest(base.TestCase):
             'tls_cert': self.sl.default_tls_container,
             'sni_certs': sconts
         }
+        # an amphora agent without the certificate manifest
+        self.driver.client.get_cert_manifest.side_effect = exc.NotFound
         self.driver.client.get_cert_md5sum.side_effect = [
             exc.NotFound, 'Fake_MD5', 'd41d8cd98f00b204e9800998ecf8427e']
         self.driver.jinja.build_config.side_effect = ['fake_config']
@@ -115,6 +122,141 @@ class TestHaproxyAmphoraLoadBalancerDriverTest(base.TestCase):
         self.driver.client.start_listener.assert_called_once_with(
             self.amp, self.sl.id)
 
+    @mock.patch('octavia.common.tls_utils.cert_parser.load_certificates_data')
+    def test_update_cert_manifest(self, mock_load_crt):
+        tls_cert = sample_configs.sample_tls_container_tuple(
+            id='cont_id_1', certificate='cert1', private_key='key1',
+            primary_cn='cn1')
+        sni_cert = sample_configs.sample_tls_container_tuple(
+            id='cont_id_2', certificate='cert2', private_key='key2',
+            primary_cn='cn2')
+        mock_load_crt.return_value = {'tls_cert': tls_cert,
+                                      'sni_certs': [sni_cert]}
+        pem1 = cert_parser.build_pem(tls_cert)
+        pem2 = cert_parser.build_pem(sni_cert)
+        self.driver.client.get_cert_manifest.return_value = {
+            'cn1.pem': hashlib.md5(six.b(pem1)).hexdigest(),
+            'cn2.pem': 'old_md5',
+            'cn3.pem': 'stale_md5'}
+        self.driver.jinja.build_config.side_effect = ['fake_config']
+        self.driver.client.get_listener_status.side_effect = [
+            dict(status='ACTIVE')]
+
+        self.driver.update(self.sl, self.sv)
+
+        self.driver.client.get_cert_manifest.assert_called_once_with(
+            self.amp, self.sl.id)
+        self.driver.client.update_certs.assert_called_once_with(
+            self.amp, self.sl.id, {'cn2.pem': pem2}, ['cn3.pem'])
+        self.driver.client.get_cert_md5sum.assert_not_called()
+        self.driver.client.upload_cert_pem.assert_not_called()
+
+        # the certificates are up to date
+        self.driver.client.update_certs.reset_mock()
+        self.driver.client.get_cert_manifest.return_value = {
+            'cn1.pem': hashlib.md5(six.b(pem1)).hexdigest(),
+            'cn2.pem': hashlib.md5(six.b(pem2)).hexdigest()}
+        self.driver.jinja.build_config.side_effect = ['fake_config']
+        self.driver.client.get_listener_status.side_effect = [
+            dict(status='ACTIVE')]
+
+        self.driver.update(self.sl, self.sv)
+
+        self.driver.client.update_certs.assert_not_called()
+
+    @mock.patch('octavia.common.tls_utils.cert_parser.load_certificates_data')
+    def test_update_many(self, mock_load_crt):
+        mock_load_crt.return_value = {'tls_cert': None, 'sni_certs': []}
+        sl2 = self.sl._replace(id='sample_listener_id_2')
+        self.driver.jinja.build_config.side_effect = ['fake_config1',
+                                                      'fake_config2']
+
+        self.driver.update_many([self.sl, sl2], self.sv)
+
+        self.driver.client.upload_configs.assert_called_once_with(
+            self.amp, {self.sl.id: 'fake_config1', sl2.id: 'fake_config2'})
+        self.driver.client.upload_config.assert_not_called()
+        self.driver.client.get_listener_status.assert_not_called()
+        self.driver.client.reload_listener.assert_not_called()
+        self.driver.client.start_listener.assert_not_called()
+
+    @mock.patch('octavia.common.tls_utils.cert_parser.load_certificates_data')
+    def test_update_many_old_agent(self, mock_load_crt):
+        mock_load_crt.return_value = {'tls_cert': None, 'sni_certs': []}
+        sl2 = self.sl._replace(id='sample_listener_id_2')
+        self.driver.jinja.build_config.side_effect = ['fake_config1',
+                                                      'fake_config2']
+        self.driver.client.upload_configs.side_effect = exc.NotFound
+        self.driver.client.get_listener_status.side_effect = [
+            dict(status='ACTIVE'), dict(status='OFFLINE')]
+
+        self.driver.update_many([self.sl, sl2], self.sv)
+
+        self.assertEqual([
+            mock.call(self.amp, self.sl.id, 'fake_config1'),
+            mock.call(self.amp, sl2.id, 'fake_config2')],
+            self.driver.client.upload_config.call_args_list)
+        self.driver.client.reload_listener.assert_called_once_with(
+            self.amp, self.sl.id)
+        self.driver.client.start_listener.assert_called_once_with(
+            self.amp, sl2.id)
+
+    def test_update_unchanged(self):
+        self.driver._process_tls_certificates = mock.Mock(
+            return_value={'tls_cert': None, 'sni_certs': []})
+        self.driver.jinja.build_config.side_effect = ['fake_config']
+        self.driver.client.upload_config.return_value = mock.Mock(
+            status_code=304)
+
+        self.driver.update(self.sl, self.sv)
+
+        self.driver.client.upload_config.assert_called_once_with(
+            self.amp, self.sl.id, 'fake_config')
+        self.driver.client.get_listener_status.assert_not_called()
+        self.driver.client.reload_listener.assert_not_called()
+        self.driver.client.start_listener.assert_not_called()
+
+    def test_update_several_amphorae(self):
+        amp2 = self.amp._replace(id='amp2')
+        lb = self.lb._replace(amphorae=[self.amp, amp2])
+        listener = self.sl._replace(load_balancer=lb)
+        self.driver._process_tls_certificates = mock.Mock(
+            return_value={'tls_cert': None, 'sni_certs': []})
+        self.driver.jinja.build_config.side_effect = ['fake_config1',
+                                                      'fake_config2']
+        self.driver.client.get_listener_status.return_value = dict(
+            status='ACTIVE')
+
+        self.driver.update(listener, self.sv)
+
+        self.driver.client.upload_config.assert_has_calls([
+            mock.call(self.amp, listener.id, 'fake_config1'),
+            mock.call(amp2, listener.id, 'fake_config2')], any_order=True)
+        self.driver.client.reload_listener.assert_has_calls([
+            mock.call(self.amp, listener.id),
+            mock.call(amp2, listener.id)], any_order=True)
+
+        # A failure on one amphora is raised once the running calls to the
+        # others are done
+        self.driver.client.reload_listener.reset_mock()
+        self.driver.jinja.build_config.side_effect = ['fake_config1',
+                                                      'fake_config2']
+        amp2_reloaded = threading.Event()
+
+        def reload_listener(amp, listener_id):
+            if amp is amp2:
+                amp2_reloaded.set()
+                return
+            self.assertTrue(amp2_reloaded.wait(10))
+            raise exc.InternalServerError()
+
+        self.driver.client.reload_listener.side_effect = reload_listener
+        error = self.assertRaises(exc.InternalServerError, self.driver.update,
+                                  listener, self.sv)
+        self.assertEqual(2, self.driver.client.reload_listener.call_count)
+        self.assertEqual([amp2], error.amphorae_succeeded)
+        self.assertEqual([(self.amp, error)], error.amphorae_failed)
+
     def test_upload_cert_amp(self):
         self.driver.upload_cert_amp(self.amp, six.b('test'))
         self.driver.client.update_cert_for_rotation.assert_called_once_with(
@@ -184,6 +326,68 @@ class TestAmphoraAPIClientTest(base.TestCase):
                           self.driver.request,
                           'get', self.amp, 'unavailableURL')
 
+    @mock.patch('random.uniform', side_effect=lambda low, high: high)
+    @mock.patch('oslo_utils.timeutils.now', return_value=0)
+    @mock.patch('time.sleep')
+    def test_request_backoff(self, mock_sleep, mock_now, mock_uniform):
+        conf = self.useFixture(oslo_fixture.Config(cfg.CONF))
+        conf.config(group="haproxy_amphora", connection_max_retries=10)
+        session = mock.Mock()
+        session.get.side_effect = [requests.ConnectionError()] * 6 + ['r']
+        with mock.patch.object(self.driver, '_get_session',
+                               return_value=session):
+            self.assertEqual('r', self.driver.request('get', self.amp))
+        self.assertEqual([0.5, 1, 2, 4, 5, 5],
+                         [c[0][0] for c in mock_sleep.call_args_list])
+
+    @mock.patch('oslo_utils.timeutils.now')
+    @mock.patch('time.sleep')
+    def test_request_deadline(self, mock_sleep, mock_now):
+        conf = self.useFixture(oslo_fixture.Config(cfg.CONF))
+        conf.config(group="haproxy_amphora", connection_max_retries=100,
+                    connection_retry_timeout=30)
+        mock_now.side_effect = [0, 10, 20, 29]
+        session = mock.Mock()
+        session.get.side_effect = requests.Timeout()
+        with mock.patch.object(self.driver, '_get_session',
+                               return_value=session):
+            self.assertRaises(driver_except.TimeOutException,
+                              self.driver.request, 'get', self.amp)
+        self.assertEqual(3, session.get.call_count)
+        self.assertEqual(2, mock_sleep.call_count)
+
+    @mock.patch('oslo_utils.timeutils.now')
+    @mock.patch('time.sleep')
+    def test_request_connection_refused(self, mock_sleep, mock_now):
+        conf = self.useFixture(oslo_fixture.Config(cfg.CONF))
+        conf.config(group="haproxy_amphora", connection_max_retries=100,
+                    connection_refused_timeout=60)
+        mock_now.side_effect = [0, 10, 20, 50, 81]
+        refused = requests.ConnectionError(
+            'Failed to establish a new connection: [Errno 111] '
+            'Connection refused')
+        session = mock.Mock()
+        session.get.side_effect = [requests.Timeout(), refused, refused,
+                                   refused]
+        with mock.patch.object(self.driver, '_get_session',
+                               return_value=session):
+            self.assertRaises(driver_except.TimeOutException,
+                              self.driver.request, 'get', self.amp)
+        self.assertEqual(4, session.get.call_count)
+
+    def test_get_session(self):
+        amp2 = models.Amphora(id='amp2', lb_network_ip='127.0.0.2')
+        session = self.driver._get_session(self.amp)
+        self.assertIs(session, self.driver._get_session(self.amp))
+        self.assertIsNot(session, self.driver._get_session(amp2))
+        self.assertEqual(self.amp.id, session.get_adapter('https://').uuid)
+        self.assertEqual(
+            'amp2', self.driver._get_session(amp2).get_adapter(
+                'https://').uuid)
+        # The sessions are shared by the clients
+        self.assertIs(session,
+                      driver.AmphoraAPIClient()._get_session(self.amp))
+
     @requests_mock.mock()
     def test_get_info(self, m):
         info = {"hostname": "some_hostname", "version": "some_version",
@@ -627,7 +831,7 @@ class TestAmphoraAPIClientTest(base.TestCase):
 
     @requests_mock.mock()
     def test_upload_config(self, m):
-        config = {"name": "fake_config"}
+        config = "fake_config"
         m.put(
             "{base}/listeners/{"
             "amphora_id}/{listener_id}/haproxy".format(
@@ -637,6 +841,55 @@ class TestAmphoraAPIClientTest(base.TestCase):
         self.driver.upload_config(self.amp, FAKE_UUID_1,
                                   config)
         self.assertTrue(m.called)
+        self.assertEqual(
+            '"{0}"'.format(hashlib.md5(six.b(config)).hexdigest()),
+            m.last_request.headers['If-None-Match'])
+
+    @requests_mock.mock()
+    def test_get_cert_manifest(self, m):
+        manifest = {'certificates': {'a.pem': 'md5a', 'b.pem': 'md5b'}}
+        m.get("{base}/certificates/{listener_id}".format(
+            base=self.base_url, listener_id=FAKE_UUID_1), json=manifest)
+        self.assertEqual(manifest['certificates'],
+                         self.driver.get_cert_manifest(self.amp, FAKE_UUID_1))
+
+    @requests_mock.mock()
+    def test_get_cert_manifest_not_found(self, m):
+        m.get("{base}/certificates/{listener_id}".format(
+            base=self.base_url, listener_id=FAKE_UUID_1), status_code=404)
+        self.assertRaises(exc.NotFound, self.driver.get_cert_manifest,
+                          self.amp, FAKE_UUID_1)
+
+    @requests_mock.mock()
+    def test_update_certs(self, m):
+        m.put("{base}/certificates/{listener_id}".format(
+            base=self.base_url, listener_id=FAKE_UUID_1))
+        self.driver.update_certs(self.amp, FAKE_UUID_1,
+                                 {'a.pem': 'pem_a'}, ['b.pem', 'c.pem'])
+        self.assertTrue(m.called)
+        body = m.last_request.body
+        self.assertIn(six.b('name="a.pem"; filename="a.pem"'), body)
+        self.assertIn(six.b('pem_a'), body)
+        self.assertIn(six.b('name="delete"\r\n\r\nb.pem'), body)
+        self.assertIn(six.b('name="delete"\r\n\r\nc.pem'), body)
+
+    @requests_mock.mock()
+    def test_update_certs_invalid(self, m):
+        m.put("{base}/certificates/{listener_id}".format(
+            base=self.base_url, listener_id=FAKE_UUID_1), status_code=400)
+        self.assertRaises(exc.InvalidRequest, self.driver.update_certs,
+                          self.amp, FAKE_UUID_1, {'a.pem': 'pem_a'}, [])
+
+    @requests_mock.mock()
+    def test_upload_config_unchanged(self, m):
+        m.put(
+            "{base}/listeners/{"
+            "amphora_id}/{listener_id}/haproxy".format(
+                amphora_id=self.amp.id, base=self.base_url,
+                listener_id=FAKE_UUID_1),
+            status_code=304)
+        r = self.driver.upload_config(self.amp, FAKE_UUID_1, "fake_config")
+        self.assertEqual(304, r.status_code)
 
     @requests_mock.mock()
     def test_upload_invalid_config(self, m):
@@ -686,6 +939,30 @@ class TestAmphoraAPIClientTest(base.TestCase):
         self.assertRaises(exc.ServiceUnavailable, self.driver.upload_config,
                           self.amp, FAKE_UUID_1, config)
 
+    @requests_mock.mock()
+    def test_upload_configs(self, m):
+        m.put("{base}/haproxy/{amphora_id}".format(
+            amphora_id=self.amp.id, base=self.base_url), status_code=202)
+        self.driver.upload_configs(self.amp, {FAKE_UUID_1: 'fake_config'})
+        self.assertTrue(m.called)
+        body = m.last_request.body
+        self.assertIn(six.b('name="%s"' % FAKE_UUID_1), body)
+        self.assertIn(six.b('fake_config'), body)
+
+    @requests_mock.mock()
+    def test_upload_configs_missing(self, m):
+        m.put("{base}/haproxy/{amphora_id}".format(
+            amphora_id=self.amp.id, base=self.base_url), status_code=404)
+        self.assertRaises(exc.NotFound, self.driver.upload_configs,
+                          self.amp, {FAKE_UUID_1: 'fake_config'})
+
+    @requests_mock.mock()
+    def test_upload_configs_invalid(self, m):
+        m.put("{base}/haproxy/{amphora_id}".format(
+            amphora_id=self.amp.id, base=self.base_url), status_code=400)
+        self.assertRaises(exc.InvalidRequest, self.driver.upload_configs,
+                          self.amp, {FAKE_UUID_1: 'bad_config'})
+
     @requests_mock.mock()
     def test_plug_vip(self, m):
         m.post("{base}/plug/vip/{vip}".format(
@@ -734,3 +1011,50 @@ class TestAmphoraAPIClientTest(base.TestCase):
         self.assertRaises(exc.InternalServerError,
                           self.driver.get_interface,
                           self.amp, ip_addr)
+
+
+class TestAmphoraSessionPool(base.TestCase):
+
+    def setUp(self):
+        super(TestAmphoraSessionPool, self).setUp()
+        self.pool = driver.AmphoraSessionPool()
+        self.addCleanup(self.pool.close)
+        self.amps = [models.Amphora(id='amp%d' % i) for i in range(3)]
+        conf = self.useFixture(oslo_fixture.Config(cfg.CONF))
+        conf.config(group="haproxy_amphora", rest_connection_pool_size=2,
+                    rest_connection_idle_timeout=30)
+
+    @mock.patch('oslo_utils.timeutils.now')
+    def test_get_reuses_session(self, mock_now):
+        mock_now.return_value = 100
+        session = self.pool.get(self.amps[0])
+        mock_now.return_value = 120
+        self.assertIs(session, self.pool.get(self.amps[0]))
+        self.assertEqual(self.amps[0].id,
+                         session.get_adapter('https://').uuid)
+
+    @mock.patch('oslo_utils.timeutils.now')
+    def test_get_closes_idle_sessions(self, mock_now):
+        mock_now.return_value = 100
+        session = self.pool.get(self.amps[0])
+        mock_now.return_value = 120
+        self.pool.get(self.amps[1])
+        with mock.patch.object(session, 'close') as mock_close:
+            mock_now.return_value = 140
+            self.pool.get(self.amps[1])
+            mock_close.assert_called_once_with()
+        self.assertEqual([self.amps[1].id], list(self.pool.sessions))
+        self.assertIsNot(session, self.pool.get(self.amps[0]))
+
+    @mock.patch('oslo_utils.timeutils.now')
+    def test_get_closes_least_recently_used(self, mock_now):
+        mock_now.return_value = 100
+        session0 = self.pool.get(self.amps[0])
+        session1 = self.pool.get(self.amps[1])
+        self.pool.get(self.amps[0])
+        with mock.patch.object(session1, 'close') as mock_close:
+            self.pool.get(self.amps[2])
+            mock_close.assert_called_once_with()
+        self.assertEqual([self.amps[0].id, self.amps[2].id],
+                         list(self.pool.sessions))
+        self.assertIs(session0, self.pool.get(self.amps[0]))
@@ -14,13 +14,16 @@
 # under the License.
 
 import binascii
+import errno
 import random
 import socket
+import zlib
 
 import mock
 from oslo_config import cfg
 from oslo_config import fixture as oslo_fixture
 
+from octavia.amphorae.backends.health_daemon import status_message
 from octavia.amphorae.drivers.health import heartbeat_udp
 from octavia.common import exceptions
 from octavia.tests.unit import base
@@ -40,7 +43,7 @@ class TestHeartbeatUDP(base.TestCase):
         self.health_update = mock.Mock()
         self.stats_update = mock.Mock()
 
-        self.conf = oslo_fixture.Config(cfg.CONF)
+        self.conf = self.useFixture(oslo_fixture.Config(cfg.CONF))
         self.conf.config(group="health_manager", heartbeat_key=KEY)
         self.conf.config(group="health_manager", bind_ip=IP)
         self.conf.config(group="health_manager", bind_port=PORT)
@@ -103,8 +106,13 @@ class TestHeartbeatUDP(base.TestCase):
         mock_dorecv.side_effect = [(dict(id=FAKE_ID), 2)]
 
         getter.check()
-        getter.executor.shutdown()
-        self.health_update.update_health.assert_called_once_with({'id': 1})
+        getter.shutdown()
+        # The amphora health is written apart from the status changes
+        self.assertIsNot(getter.liveness_executor, getter.executor)
+        self.health_update.update_liveness.assert_called_once_with({'id': 1})
+        self.health_update.update_statuses.assert_called_once_with(
+            {'id': 1}, self.health_update.update_liveness.return_value)
+        self.assertFalse(self.health_update.update_health.called)
         self.stats_update.update_stats.assert_called_once_with({'id': 1})
 
     @mock.patch('socket.getaddrinfo')
@@ -144,3 +152,374 @@ class TestHeartbeatUDP(base.TestCase):
 
         getter.check()
         self.assertFalse(mock_submit.called)
+
+    @mock.patch('socket.getaddrinfo')
+    @mock.patch('socket.socket')
+    def test_check_batched(self, mock_socket, mock_getaddrinfo):
+        socket_mock = mock.MagicMock()
+        mock_socket.return_value = socket_mock
+        mock_getaddrinfo.return_value = [range(1, 6)]
+        self.conf.config(group="health_manager", heartbeat_batch_window=10)
+        self.conf.config(group="health_manager", heartbeat_batch_max_size=2)
+
+        getter = heartbeat_udp.UDPStatusGetter(
+            self.health_update, self.stats_update)
+        socket_mock.settimeout.assert_called_once_with(10)
+        self.assertIsNone(getter.liveness_executor)
+        mock_dorecv = mock.Mock()
+        getter.dorecv = mock_dorecv
+        mock_dorecv.side_effect = [(dict(id=FAKE_ID, seq=2), 2),
+                                   (dict(id=FAKE_ID, seq=1), 2),
+                                   (dict(id=FAKE_ID, seq=3), 2),
+                                   (dict(id=2, seq=1), 2)]
+
+        getter.check()
+        getter.check()
+        getter.check()
+        self.assertFalse(self.health_update.update_health_batch.called)
+        getter.check()
+        getter.executor.shutdown()
+
+        batch = [{'id': FAKE_ID, 'seq': 3}, {'id': 2, 'seq': 1}]
+        self.health_update.update_health_batch.assert_called_once_with(batch)
+        self.stats_update.update_stats_batch.assert_called_once_with(batch)
+        self.assertFalse(self.health_update.update_health.called)
+        stats = getter.get_stats()
+        self.assertEqual(4, stats['packets_received'])
+        self.assertEqual(4, stats['heartbeats_buffered'])
+        self.assertEqual(2, stats['packets_merged'])
+        self.assertEqual(1, stats['batches_flushed'])
+        self.assertEqual(2, stats['max_batch_size'])
+
+    @mock.patch('time.time')
+    @mock.patch('socket.getaddrinfo')
+    @mock.patch('socket.socket')
+    def test_check_batched_window(self, mock_socket, mock_getaddrinfo,
+                                  mock_time):
+        mock_getaddrinfo.return_value = [range(1, 6)]
+        mock_time.return_value = 100
+        self.conf.config(group="health_manager", heartbeat_batch_window=5)
+
+        getter = heartbeat_udp.UDPStatusGetter(
+            self.health_update, None)
+        mock_dorecv = mock.Mock()
+        getter.dorecv = mock_dorecv
+        mock_dorecv.side_effect = [(dict(id=FAKE_ID, seq=1), 2),
+                                   socket.timeout,
+                                   exceptions.InvalidHMACException]
+
+        getter.check()
+        mock_time.return_value = 106
+        getter.check()
+        getter.check()
+        getter.executor.shutdown()
+
+        self.health_update.update_health_batch.assert_called_once_with(
+            [{'id': FAKE_ID, 'seq': 1}])
+
+    @mock.patch('socket.getaddrinfo')
+    @mock.patch('socket.socket')
+    def test_get_stats_no_batching(self, mock_socket, mock_getaddrinfo):
+        mock_getaddrinfo.return_value = [range(1, 6)]
+        getter = heartbeat_udp.UDPStatusGetter(None, None)
+        getter.dorecv = mock.Mock(return_value=(dict(id=FAKE_ID), 2))
+        getter.check()
+        stats = getter.get_stats()
+        self.assertEqual(['packets_per_second', 'packets_received'],
+                         sorted(stats))
+        self.assertEqual(1, stats['packets_received'])
+
+    @mock.patch('socket.getaddrinfo')
+    @mock.patch('socket.socket')
+    def test_update_reuse_port(self, mock_socket, mock_getaddrinfo):
+        socket_mock = mock.MagicMock()
+        mock_socket.return_value = socket_mock
+        mock_getaddrinfo.return_value = [range(1, 6)]
+        self.conf.config(group="health_manager",
+                         heartbeat_listener_processes=4)
+
+        heartbeat_udp.UDPStatusGetter(None, None)
+
+        socket_mock.setsockopt.assert_called_once_with(
+            socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        socket_mock.bind.assert_called_once_with((IP, PORT))
+
+    @mock.patch('time.time')
+    @mock.patch('socket.getaddrinfo')
+    @mock.patch('socket.socket')
+    def test_report_stats(self, mock_socket, mock_getaddrinfo, mock_time):
+        mock_getaddrinfo.return_value = [range(1, 6)]
+        mock_time.return_value = 100
+        getter = heartbeat_udp.UDPStatusGetter(None, None)
+        getter.dorecv = mock.Mock(return_value=(dict(id=FAKE_ID), 2))
+
+        with mock.patch.object(heartbeat_udp.LOG, 'info') as mock_info:
+            getter.check()
+            self.assertFalse(mock_info.called)
+            mock_time.return_value = 100 + heartbeat_udp.STATS_REPORT_INTERVAL
+            getter.check()
+            self.assertEqual(1, mock_info.call_count)
+            self.assertEqual(
+                {'packets_received': 2, 'packets_per_second': 2.0 / 60},
+                mock_info.call_args[0][1]['stats'])
+
+        # The status cache counters are reported with the others
+        self.health_update.get_cache_stats.return_value = {'hits': 1}
+        getter = heartbeat_udp.UDPStatusGetter(self.health_update, None)
+        getter.dorecv = mock.Mock(side_effect=socket.timeout)
+        with mock.patch.object(heartbeat_udp.LOG, 'info') as mock_info:
+            mock_time.return_value = 100 + 2 * (
+                heartbeat_udp.STATS_REPORT_INTERVAL)
+            getter.check()
+            getter.executor.shutdown()
+            self.assertEqual({'hits': 1},
+                             mock_info.call_args[0][1]['stats']
+                             ['status_cache'])
+
+    @mock.patch('octavia.amphorae.backends.health_daemon.status_message.'
+                'unwrap_envelope')
+    @mock.patch('socket.getaddrinfo')
+    @mock.patch('socket.socket')
+    def test_dorecv_batch(self, mock_socket, mock_getaddrinfo,
+                          mock_unwrap):
+        socket_mock = mock.MagicMock()
+        mock_socket.return_value = socket_mock
+        mock_getaddrinfo.return_value = [range(1, 6)]
+        self.conf.config(group="health_manager",
+                         heartbeat_recv_batch_size=4)
+        messages = [b'msg1', b'bad', b'msg3']
+
+        def recvfrom_into(buf):
+            if not messages:
+                raise socket.error(errno.EAGAIN, 'Resource unavailable')
+            msg = messages.pop(0)
+            buf[:len(msg)] = msg
+            return len(msg), 2
+
+        def unwrap(data, key):
+            if bytes(data) == b'bad':
+                raise exceptions.InvalidHMACException()
+            return {'msg': bytes(data)}
+
+        socket_mock.recvfrom_into.side_effect = recvfrom_into
+        socket_mock.gettimeout.return_value = None
+        mock_unwrap.side_effect = unwrap
+
+        getter = heartbeat_udp.UDPStatusGetter(None, None)
+        self.assertEqual(4, len(getter.recv_buffers))
+        self.assertEqual([({'msg': b'msg1'}, 2), ({'msg': b'msg3'}, 2)],
+                         getter.dorecv_batch())
+        self.assertEqual(4, socket_mock.recvfrom_into.call_count)
+        socket_mock.settimeout.assert_has_calls([mock.call(0.0),
+                                                 mock.call(None)])
+        # The payloads are passed to unwrap_envelope without copying them
+        self.assertIsInstance(mock_unwrap.call_args[0][0], memoryview)
+
+    def _malformed_heartbeats(self):
+        uuid = '11111111-2222-3333-4444-555555555555'
+        payload = status_message.encode_binary_obj(
+            {'id': uuid, 'seq': 1, 'listeners': {uuid: {
+                'status': 'OPEN',
+                'stats': {'rx': 1, 'tx': 2, 'conns': 3, 'totconns': 4},
+                'pools': {uuid: {'status': 'UP',
+                                 'members': {uuid: 'UP'}}}}}})
+        # The status of the member is the byte before the empty extras
+        unknown_status = payload[:-2] + b'\x7f' + payload[-1:]
+        payloads = [unknown_status, payload[:-10], b'\x78garbage',
+                    zlib.compress(b'{"id":')]
+        return [data + status_message.get_hmac(data, KEY)
+                for data in payloads]
+
+    @mock.patch('socket.getaddrinfo')
+    @mock.patch('socket.socket')
+    def test_dorecv_batch_malformed(self, mock_socket, mock_getaddrinfo):
+        socket_mock = mock.MagicMock()
+        mock_socket.return_value = socket_mock
+        mock_getaddrinfo.return_value = [range(1, 6)]
+        self.conf.config(group="health_manager",
+                         heartbeat_recv_batch_size=8)
+        good = status_message.wrap_envelope({'id': FAKE_ID}, KEY)
+        messages = [good] + self._malformed_heartbeats() + [good]
+
+        def recvfrom_into(buf):
+            if not messages:
+                raise socket.error(errno.EAGAIN, 'Resource unavailable')
+            msg = messages.pop(0)
+            buf[:len(msg)] = msg
+            return len(msg), 2
+
+        socket_mock.recvfrom_into.side_effect = recvfrom_into
+        socket_mock.gettimeout.return_value = None
+
+        # Only the malformed heartbeats are dropped from the batch
+        getter = heartbeat_udp.UDPStatusGetter(None, None)
+        self.assertEqual([({'id': FAKE_ID}, 2), ({'id': FAKE_ID}, 2)],
+                         getter.dorecv_batch())
+
+    @mock.patch('socket.getaddrinfo')
+    @mock.patch('socket.socket')
+    def test_check_malformed(self, mock_socket, mock_getaddrinfo):
+        socket_mock = mock.MagicMock()
+        mock_socket.return_value = socket_mock
+        mock_getaddrinfo.return_value = [range(1, 6)]
+        socket_mock.recvfrom.side_effect = [
+            (data, 2) for data in self._malformed_heartbeats()]
+
+        getter = heartbeat_udp.UDPStatusGetter(
+            self.health_update, self.stats_update)
+        for i in range(4):
+            getter.check()
+        getter.shutdown()
+
+        self.assertEqual(4, socket_mock.recvfrom.call_count)
+        self.assertFalse(self.health_update.update_liveness.called)
+        self.assertFalse(self.stats_update.update_stats.called)
+
+    @mock.patch('socket.getaddrinfo')
+    @mock.patch('socket.socket')
+    def test_check_recv_batch(self, mock_socket, mock_getaddrinfo):
+        mock_getaddrinfo.return_value = [range(1, 6)]
+        self.conf.config(group="health_manager",
+                         heartbeat_recv_batch_size=4)
+
+        getter = heartbeat_udp.UDPStatusGetter(
+            self.health_update, self.stats_update)
+        getter.dorecv = mock.Mock()
+        getter.dorecv_batch = mock.Mock(
+            return_value=[(dict(id=FAKE_ID), 2), (dict(id=2), 2)])
+
+        getter.check()
+        getter.shutdown()
+
+        self.assertFalse(getter.dorecv.called)
+        self.assertEqual(2, getter.get_stats()['packets_received'])
+        self.health_update.update_liveness.assert_has_calls(
+            [mock.call({'id': FAKE_ID}), mock.call({'id': 2})],
+            any_order=True)
+        self.assertEqual(2, self.stats_update.update_stats.call_count)
+
+    def test_batcher_keeps_snapshot(self):
+        batcher = heartbeat_udp.HeartbeatBatcher(10, 10)
+        batcher.add(dict(id=FAKE_ID, seq=1))
+        batcher.add(dict(id=FAKE_ID, seq=2, delta=1))
+        self.assertEqual([{'id': FAKE_ID, 'seq': 1}], batcher.drain())
+
+        batcher.add(dict(id=FAKE_ID, seq=3, delta=1))
+        batcher.add(dict(id=FAKE_ID, seq=4, delta=1))
+        self.assertEqual([{'id': FAKE_ID, 'seq': 4, 'delta': 1}],
+                         batcher.drain())
+
+    @mock.patch('octavia.amphorae.backends.health_daemon.'
+                'status_message.wrap_envelope')
+    @mock.patch('socket.getaddrinfo')
+    @mock.patch('socket.socket')
+    def test_check_snapshot_requests(self, mock_socket, mock_getaddrinfo,
+                                     mock_wrap):
+        socket_mock = mock.MagicMock()
+        mock_socket.return_value = socket_mock
+        mock_getaddrinfo.return_value = [range(1, 6)]
+        mock_wrap.return_value = b'request'
+        self.conf.config(group="health_manager",
+                         heartbeat_snapshot_interval=6)
+        self.health_update.pop_snapshot_requests.side_effect = [
+            set([FAKE_ID, 'unknown']), set([FAKE_ID])]
+
+        getter = heartbeat_udp.UDPStatusGetter(self.health_update, None)
+        getter.dorecv = mock.Mock(
+            return_value=(dict(id=FAKE_ID, seq=2, delta=1),
+                          ('192.0.2.20', 1234)))
+
+        getter.check()
+        mock_wrap.assert_called_once_with(
+            {'id': FAKE_ID, 'request': 'snapshot'}, KEY)
+        socket_mock.sendto.assert_called_once_with(
+            b'request', ('192.0.2.20', 1234))
+
+        # A send failure is only logged
+        socket_mock.sendto.side_effect = socket.error
+        getter.check()
+        getter.executor.shutdown()
+        self.assertEqual(2, socket_mock.sendto.call_count)
+
+    @mock.patch('socket.getaddrinfo')
+    @mock.patch('socket.socket')
+    def test_check_stats_executor(self, mock_socket, mock_getaddrinfo):
+        mock_getaddrinfo.return_value = [range(1, 6)]
+        getter = heartbeat_udp.UDPStatusGetter(
+            self.health_update, self.stats_update)
+        self.assertIs(getter.executor, getter.stats_executor)
+
+        self.conf.config(group="health_manager", stats_flush_interval=30)
+        getter = heartbeat_udp.UDPStatusGetter(
+            self.health_update, self.stats_update)
+        self.assertIsNot(getter.executor, getter.stats_executor)
+        getter.dorecv = mock.Mock(return_value=(dict(id=FAKE_ID), 2))
+
+        getter.check()
+        getter.shutdown()
+
+        self.health_update.update_liveness.assert_called_once_with(
+            {'id': FAKE_ID})
+        self.stats_update.update_stats.assert_called_once_with(
+            {'id': FAKE_ID})
+
+    @mock.patch('time.time')
+    @mock.patch('socket.getaddrinfo')
+    @mock.patch('socket.socket')
+    def test_check_stats_flush(self, mock_socket, mock_getaddrinfo,
+                               mock_time):
+        socket_mock = mock.MagicMock()
+        mock_socket.return_value = socket_mock
+        mock_getaddrinfo.return_value = [range(1, 6)]
+        mock_time.return_value = 100
+        self.conf.config(group="health_manager", heartbeat_batch_window=60)
+        self.conf.config(group="health_manager", stats_flush_interval=30)
+
+        getter = heartbeat_udp.UDPStatusGetter(
+            self.health_update, self.stats_update)
+        # The socket wakes up in time for the stats to be flushed
+        socket_mock.settimeout.assert_called_once_with(30)
+        getter.dorecv = mock.Mock(side_effect=socket.timeout)
+
+        mock_time.return_value = 120
+        getter.check()
+        mock_time.return_value = 130
+        getter.check()
+        getter.check()
+        getter.stats_executor.shutdown()
+        getter.executor.shutdown()
+
+        self.stats_update.flush_if_due.assert_called_once_with()
+        self.assertFalse(self.stats_update.update_stats_batch.called)
+
+    @mock.patch('socket.getaddrinfo')
+    @mock.patch('socket.socket')
+    def test_shutdown(self, mock_socket, mock_getaddrinfo):
+        socket_mock = mock.MagicMock()
+        mock_socket.return_value = socket_mock
+        mock_getaddrinfo.return_value = [range(1, 6)]
+        self.conf.config(group="health_manager", heartbeat_batch_window=10)
+        self.conf.config(group="health_manager", stats_flush_interval=30)
+
+        getter = heartbeat_udp.UDPStatusGetter(
+            self.health_update, self.stats_update)
+        getter.dorecv = mock.Mock(return_value=(dict(id=FAKE_ID, seq=1), 2))
+        getter.check()
+        self.assertFalse(self.health_update.update_health_batch.called)
+
+        # The buffered heartbeats and the gathered stats are written
+        self.stats_update.flush.side_effect = Exception('boom')
+        getter.shutdown()
+        batch = [{'id': FAKE_ID, 'seq': 1}]
+        self.health_update.update_health_batch.assert_called_once_with(batch)
+        self.stats_update.update_stats_batch.assert_called_once_with(batch)
+        self.stats_update.flush.assert_called_once_with()
+        socket_mock.close.assert_called_once_with()
+
+        # Without a flush interval the stats are already written
+        self.conf.config(group="health_manager", stats_flush_interval=0)
+        self.stats_update.reset_mock()
+        getter = heartbeat_udp.UDPStatusGetter(
+            self.health_update, self.stats_update)
+        getter.shutdown()
+        self.assertFalse(self.stats_update.flush.called)
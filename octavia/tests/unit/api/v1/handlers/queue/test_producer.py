@@ -187,6 +187,20 @@ class TestProducer(base.TestCase):
         self.mck_client.cast.assert_called_once_with(
             {}, 'update_member', **kw)
 
+    def test_batch_update_members(self):
+        p = producer.MemberProducer()
+        new_member = data_models.Member(id=10)
+        updated_member = data_models.Member(id=11)
+        deleted_member = data_models.Member(id=12)
+        member_updates = member.MemberPUT(enabled=False)
+        p.batch_update([new_member], [(updated_member, member_updates)],
+                       [deleted_member])
+        kw = {'new_member_ids': [10],
+              'updated_members': [{'id': 11, 'enabled': False}],
+              'deleted_member_ids': [12]}
+        self.mck_client.cast.assert_called_once_with(
+            {}, 'batch_update_members', **kw)
+
     def test_create_l7policy(self):
         p = producer.L7PolicyProducer()
         p.create(self.mck_model)
@@ -0,0 +1,36 @@
+#    Copyright 2016 Hewlett-Packard Development Company, L.P.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from octavia.cmd import agent
+from octavia.tests.unit import base
+
+
+class TestAgentCMD(base.TestCase):
+
+    def test_request_handler(self):
+        self.assertEqual('HTTP/1.1',
+                         agent.OctaviaRequestHandler.protocol_version)
+
+    def test_serialized(self):
+        result = mock.MagicMock()
+        result.__iter__.return_value = iter([b'a', b'b'])
+        app = mock.Mock(return_value=result)
+        start_response = mock.Mock()
+
+        self.assertEqual([b'a', b'b'], agent.serialized(app)(
+            {'PATH_INFO': '/'}, start_response))
+        app.assert_called_once_with({'PATH_INFO': '/'}, start_response)
+        result.close.assert_called_once_with()
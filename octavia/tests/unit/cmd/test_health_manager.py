@@ -12,7 +12,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import signal
+
 import mock
+from oslo_config import cfg
+from oslo_config import fixture as oslo_fixture
 
 from octavia.cmd import health_manager
 from octavia.tests.unit import base
@@ -23,13 +27,15 @@ class TestHealthManagerCMD(base.TestCase):
     def setUp(self):
         super(TestHealthManagerCMD, self).setUp()
 
+    @mock.patch('signal.signal')
     @mock.patch('octavia.controller.healthmanager.'
                 'update_db.UpdateStatsDb')
     @mock.patch('octavia.controller.healthmanager.'
                 'update_db.UpdateHealthDb')
     @mock.patch('octavia.amphorae.drivers.health.'
                 'heartbeat_udp.UDPStatusGetter')
-    def test_hm_listener(self, mock_getter, mock_health, mock_stats):
+    def test_hm_listener(self, mock_getter, mock_health, mock_stats,
+                         mock_signal):
         getter_mock = mock.MagicMock()
         check_mock = mock.MagicMock()
         getter_mock.check = check_mock
@@ -39,6 +45,14 @@ class TestHealthManagerCMD(base.TestCase):
                                 health_manager.hm_listener)
         mock_getter.assert_called_once_with(mock_health(), mock_stats())
         self.assertEqual(2, getter_mock.check.call_count)
+        getter_mock.shutdown.assert_called_once_with()
+        mock_signal.assert_has_calls([
+            mock.call(signal.SIGTERM, health_manager._handle_sigterm),
+            mock.call(signal.SIGTERM, signal.SIG_IGN)])
+
+    def test_handle_sigterm(self):
+        self.assertRaises(SystemExit, health_manager._handle_sigterm,
+                          signal.SIGTERM, None)
 
     @mock.patch('octavia.controller.healthmanager.'
                 'health_manager.HealthManager')
@@ -85,3 +99,24 @@ class TestHealthManagerCMD(base.TestCase):
         mock_health_proc.start.assert_called_once_with()
         mock_listener_proc.join.assert_called_once_with()
         self.assertFalse(mock_health_proc.join.called)
+
+    @mock.patch('multiprocessing.Process')
+    @mock.patch('octavia.common.service.prepare_service')
+    def test_main_multiple_listeners(self, mock_service, mock_process):
+        self.conf = self.useFixture(oslo_fixture.Config(cfg.CONF))
+        self.conf.config(group="health_manager",
+                         heartbeat_listener_processes=3)
+        mock_listener_procs = [mock.MagicMock() for i in range(3)]
+        mock_health_proc = mock.MagicMock()
+
+        mock_process.side_effect = mock_listener_procs + [mock_health_proc]
+
+        health_manager.main()
+
+        mock_process.assert_any_call(name='HM_listener_0',
+                                     target=health_manager.hm_listener)
+        mock_process.assert_any_call(name='HM_listener_2',
+                                     target=health_manager.hm_listener)
+        for proc in mock_listener_procs + [mock_health_proc]:
+            proc.start.assert_called_once_with()
+            proc.join.assert_called_once_with()
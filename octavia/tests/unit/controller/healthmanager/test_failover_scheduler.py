@@ -0,0 +1,158 @@
+# Copyright 2016 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import threading
+
+from concurrent import futures
+import mock
+
+from octavia.common import constants
+from octavia.controller.healthmanager import failover_scheduler
+import octavia.tests.unit.base as base
+
+
+class TestFailoverScheduler(base.TestCase):
+
+    def test_get_priority(self):
+        self.assertEqual(
+            failover_scheduler.PRIORITY_NO_HEALTHY_PEER,
+            failover_scheduler.get_priority(constants.ROLE_BACKUP, 0))
+        self.assertEqual(
+            failover_scheduler.PRIORITY_ACTIVE,
+            failover_scheduler.get_priority(constants.ROLE_MASTER, 1))
+        self.assertEqual(
+            failover_scheduler.PRIORITY_ACTIVE,
+            failover_scheduler.get_priority(constants.ROLE_STANDALONE, 1))
+        self.assertEqual(
+            failover_scheduler.PRIORITY_BACKUP,
+            failover_scheduler.get_priority(constants.ROLE_BACKUP, 1))
+
+    @mock.patch('time.time')
+    def test_token_bucket(self, mock_time):
+        mock_time.return_value = 100
+        bucket = failover_scheduler.TokenBucket(0.5, 2)
+        self.assertEqual(0, bucket.consume())
+        self.assertEqual(0, bucket.consume())
+        self.assertEqual(2, bucket.consume())
+        mock_time.return_value = 101
+        self.assertEqual(1, bucket.consume())
+        mock_time.return_value = 102
+        self.assertEqual(0, bucket.consume())
+        # The bucket does not fill past the burst
+        mock_time.return_value = 200
+        self.assertEqual(0, bucket.consume())
+        self.assertEqual(0, bucket.consume())
+        self.assertEqual(2, bucket.consume())
+
+    def test_histogram(self):
+        histogram = failover_scheduler.Histogram(buckets=(1, 10,
+                                                          float('inf')))
+        for value in (0.5, 2, 3, 100):
+            histogram.observe(value)
+        stats = histogram.get_stats()
+        self.assertEqual({1: 1, 10: 2, float('inf'): 1}, stats['buckets'])
+        self.assertEqual(4, stats['count'])
+        self.assertEqual(26.375, stats['avg'])
+
+    def test_priority_order(self):
+        started = []
+        release = threading.Event()
+
+        def failover(amphora_id):
+            started.append(amphora_id)
+            if amphora_id == 'first':
+                release.wait(10)
+            if amphora_id == 'broken':
+                raise Exception('boom')
+
+        executor = futures.ThreadPoolExecutor(max_workers=1)
+        scheduler = failover_scheduler.FailoverScheduler(executor, failover,
+                                                         1)
+        scheduler.submit('first', failover_scheduler.PRIORITY_BACKUP)
+        # Wait for the first failover to hold the only running slot
+        for i in range(1000):
+            if started:
+                break
+            threading.Event().wait(0.01)
+        scheduler.submit('backup', failover_scheduler.PRIORITY_BACKUP)
+        scheduler.submit('broken', failover_scheduler.PRIORITY_ACTIVE)
+        scheduler.submit('no_peer',
+                         failover_scheduler.PRIORITY_NO_HEALTHY_PEER)
+        scheduler.submit('active', failover_scheduler.PRIORITY_ACTIVE)
+        stats = scheduler.get_stats()
+        self.assertEqual(4, stats['queue_depth'])
+        self.assertEqual(1, stats['running'])
+
+        release.set()
+        scheduler.stop()
+        executor.shutdown(wait=True)
+
+        self.assertEqual(['first', 'no_peer', 'broken', 'active', 'backup'],
+                         started)
+        stats = scheduler.get_stats()
+        self.assertEqual(0, stats['queue_depth'])
+        self.assertEqual(0, stats['running'])
+        self.assertEqual(5, stats['submitted'])
+        self.assertEqual(5, stats['started'])
+        self.assertEqual(4, stats['completed'])
+        self.assertEqual(1, stats['failed'])
+        self.assertEqual(5, stats['latency']['count'])
+        self.assertEqual(5, stats['wait']['count'])
+
+    @mock.patch('time.time')
+    def test_rate_limit(self, mock_time):
+        mock_time.return_value = 100
+        executor = mock.MagicMock()
+        scheduler = failover_scheduler.FailoverScheduler(
+            executor, mock.Mock(), 10, rate=0.001, burst=2)
+        for amphora_id in ('amp1', 'amp2', 'amp3'):
+            scheduler.submit(amphora_id)
+        for i in range(1000):
+            if scheduler.get_stats()['started'] == 2:
+                break
+            threading.Event().wait(0.01)
+
+        # The third failover waits for a token
+        stats = scheduler.get_stats()
+        self.assertEqual(2, stats['started'])
+        self.assertEqual(1, stats['queue_depth'])
+
+        # Stopping starts the queued failovers
+        scheduler.stop()
+        self.assertEqual(3, executor.submit.call_count)
+
+    def test_stop_after_pop(self):
+        executor = mock.MagicMock()
+        scheduler = failover_scheduler.FailoverScheduler(
+            executor, mock.Mock(), 1)
+
+        # Stop while the dispatcher starts the single failover it popped
+        def submit(run, amphora_id):
+            if amphora_id == 'amp1':
+                with scheduler._condition:
+                    scheduler._stopping = True
+        with scheduler._condition:
+            for amphora_id in ('amp1', 'amp2', 'amp3'):
+                scheduler.submit(amphora_id)
+            executor.submit.side_effect = submit
+        for i in range(1000):
+            if executor.submit.called:
+                break
+            threading.Event().wait(0.01)
+        scheduler.stop()
+
+        # The failovers queued behind it are still started
+        executor.submit.assert_has_calls(
+            [mock.call(scheduler._run, amphora_id)
+             for amphora_id in ('amp1', 'amp2', 'amp3')])
@@ -0,0 +1,58 @@
+# Copyright 2016 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+from oslo_utils import uuidutils
+
+from octavia.controller.healthmanager import hash_ring
+import octavia.tests.unit.base as base
+
+
+class TestHashRing(base.TestCase):
+
+    def setUp(self):
+        super(TestHashRing, self).setUp()
+        self.keys = [uuidutils.generate_uuid() for i in range(3000)]
+
+    def test_get_member_no_members(self):
+        ring = hash_ring.HashRing([])
+        self.assertIsNone(ring.get_member(self.keys[0]))
+
+    def test_get_member_is_stable(self):
+        ring_1 = hash_ring.HashRing(['hm1', 'hm2', 'hm3'])
+        ring_2 = hash_ring.HashRing(['hm3', 'hm1', 'hm2'])
+        self.assertEqual(['hm1', 'hm2', 'hm3'], ring_1.members)
+        for key in self.keys:
+            self.assertEqual(ring_1.get_member(key), ring_2.get_member(key))
+
+    def test_get_member_distribution(self):
+        ring = hash_ring.HashRing(['hm1', 'hm2', 'hm3'])
+        counts = {}
+        for key in self.keys:
+            member = ring.get_member(key)
+            counts[member] = counts.get(member, 0) + 1
+        self.assertEqual(set(['hm1', 'hm2', 'hm3']), set(counts))
+        for count in counts.values():
+            # Each member owns roughly a third of the keys
+            self.assertTrue(600 < count < 1400, counts)
+
+    def test_member_leaves(self):
+        ring = hash_ring.HashRing(['hm1', 'hm2', 'hm3'])
+        smaller_ring = hash_ring.HashRing(['hm1', 'hm2'])
+        for key in self.keys:
+            member = ring.get_member(key)
+            if member != 'hm3':
+                # Only the keys of the member that left move
+                self.assertEqual(member, smaller_ring.get_member(key))
+            else:
+                self.assertIn(smaller_ring.get_member(key), ('hm1', 'hm2'))
@@ -14,8 +14,11 @@
 
 import mock
 from oslo_config import cfg
+from oslo_config import fixture as oslo_fixture
 from oslo_utils import uuidutils
 
+from octavia.common import constants
+from octavia.controller.healthmanager import failover_scheduler
 from octavia.controller.healthmanager import health_manager as healthmanager
 import octavia.tests.unit.base as base
 
@@ -39,40 +42,183 @@ class TestHealthManager(base.TestCase):
 
     def setUp(self):
         super(TestHealthManager, self).setUp()
+        patcher = mock.patch('octavia.db.repositories.AmphoraRepository.'
+                             'get_failover_details', return_value={})
+        self.get_failover_details_mock = patcher.start()
+        self.addCleanup(patcher.stop)
 
     @mock.patch('octavia.controller.worker.controller_worker.'
                 'ControllerWorker.failover_amphora')
     @mock.patch('octavia.db.repositories.AmphoraHealthRepository.'
-                'get_stale_amphora')
+                'get_stale_amphorae')
     @mock.patch('time.sleep')
     @mock.patch('octavia.db.api.get_session')
     def test_health_check_stale_amphora(self, session_mock,
                                         sleep_mock, get_stale_amp_mock,
                                         failover_mock):
-        amphora_health = mock.MagicMock()
-        amphora_health.amphora_id = AMPHORA_ID
-
         session_mock.side_effect = [None, TestException('test')]
-        get_stale_amp_mock.side_effect = [amphora_health, None]
+        get_stale_amp_mock.side_effect = [[AMPHORA_ID]]
 
         hm = healthmanager.HealthManager()
         self.assertRaises(TestException, hm.health_check)
 
+        get_stale_amp_mock.assert_called_once_with(None, 10)
         failover_mock.assert_called_once_with(AMPHORA_ID)
 
     @mock.patch('octavia.controller.worker.controller_worker.'
                 'ControllerWorker.failover_amphora')
     @mock.patch('octavia.db.repositories.AmphoraHealthRepository.'
-                'get_stale_amphora', return_value=None)
+                'get_stale_amphorae')
+    @mock.patch('time.sleep')
+    @mock.patch('octavia.db.api.get_session')
+    def test_health_check_stale_amphora_batches(self, session_mock,
+                                                sleep_mock,
+                                                get_stale_amp_mock,
+                                                failover_mock):
+        conf = self.useFixture(oslo_fixture.Config(cfg.CONF))
+        conf.config(group="health_manager", stale_amphora_batch_size=2)
+        amp_ids = [uuidutils.generate_uuid() for i in range(3)]
+        session_mock.side_effect = [None, TestException('test')]
+        # A full batch is followed by another claim
+        get_stale_amp_mock.side_effect = [amp_ids[:2], amp_ids[2:]]
+
+        hm = healthmanager.HealthManager()
+        self.assertRaises(TestException, hm.health_check)
+
+        self.assertEqual(2, get_stale_amp_mock.call_count)
+        failover_mock.assert_has_calls([mock.call(amp_id)
+                                        for amp_id in amp_ids],
+                                       any_order=True)
+        self.assertEqual(3, failover_mock.call_count)
+
+    @mock.patch('octavia.controller.worker.controller_worker.'
+                'ControllerWorker.failover_amphora')
+    @mock.patch('octavia.db.repositories.AmphoraHealthRepository.'
+                'get_stale_amphorae', return_value=[])
     @mock.patch('time.sleep')
     @mock.patch('octavia.db.api.get_session')
     def test_health_check_nonestale_amphora(self, session_mock,
                                             sleep_mock, get_stale_amp_mock,
                                             failover_mock):
         session_mock.side_effect = [None, TestException('test')]
-        get_stale_amp_mock.return_value = None
+        get_stale_amp_mock.return_value = []
 
         hm = healthmanager.HealthManager()
         self.assertRaises(TestException, hm.health_check)
 
         self.assertFalse(failover_mock.called)
+
+    @mock.patch('octavia.controller.worker.controller_worker.'
+                'ControllerWorker.failover_amphora')
+    @mock.patch('octavia.db.repositories.HealthManagerMemberRepository')
+    @mock.patch('octavia.db.repositories.AmphoraHealthRepository.'
+                'get_stale_amphorae')
+    @mock.patch('octavia.db.repositories.AmphoraHealthRepository.'
+                'get_stale_amphora_ids')
+    @mock.patch('time.sleep')
+    @mock.patch('octavia.db.api.get_session')
+    def test_health_check_sharded(self, session_mock, sleep_mock,
+                                  get_stale_ids_mock, get_stale_amp_mock,
+                                  member_repo_mock, failover_mock):
+        conf = self.useFixture(oslo_fixture.Config(cfg.CONF))
+        conf.config(group="health_manager", health_check_sharding=True)
+        conf.config(host='hm1')
+        member_repo = member_repo_mock.return_value
+        member_repo.get_live_members.return_value = ['hm1', 'hm2']
+        amp_ids = [uuidutils.generate_uuid() for i in range(50)]
+        get_stale_ids_mock.return_value = amp_ids
+        get_stale_amp_mock.side_effect = lambda session, limit, amphora_ids: (
+            amphora_ids)
+        session_mock.side_effect = [None, TestException('test'), 'leave']
+
+        hm = healthmanager.HealthManager()
+        self.assertRaises(TestException, hm.health_check)
+
+        member_repo.replace.assert_called_once_with(
+            None, 'hm1', last_update=mock.ANY)
+        member_repo.delete.assert_called_once_with('leave', member_id='hm1')
+        # The stale amphorae are scanned once per health check
+        get_stale_ids_mock.assert_called_once_with(None)
+        # Only the amphorae of this health manager are failed over
+        owned = [amp_id for amp_id in amp_ids
+                 if hm.ring.get_member(amp_id) == 'hm1']
+        self.assertTrue(0 < len(owned) < len(amp_ids))
+        self.assertEqual(len(owned), failover_mock.call_count)
+        failover_mock.assert_has_calls([mock.call(amp_id)
+                                        for amp_id in owned],
+                                       any_order=True)
+        for call in get_stale_amp_mock.call_args_list:
+            self.assertTrue(len(call[1]['amphora_ids']) <= 10)
+
+    @mock.patch('octavia.controller.worker.controller_worker.'
+                'ControllerWorker.failover_amphora')
+    @mock.patch('octavia.db.repositories.AmphoraHealthRepository.count')
+    @mock.patch('octavia.db.repositories.AmphoraHealthRepository.'
+                'get_stale_amphora_ids')
+    @mock.patch('octavia.db.repositories.AmphoraHealthRepository.'
+                'get_stale_amphorae')
+    @mock.patch('time.sleep')
+    @mock.patch('octavia.db.api.get_session')
+    def test_health_check_paused(self, session_mock, sleep_mock,
+                                 get_stale_amp_mock, get_stale_ids_mock,
+                                 count_mock, failover_mock):
+        conf = self.useFixture(oslo_fixture.Config(cfg.CONF))
+        conf.config(group="health_manager", failover_pause_threshold=50)
+        count_mock.return_value = 10
+        # 6 of 10 amphorae are stale, then 2 of 10
+        get_stale_ids_mock.side_effect = [['amp%d' % i for i in range(6)],
+                                          ['amp1', 'amp2']]
+        get_stale_amp_mock.return_value = ['amp1', 'amp2']
+        session_mock.side_effect = [None, None, TestException('test')]
+
+        hm = healthmanager.HealthManager()
+        self.assertRaises(TestException, hm.health_check)
+
+        # Nothing is claimed while the failovers are paused
+        get_stale_amp_mock.assert_called_once_with(None, 10)
+        self.assertFalse(hm.failovers_paused)
+        self.assertEqual(2, failover_mock.call_count)
+        self.assertEqual(2, get_stale_ids_mock.call_count)
+
+    @mock.patch('octavia.db.repositories.AmphoraHealthRepository')
+    def test_should_pause_failovers(self, amp_health_repo_mock):
+        conf = self.useFixture(oslo_fixture.Config(cfg.CONF))
+        amp_health_repo = amp_health_repo_mock.return_value
+        hm = healthmanager.HealthManager()
+
+        # Nothing scans the stale amphorae without sharding or a threshold
+        self.assertIsNone(hm._get_stale_amphora_ids(None, amp_health_repo))
+        amp_health_repo.get_stale_amphora_ids.assert_not_called()
+
+        conf.config(group="health_manager", failover_pause_threshold=50)
+        # A single stale amphora never pauses and the fleet is not counted
+        self.assertFalse(hm._should_pause_failovers(None, amp_health_repo,
+                                                    ['amp1']))
+        amp_health_repo.count.assert_not_called()
+
+    @mock.patch('octavia.controller.healthmanager.failover_scheduler.'
+                'FailoverScheduler')
+    @mock.patch('octavia.db.repositories.AmphoraHealthRepository.'
+                'get_stale_amphorae')
+    @mock.patch('time.sleep')
+    @mock.patch('octavia.db.api.get_session')
+    def test_health_check_priorities(self, session_mock, sleep_mock,
+                                     get_stale_amp_mock, scheduler_mock):
+        session_mock.side_effect = [None, TestException('test')]
+        get_stale_amp_mock.return_value = ['master', 'backup', 'alone',
+                                           'gone']
+        self.get_failover_details_mock.return_value = {
+            'master': (constants.ROLE_MASTER, 1),
+            'backup': (constants.ROLE_BACKUP, 1),
+            'alone': (constants.ROLE_STANDALONE, 0)}
+
+        hm = healthmanager.HealthManager()
+        self.assertRaises(TestException, hm.health_check)
+
+        scheduler = scheduler_mock.return_value
+        scheduler.submit.assert_has_calls([
+            mock.call('master', failover_scheduler.PRIORITY_ACTIVE),
+            mock.call('backup', failover_scheduler.PRIORITY_BACKUP),
+            mock.call('alone', failover_scheduler.PRIORITY_NO_HEALTHY_PEER),
+            mock.call('gone', failover_scheduler.PRIORITY_ACTIVE)])
+        scheduler.stop.assert_called_once_with()
@@ -0,0 +1,64 @@
+# Copyright 2016 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import mock
+
+from octavia.common import constants
+from octavia.controller.healthmanager import status_cache
+from octavia.tests.unit import base
+
+
+class TestStatusCache(base.TestCase):
+
+    def setUp(self):
+        super(TestStatusCache, self).setUp()
+        self.cache = status_cache.StatusCache(2, 10)
+
+    def test_get_set(self):
+        self.assertIsNone(self.cache.get('id-1'))
+        self.cache.set('id-1', constants.ONLINE)
+        self.assertEqual(constants.ONLINE, self.cache.get('id-1'))
+        self.assertEqual({'size': 1, 'hits': 1, 'misses': 1,
+                          'evictions': 0, 'invalidations': 0},
+                         self.cache.get_stats())
+
+    def test_max_size(self):
+        self.cache.set('id-1', constants.ONLINE)
+        self.cache.set('id-2', constants.ONLINE)
+        # id-1 is now the most recently used entry
+        self.cache.get('id-1')
+        self.cache.set('id-3', constants.ERROR)
+        self.assertIsNone(self.cache.get('id-2'))
+        self.assertEqual(constants.ONLINE, self.cache.get('id-1'))
+        self.assertEqual(constants.ERROR, self.cache.get('id-3'))
+        self.assertEqual(1, self.cache.get_stats()['evictions'])
+
+    @mock.patch('time.time')
+    def test_ttl(self, mock_time):
+        mock_time.return_value = 100
+        self.cache.set('id-1', constants.ONLINE)
+        mock_time.return_value = 110
+        self.assertEqual(constants.ONLINE, self.cache.get('id-1'))
+        mock_time.return_value = 111
+        self.assertIsNone(self.cache.get('id-1'))
+        stats = self.cache.get_stats()
+        self.assertEqual(0, stats['size'])
+        self.assertEqual(1, stats['evictions'])
+
+    def test_invalidate(self):
+        self.cache.set('id-1', constants.ONLINE)
+        self.cache.invalidate('id-1')
+        self.cache.invalidate('id-2')
+        self.assertIsNone(self.cache.get('id-1'))
+        self.assertEqual(1, self.cache.get_stats()['invalidations'])
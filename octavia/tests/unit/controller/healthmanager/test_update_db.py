@@ -13,6 +13,7 @@
 # under the License.
 
 import random
+import time
 
 import mock
 from oslo_config import cfg
@@ -45,15 +46,19 @@ class TestUpdateHealthDb(base.TestCase):
         self.pool_repo = mock.MagicMock()
 
         self.hm.amphora_repo = self.amphora_repo
-        fake_lb = mock.MagicMock()
-        self.hm.amphora_repo.get_all_lbs_on_amphora.return_value = [fake_lb]
+        self.hm.amphora_repo.get_lb_and_listener_count.return_value = (
+            self.FAKE_UUID_1, 1)
         self.hm.amphora_health_repo = self.amphora_health_repo
         self.hm.listener_repo = self.listener_repo
-        self.hm.listener_repo.count.return_value = 1
         self.hm.loadbalancer_repo = self.loadbalancer_repo
         self.hm.member_repo = self.member_repo
         self.hm.pool_repo = self.pool_repo
 
+    def _enable_status_cache(self):
+        hm = update_db.UpdateHealthDb()
+        self.hm.status_cache = hm.status_cache
+        self.hm._reported_objects = hm._reported_objects
+
     @mock.patch('octavia.db.api.get_session')
     def test_update_health_event_stream(self, session):
         health = {
@@ -91,11 +96,13 @@ class TestUpdateHealthDb(base.TestCase):
         session.return_value = 'blah'
         lb = mock.MagicMock()
         lb.operating_status.lower.return_value = 'blah'
-        self.amphora_repo.get.load_balancer_id.return_value = self.FAKE_UUID_1
+        self.amphora_repo.get_lb_and_listener_count.return_value = (
+            self.FAKE_UUID_1, 0)
         self.loadbalancer_repo.get.return_value = lb
 
         self.hm.update_health(health)
-        self.assertTrue(self.amphora_repo.get.called)
+        self.assertTrue(self.amphora_repo.get_lb_and_listener_count.called)
+        self.assertTrue(self.amphora_health_repo.replace.called)
         self.assertTrue(lb.operating_status.lower.called)
         self.assertTrue(self.loadbalancer_repo.update.called)
 
@@ -136,7 +143,8 @@ class TestUpdateHealthDb(base.TestCase):
                         'blah', member_id,
                         operating_status=constants.ONLINE)
 
-        self.hm.listener_repo.count.return_value = 2
+        self.hm.amphora_repo.get_lb_and_listener_count.return_value = (
+            self.FAKE_UUID_1, 2)
 
         self.hm.update_health(health)
 
@@ -179,7 +187,8 @@ class TestUpdateHealthDb(base.TestCase):
                         'blah', member_id,
                         operating_status=constants.ERROR)
 
-        self.hm.listener_repo.count.return_value = 2
+        self.hm.amphora_repo.get_lb_and_listener_count.return_value = (
+            self.FAKE_UUID_1, 2)
 
         self.hm.update_health(health)
 
@@ -223,7 +232,8 @@ class TestUpdateHealthDb(base.TestCase):
                         'blah', member_id,
                         operating_status=constants.NO_MONITOR)
 
-        self.hm.listener_repo.count.return_value = 2
+        self.hm.amphora_repo.get_lb_and_listener_count.return_value = (
+            self.FAKE_UUID_1, 2)
 
         self.hm.update_health(health)
 
@@ -266,7 +276,8 @@ class TestUpdateHealthDb(base.TestCase):
                         'blah', member_id,
                         operating_status=constants.ERROR)
 
-        self.hm.listener_repo.count.return_value = 2
+        self.hm.amphora_repo.get_lb_and_listener_count.return_value = (
+            self.FAKE_UUID_1, 2)
 
         self.hm.update_health(health)
 
@@ -447,6 +458,380 @@ class TestUpdateHealthDb(base.TestCase):
         self.pool_repo.update.assert_not_called()
         self.member_repo.update.assert_not_called()
 
+    @mock.patch('octavia.db.api.get_session')
+    def test_update_health_batch(self, session):
+        health_1 = {
+            "id": self.FAKE_UUID_1,
+            "listeners": {
+                "listener-id-1": {"status": constants.OPEN, "pools": {}}}}
+        health_2 = {
+            "id": uuidutils.generate_uuid(),
+            "listeners": {
+                "listener-id-2": {"status": constants.OPEN, "pools": {}}}}
+        mock_session = mock.MagicMock()
+        session.return_value = mock_session
+
+        self.hm.update_health_batch([health_1, health_2])
+
+        session.assert_called_once_with()
+        # The amphora health is committed before the status updates
+        mock_session.begin.assert_has_calls(
+            [mock.call(subtransactions=True),
+             mock.call(subtransactions=True)], any_order=True)
+        self.assertEqual(2, mock_session.begin.call_count)
+        self.assertEqual(2, self.amphora_health_repo.replace.call_count)
+        self.amphora_health_repo.replace.assert_any_call(
+            mock_session, health_1['id'], last_update=mock.ANY)
+        self.amphora_health_repo.replace.assert_any_call(
+            mock_session, health_2['id'], last_update=mock.ANY)
+        self.listener_repo.update.assert_any_call(
+            mock_session, 'listener-id-1', operating_status=constants.ONLINE)
+        self.listener_repo.update.assert_any_call(
+            mock_session, 'listener-id-2', operating_status=constants.ONLINE)
+
+    @mock.patch('octavia.db.api.get_session')
+    def test_update_health_batch_missing_member(self, session):
+        cfg.CONF.set_override(group='health_manager',
+                              name='status_cache_size', override=100)
+        self.addCleanup(cfg.CONF.clear_override, 'status_cache_size',
+                        group='health_manager')
+        self._enable_status_cache()
+        health_1 = {
+            "id": self.FAKE_UUID_1,
+            "listeners": {
+                "listener-id-1": {"status": constants.OPEN, "pools": {
+                    "pool-id-1": {"status": constants.UP,
+                                  "members": {"member-id-1": constants.UP}
+                                  }}}}}
+        health_2 = {
+            "id": uuidutils.generate_uuid(),
+            "listeners": {
+                "listener-id-2": {"status": constants.OPEN, "pools": {}}}}
+        mock_session = mock.MagicMock()
+        session.return_value = mock_session
+        # The member was deleted while the amphora still reports it
+        self.member_repo.get.return_value = None
+
+        self.hm.update_health_batch([health_1, health_2])
+
+        self.assertFalse(self.member_repo.update.called)
+        self.assertIsNone(self.hm.status_cache.get(
+            (constants.MEMBER, 'member-id-1')))
+        for listener_id in ('listener-id-1', 'listener-id-2'):
+            self.listener_repo.update.assert_any_call(
+                mock_session, listener_id, operating_status=constants.ONLINE)
+            self.event_client.cast.assert_any_call(
+                {}, 'update_info', container={
+                    'info_type': 'listener', 'info_id': listener_id,
+                    'info_payload': {'operating_status': 'ONLINE'}})
+            self.assertEqual(constants.ONLINE, self.hm.status_cache.get(
+                (constants.LISTENER, listener_id)))
+        self.pool_repo.update.assert_called_once_with(
+            mock_session, 'pool-id-1', operating_status=constants.ONLINE)
+
+        # Nothing is cached nor emitted if the statuses are not committed
+        self._enable_status_cache()
+        self.event_client.cast.reset_mock()
+        mock_session.begin.return_value.__exit__.side_effect = [
+            False, sqlalchemy.exc.OperationalError('commit', {}, None),
+            sqlalchemy.exc.OperationalError('commit', {}, None),
+            sqlalchemy.exc.OperationalError('commit', {}, None)]
+        self.hm.update_health_batch([health_1, health_2])
+        self.event_client.cast.assert_not_called()
+        self.assertEqual(0, self.hm.get_cache_stats()['size'])
+
+    @mock.patch('octavia.db.api.get_session')
+    def test_update_health_batch_failure(self, session):
+        health_1 = {
+            "id": self.FAKE_UUID_1,
+            "listeners": {
+                "listener-id-1": {"status": constants.OPEN, "pools": {}}}}
+        health_2 = {
+            "id": uuidutils.generate_uuid(),
+            "listeners": {
+                "listener-id-2": {"status": constants.OPEN, "pools": {}}}}
+        health_3 = {
+            "id": uuidutils.generate_uuid(),
+            "listeners": {
+                "listener-id-3": {"status": constants.OPEN, "pools": {}}}}
+        mock_session = mock.MagicMock()
+        session.return_value = mock_session
+        error = sqlalchemy.exc.OperationalError('lock', {}, None)
+
+        def replace(session, amphora_id, **kwargs):
+            if amphora_id == health_2['id']:
+                raise error
+        self.amphora_health_repo.replace.side_effect = replace
+
+        def update(session, listener_id, **kwargs):
+            if listener_id == 'listener-id-3':
+                raise error
+        self.listener_repo.update.side_effect = update
+
+        self.hm.update_health_batch([health_1, health_2, health_3])
+
+        # The batch is written again one heartbeat per transaction
+        self.assertEqual(2 + 3, self.amphora_health_repo.replace.call_count)
+        self.assertEqual(1 + 3 + 1 + 2, mock_session.begin.call_count)
+        # The amphora whose health failed gets no status update
+        self.listener_repo.update.assert_has_calls([
+            mock.call(mock_session, 'listener-id-1',
+                      operating_status=constants.ONLINE),
+            mock.call(mock_session, 'listener-id-3',
+                      operating_status=constants.ONLINE),
+            mock.call(mock_session, 'listener-id-1',
+                      operating_status=constants.ONLINE),
+            mock.call(mock_session, 'listener-id-3',
+                      operating_status=constants.ONLINE)])
+        # Only the statuses that were committed are emitted
+        self.assertEqual(['listener-id-1'], [
+            call[1]['container']['info_id']
+            for call in self.event_client.cast.call_args_list
+            if call[1]['container']['info_type'] == 'listener'])
+
+    @mock.patch('octavia.db.api.get_session')
+    def test_update_health_bulk(self, session):
+        cfg.CONF.set_override(group='health_manager',
+                              name='bulk_status_update', override=True)
+        self.addCleanup(cfg.CONF.clear_override, 'bulk_status_update',
+                        group='health_manager')
+        health = {
+            "id": self.FAKE_UUID_1,
+            "listeners": {
+                "listener-id-1": {"status": constants.OPEN, "pools": {
+                    "pool-id-1": {"status": constants.UP,
+                                  "members": {"member-id-1": constants.UP,
+                                              "member-id-2": constants.DOWN,
+                                              "member-id-3": constants.UP}
+                                  }
+                }
+                }
+            }
+        }
+        session.return_value = 'blah'
+        self.amphora_repo.get_lb_and_listener_count.return_value = (
+            'lb-id-1', 1)
+        self.listener_repo.get_operating_statuses.return_value = {
+            'listener-id-1': constants.ONLINE}
+        self.pool_repo.get_operating_statuses.return_value = {
+            'pool-id-1': constants.ONLINE}
+        self.member_repo.get_operating_statuses.return_value = {
+            'member-id-1': constants.OFFLINE,
+            'member-id-2': constants.ERROR}
+        self.loadbalancer_repo.get_operating_statuses.return_value = {
+            'lb-id-1': constants.ONLINE}
+
+        self.hm.update_health(health)
+
+        self.member_repo.get_operating_statuses.assert_called_once_with(
+            'blah', ['member-id-1', 'member-id-2', 'member-id-3'])
+        self.listener_repo.update_operating_statuses.assert_called_once_with(
+            'blah', {})
+        self.member_repo.update_operating_statuses.assert_called_once_with(
+            'blah', {'member-id-1': constants.ONLINE})
+        self.pool_repo.update_operating_statuses.assert_called_once_with(
+            'blah', {'pool-id-1': constants.DEGRADED})
+        self.loadbalancer_repo.update_operating_statuses.\
+            assert_called_once_with('blah', {'lb-id-1': constants.DEGRADED})
+        self.assertFalse(self.member_repo.get.called)
+        self.assertFalse(self.member_repo.update.called)
+        self.assertEqual(3, self.event_client.cast.call_count)
+        self.event_client.cast.assert_any_call(
+            {}, 'update_info', container={
+                'info_type': 'member', 'info_id': 'member-id-1',
+                'info_payload': {'operating_status': 'ONLINE'}})
+        self.event_client.cast.assert_any_call(
+            {}, 'update_info', container={
+                'info_type': 'pool', 'info_id': 'pool-id-1',
+                'info_payload': {'operating_status': 'DEGRADED'}})
+        self.event_client.cast.assert_any_call(
+            {}, 'update_info', container={
+                'info_type': 'loadbalancer', 'info_id': 'lb-id-1',
+                'info_payload': {'operating_status': 'DEGRADED'}})
+
+    @mock.patch('octavia.db.api.get_session')
+    def test_update_health_status_cache(self, session):
+        self.assertIsNone(self.hm.get_cache_stats())
+        cfg.CONF.set_override(group='health_manager',
+                              name='status_cache_size', override=100)
+        self.addCleanup(cfg.CONF.clear_override, 'status_cache_size',
+                        group='health_manager')
+        self._enable_status_cache()
+        health = {
+            "id": self.FAKE_UUID_1,
+            "listeners": {
+                "listener-id-1": {"status": constants.OPEN, "pools": {
+                    "pool-id-1": {"status": constants.UP,
+                                  "members": {"member-id-1": constants.UP,
+                                              "member-id-2": constants.UP}
+                                  }
+                }
+                }
+            }
+        }
+        session.return_value = 'blah'
+        member = mock.MagicMock()
+        self.member_repo.get.side_effect = [member, None, member]
+
+        self.hm.update_health(health)
+        self.assertEqual(2, self.member_repo.get.call_count)
+        self.assertEqual(1, self.listener_repo.get.call_count)
+        self.assertEqual(1, self.pool_repo.get.call_count)
+
+        # Only the member that was not found is looked up again
+        self.member_repo.get.reset_mock()
+        self.listener_repo.get.reset_mock()
+        self.pool_repo.get.reset_mock()
+        self.hm.update_health(health)
+        self.member_repo.get.assert_called_once_with(
+            'blah', relationships=(), id='member-id-2')
+        self.assertFalse(self.listener_repo.get.called)
+        self.assertFalse(self.pool_repo.get.called)
+        self.assertEqual(2, self.amphora_health_repo.replace.call_count)
+
+        # A member that is no longer reported is dropped from the cache
+        del health['listeners']['listener-id-1']['pools']['pool-id-1'][
+            'members']['member-id-1']
+        self.hm.update_health(health)
+        self.assertIsNone(self.hm.status_cache.get(
+            (constants.MEMBER, 'member-id-1')))
+        stats = self.hm.status_cache.get_stats()
+        self.assertEqual(1, stats['invalidations'])
+
+        # Delta heartbeats leave out unchanged members, they are kept
+        self.hm.status_cache.set((constants.MEMBER, 'member-id-1'),
+                                 constants.ONLINE)
+        health['seq'] = 2
+        health['delta'] = 1
+        self.hm.update_health(health)
+        self.assertEqual(constants.ONLINE, self.hm.status_cache.get(
+            (constants.MEMBER, 'member-id-1')))
+
+        # The objects of an amphora that stopped reporting expire
+        self.assertIsNotNone(self.hm._reported_objects.get(self.FAKE_UUID_1))
+        with mock.patch('time.time', return_value=(
+                time.time() + self.hm._reported_objects.ttl + 1)):
+            self.assertIsNone(self.hm._reported_objects.get(
+                self.FAKE_UUID_1))
+        self.assertEqual(0, self.hm._reported_objects.get_stats()['size'])
+
+    @mock.patch('octavia.db.api.get_session')
+    def test_update_liveness_and_statuses(self, session):
+        health = {
+            "id": self.FAKE_UUID_1,
+            "listeners": {
+                "listener-id-1": {"status": constants.OPEN, "pools": {}}
+            }
+        }
+        session.return_value = 'blah'
+        self.amphora_repo.get_lb_and_listener_count.return_value = (
+            'lb-id-1', 1)
+
+        self.assertEqual('lb-id-1', self.hm.update_liveness(health))
+        self.amphora_health_repo.replace.assert_called_once_with(
+            'blah', self.FAKE_UUID_1, last_update=mock.ANY)
+        self.assertFalse(self.listener_repo.update.called)
+
+        self.hm.update_statuses(health, 'lb-id-1')
+        self.assertEqual(1, self.amphora_health_repo.replace.call_count)
+        self.listener_repo.update.assert_called_once_with(
+            'blah', 'listener-id-1', operating_status=constants.ONLINE)
+        self.loadbalancer_repo.update.assert_called_once_with(
+            'blah', 'lb-id-1', operating_status=constants.ONLINE)
+        self.event_client.cast.assert_any_call(
+            {}, 'update_info', container={
+                'info_type': 'loadbalancer', 'info_id': 'lb-id-1',
+                'info_payload': {'operating_status': 'ONLINE'}})
+
+    @mock.patch('octavia.db.api.get_session')
+    def test_update_health_listener_count(self, session):
+        health = {
+            "id": self.FAKE_UUID_1,
+            "listeners": {
+                "listener-id-1": {"status": constants.OPEN, "pools": {}}
+            }
+        }
+        session.return_value = 'blah'
+        count_mock = self.amphora_repo.get_lb_and_listener_count
+        count_mock.return_value = (self.FAKE_UUID_1, 1)
+
+        self.hm.update_health(health)
+        count_mock.assert_called_once_with('blah', self.FAKE_UUID_1)
+        self.assertEqual(1, self.amphora_health_repo.replace.call_count)
+        self.loadbalancer_repo.update.assert_called_with(
+            'blah', self.FAKE_UUID_1, operating_status=constants.ONLINE)
+
+        # A listener was created that the amphora has not picked up yet
+        count_mock.return_value = (self.FAKE_UUID_1, 2)
+        self.hm.update_health(health)
+        self.assertEqual(2, count_mock.call_count)
+        self.assertEqual(1, self.amphora_health_repo.replace.call_count)
+
+        # The amphora reports the new listener
+        health['listeners']['listener-id-2'] = {
+            "status": constants.OPEN, "pools": {}}
+        self.hm.update_health(health)
+        self.assertEqual(2, self.amphora_health_repo.replace.call_count)
+
+    @mock.patch('octavia.db.api.get_session')
+    def test_update_health_delta(self, session):
+        snapshot = {
+            "id": self.FAKE_UUID_1,
+            "seq": 1,
+            "listeners": {
+                "listener-id-1": {"status": constants.OPEN, "pools": {
+                    "pool-id-1": {"status": constants.UP,
+                                  "members": {"member-id-1": constants.UP}
+                                  }
+                }
+                }
+            }
+        }
+        delta = {
+            "id": self.FAKE_UUID_1,
+            "seq": 2,
+            "delta": 1,
+            "listeners": {
+                "listener-id-1": {"status": constants.OPEN, "pools": {
+                    "pool-id-1": {"status": constants.UP,
+                                  "members": {}
+                                  }
+                }
+                }
+            }
+        }
+
+        # The snapshot of a delta was missed
+        self.hm.update_health(delta)
+        self.assertEqual(set([self.FAKE_UUID_1]),
+                         self.hm.pop_snapshot_requests())
+        self.assertEqual(set(), self.hm.pop_snapshot_requests())
+        # The delta is still applied
+        self.assertEqual(1, self.amphora_health_repo.replace.call_count)
+        self.assertEqual(1, self.listener_repo.get.call_count)
+        self.assertFalse(self.member_repo.get.called)
+
+        # A snapshot and the deltas that refer to it
+        self.hm.update_health(snapshot)
+        self.hm.update_health(delta)
+        self.assertEqual(set(), self.hm.pop_snapshot_requests())
+
+        # A delta after an amphora restart refers to another snapshot
+        delta['seq'] = 5
+        delta['delta'] = 4
+        self.hm.update_health(delta)
+        requests = self.hm.pop_snapshot_requests()
+        self.assertEqual(set([self.FAKE_UUID_1]), requests)
+
+        # The popped requests are not changed by the update threads
+        self.hm.update_health(snapshot)
+        delta['seq'] = 6
+        other_amp = dict(delta, id=uuidutils.generate_uuid())
+        self.hm.update_health(other_amp)
+        self.assertEqual(set([self.FAKE_UUID_1]), requests)
+        self.assertEqual(set([other_amp['id']]),
+                         self.hm.pop_snapshot_requests())
+
 
 class TestUpdateStatsDb(base.TestCase):
 
@@ -503,3 +888,83 @@ class TestUpdateStatsDb(base.TestCase):
                     'total_connections': self.total_conns,
                     'active_connections': self.active_conns,
                     'bytes_out': self.bytes_out}})
+
+    @mock.patch('octavia.db.api.get_session')
+    def test_update_stats_batch(self, session):
+        listener_id_2 = uuidutils.generate_uuid()
+        stats = {"conns": self.active_conns, "totconns": self.total_conns,
+                 "rx": self.bytes_in, "tx": self.bytes_out}
+        health_1 = {"id": self.loadbalancer_id,
+                    "listeners": {self.listener_id: {"stats": stats}}}
+        health_2 = {"id": self.loadbalancer_id,
+                    "listeners": {listener_id_2: {"stats": stats}}}
+        mock_session = mock.MagicMock()
+        session.return_value = mock_session
+
+        self.sm.update_stats_batch([health_1, health_2])
+
+        session.assert_called_once_with()
+        mock_session.begin.assert_called_once_with(subtransactions=True)
+        for listener_id in (self.listener_id, listener_id_2):
+            self.listener_stats_repo.replace.assert_any_call(
+                mock_session, listener_id, self.loadbalancer_id,
+                bytes_in=self.bytes_in, bytes_out=self.bytes_out,
+                active_connections=self.active_conns,
+                total_connections=self.total_conns)
+        self.assertEqual(2, self.event_client.cast.call_count)
+
+    @mock.patch('time.time')
+    @mock.patch('octavia.db.api.get_session')
+    def test_update_stats_flush_interval(self, session, mock_time):
+        cfg.CONF.set_override(group='health_manager',
+                              name='stats_flush_interval', override=30)
+        self.addCleanup(cfg.CONF.clear_override, 'stats_flush_interval',
+                        group='health_manager')
+        mock_time.return_value = 100
+        self.sm = update_db.UpdateStatsDb()
+        self.sm.event_streamer.client = self.event_client
+        self.sm.listener_stats_repo = self.listener_stats_repo
+        mock_session = mock.MagicMock()
+        session.return_value = mock_session
+
+        def _health(totconns):
+            return {"id": self.loadbalancer_id,
+                    "listeners": {self.listener_id: {"stats": {
+                        "conns": self.active_conns, "totconns": totconns,
+                        "rx": self.bytes_in, "tx": self.bytes_out}}}}
+
+        # The stats are only gathered until the interval is over
+        self.sm.update_stats(_health(1))
+        mock_time.return_value = 110
+        self.sm.update_stats_batch([_health(2)])
+        self.assertFalse(session.called)
+        self.assertFalse(self.listener_stats_repo.replace.called)
+
+        # The latest stats of each listener are written in one transaction
+        mock_time.return_value = 130
+        self.sm.update_stats(_health(3))
+        mock_session.begin.assert_called_once_with(subtransactions=True)
+        self.listener_stats_repo.replace.assert_called_once_with(
+            mock_session, self.listener_id, self.loadbalancer_id,
+            bytes_in=self.bytes_in, bytes_out=self.bytes_out,
+            active_connections=self.active_conns, total_connections=3)
+        self.assertEqual(1, self.event_client.cast.call_count)
+
+        # Nothing left to write
+        self.listener_stats_repo.reset_mock()
+        self.sm.flush()
+        self.assertFalse(self.listener_stats_repo.replace.called)
+
+        # Stats left when no more heartbeats arrive are written by the
+        # periodic check once the interval is over
+        mock_time.return_value = 140
+        self.sm.update_stats(_health(4))
+        mock_time.return_value = 150
+        self.sm.flush_if_due()
+        self.assertFalse(self.listener_stats_repo.replace.called)
+        mock_time.return_value = 170
+        self.sm.flush_if_due()
+        self.listener_stats_repo.replace.assert_called_once_with(
+            mock_session, self.listener_id, self.loadbalancer_id,
+            bytes_in=self.bytes_in, bytes_out=self.bytes_out,
+            active_connections=self.active_conns, total_connections=4)
@@ -119,6 +119,13 @@ class TestEndpoint(base.TestCase):
         self.ep.worker.delete_member.assert_called_once_with(
             self.resource_id)
 
+    def test_batch_update_members(self):
+        updated_members = [{'id': '2', 'enabled': False}]
+        self.ep.batch_update_members(self.context, ['1'], updated_members,
+                                     ['3'])
+        self.ep.worker.batch_update_members.assert_called_once_with(
+            ['1'], updated_members, ['3'])
+
     def test_create_l7policy(self):
         self.ep.create_l7policy(self.context, self.resource_id)
         self.ep.worker.create_l7policy.assert_called_once_with(
@@ -13,6 +13,7 @@
 # under the License.
 #
 
+import mock
 from taskflow.patterns import linear_flow as flow
 
 from octavia.common import constants
@@ -64,3 +65,33 @@ class TestMemberFlows(base.TestCase):
 
         self.assertEqual(4, len(member_flow.requires))
         self.assertEqual(0, len(member_flow.provides))
+
+    def test_get_batch_update_members_flow(self):
+        new_member = mock.MagicMock(id='1')
+        updated_member = mock.MagicMock(id='2')
+        deleted_member = mock.MagicMock(id='3')
+
+        member_flow = self.MemberFlow.get_batch_update_members_flow(
+            [new_member], [(updated_member, {'weight': 2})],
+            [deleted_member])
+
+        self.assertIsInstance(member_flow, flow.Flow)
+
+        self.assertIn(constants.LISTENERS, member_flow.requires)
+        self.assertIn(constants.LOADBALANCER, member_flow.requires)
+
+        self.assertEqual(2, len(member_flow.requires))
+        self.assertEqual(2, len(member_flow.provides))
+
+    def test_get_batch_update_members_flow_no_new_members(self):
+        updated_member = mock.MagicMock(id='2')
+        deleted_member = mock.MagicMock(id='3')
+
+        member_flow = self.MemberFlow.get_batch_update_members_flow(
+            [], [(updated_member, {'weight': 2})], [deleted_member])
+
+        self.assertEqual(2, len(member_flow.requires))
+        self.assertEqual(0, len(member_flow.provides))
+        # Two tasks for each member, one update of the listeners and one
+        # status update
+        self.assertEqual(6, len(member_flow))
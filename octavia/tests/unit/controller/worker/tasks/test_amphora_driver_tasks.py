@@ -75,7 +75,8 @@ class TestAmphoraDriverTasks(base.TestCase):
         listener_update_obj = amphora_driver_tasks.ListenersUpdate()
         listener_update_obj.execute(_load_balancer_mock, [_listener_mock])
 
-        mock_driver.update.assert_called_once_with(_listener_mock, _vip_mock)
+        mock_driver.update_many.assert_called_once_with([_listener_mock],
+                                                        _vip_mock)
 
         # Test the revert
         amp = listener_update_obj.revert(_load_balancer_mock)
@@ -99,9 +100,7 @@ class TestAmphoraDriverTasks(base.TestCase):
         vip = data_models.Vip(ip_address='10.0.0.1')
         lb = data_models.LoadBalancer(id='lb1', listeners=listeners, vip=vip)
         listeners_update_obj.execute(lb, listeners)
-        mock_driver.update.assert_has_calls([mock.call(listeners[0], vip),
-                                             mock.call(listeners[1], vip)])
-        self.assertEqual(2, mock_driver.update.call_count)
+        mock_driver.update_many.assert_called_once_with(listeners, vip)
         self.assertIsNotNone(listeners[0].load_balancer)
         self.assertIsNotNone(listeners[1].load_balancer)
 
@@ -551,6 +551,7 @@ class TestControllerWorker(base.TestCase):
 
         mock_lb_repo_get.assert_called_once_with(
             'TEST',
+            profile='lb_full_tree',
             id=LB_ID)
 
         (base_taskflow.BaseTaskFlowEngine._taskflow_load.
@@ -589,6 +590,7 @@ class TestControllerWorker(base.TestCase):
 
         mock_lb_repo_get.assert_called_once_with(
             'TEST',
+            profile='lb_full_tree',
             id=LB_ID)
 
         (base_taskflow.BaseTaskFlowEngine._taskflow_load.
@@ -631,6 +633,7 @@ class TestControllerWorker(base.TestCase):
 
         mock_lb_repo_get.assert_called_once_with(
             'TEST',
+            profile='lb_full_tree',
             id=LB_ID)
 
         (base_taskflow.BaseTaskFlowEngine._taskflow_load.
@@ -741,6 +744,44 @@ class TestControllerWorker(base.TestCase):
 
         _flow_mock.run.assert_called_once_with()
 
+    @mock.patch('octavia.controller.worker.flows.'
+                'member_flows.MemberFlows.get_batch_update_members_flow',
+                return_value=_flow_mock)
+    def test_batch_update_members(self,
+                                  mock_get_batch_update_members_flow,
+                                  mock_api_get_session,
+                                  mock_dyn_log_listener,
+                                  mock_taskflow_load,
+                                  mock_pool_repo_get,
+                                  mock_member_repo_get,
+                                  mock_l7rule_repo_get,
+                                  mock_l7policy_repo_get,
+                                  mock_listener_repo_get,
+                                  mock_lb_repo_get,
+                                  mock_health_mon_repo_get,
+                                  mock_amp_repo_get):
+
+        _flow_mock.reset_mock()
+        members = [mock.MagicMock(id=str(i)) for i in range(3)]
+        _pool_mock.members = members
+        self.addCleanup(delattr, _pool_mock, 'members')
+
+        cw = controller_worker.ControllerWorker()
+        cw.batch_update_members(['0'], [{'id': '1', 'weight': 2}], ['2'])
+
+        mock_member_repo_get.assert_called_once_with(
+            'TEST', relationships=(), id='0')
+        mock_get_batch_update_members_flow.assert_called_once_with(
+            [members[0]], [(members[1], {'weight': 2})], [members[2]])
+        (base_taskflow.BaseTaskFlowEngine._taskflow_load.
+            assert_called_once_with(_flow_mock,
+                                    store={constants.LISTENERS:
+                                           [_listener_mock],
+                                           constants.LOADBALANCER:
+                                               _load_balancer_mock}))
+
+        _flow_mock.run.assert_called_once_with()
+
     @mock.patch('octavia.controller.worker.flows.'
                 'pool_flows.PoolFlows.get_create_pool_flow',
                 return_value=_flow_mock)
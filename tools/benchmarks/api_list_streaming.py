@@ -0,0 +1,142 @@
+# Copyright 2016 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Compares built and streamed member list responses of the API.
+
+The members of a pool are created in an in-memory SQLite database and
+listed through the pecan test app, once with list_stream_batch_size set to
+0, which builds the complete response in memory, and once with streaming.
+Each case runs in its own process so that its peak RSS can be reported,
+along with the time to the first byte of the body and the total time.
+
+Usage: python tools/benchmarks/api_list_streaming.py [--members 100000]
+"""
+
+from __future__ import print_function
+
+import argparse
+import resource
+import subprocess
+import sys
+import time
+import uuid
+
+from oslo_config import cfg
+from oslo_db import options as db_options
+import pecan.testing
+import webob
+
+from octavia.api import config as pconfig
+from octavia.common import constants
+from octavia.db import api as db_api
+from octavia.db import base_models
+from octavia.db import models
+
+INSERT_BATCH = 5000
+
+
+def create_members(session, member_count):
+    for name in constants.SUPPORTED_PROVISIONING_STATUSES:
+        session.add(models.ProvisioningStatus(name=name))
+    for name in constants.SUPPORTED_OPERATING_STATUSES:
+        session.add(models.OperatingStatus(name=name))
+    for name in constants.SUPPORTED_PROTOCOLS:
+        session.add(models.Protocol(name=name))
+    for name in constants.SUPPORTED_LB_ALGORITHMS:
+        session.add(models.Algorithm(name=name))
+    session.flush()
+    lb_id = str(uuid.uuid4())
+    pool_id = str(uuid.uuid4())
+    session.add(models.LoadBalancer(id=lb_id,
+                                    provisioning_status=constants.ACTIVE,
+                                    operating_status=constants.ONLINE,
+                                    enabled=True))
+    session.flush()
+    session.add(models.Pool(id=pool_id, load_balancer_id=lb_id,
+                            protocol=constants.PROTOCOL_HTTP,
+                            lb_algorithm=constants.LB_ALGORITHM_ROUND_ROBIN,
+                            operating_status=constants.ONLINE, enabled=True))
+    session.flush()
+    for start in range(0, member_count, INSERT_BATCH):
+        session.execute(models.Member.__table__.insert(), [
+            {'id': str(uuid.uuid4()), 'pool_id': pool_id,
+             'subnet_id': str(uuid.uuid4()),
+             'ip_address': '10.%d.%d.%d' % (i // 65536, i // 256 % 256,
+                                            i % 256),
+             'protocol_port': 80, 'weight': 1,
+             'operating_status': constants.ONLINE, 'enabled': True}
+            for i in range(start, min(start + INSERT_BATCH, member_count))])
+    return lb_id, pool_id
+
+
+def max_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_case(member_count, batch_size):
+    app = pecan.testing.load_test_app({'app': pconfig.app,
+                                       'wsme': pconfig.wsme}).app
+    cfg.CONF.register_opts(db_options.database_opts, 'database')
+    cfg.CONF.set_override('connection', 'sqlite://', group='database')
+    cfg.CONF.set_override('list_stream_batch_size', batch_size)
+    cfg.CONF.set_override('api_handler', 'simulated_handler')
+    base_models.BASE.metadata.create_all(db_api.get_engine())
+    session = db_api.get_session()
+    with session.begin():
+        lb_id, pool_id = create_members(session, member_count)
+    request = webob.Request.blank(
+        '/v1/loadbalancers/%s/pools/%s/members' % (lb_id, pool_id))
+    base_rss = max_rss_mb()
+
+    def start_response(status, headers, exc_info=None):
+        assert status.startswith('200'), status
+
+    start = time.time()
+    body = app(request.environ, start_response)
+    first_byte = None
+    size = 0
+    for chunk in body:
+        if chunk and first_byte is None:
+            first_byte = time.time() - start
+        size += len(chunk)
+    total = time.time() - start
+    return base_rss, max_rss_mb(), first_byte, total, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help='Run a single case in this process')
+    args = parser.parse_args()
+    if args.batch_size is not None:
+        print(' '.join(str(value) for value in run_case(
+            args.members, args.batch_size)))
+        return
+
+    print('%-9s %12s %12s %10s %10s %8s' % (
+        '', 'base RSS MB', 'peak RSS MB', 'TTFB s', 'total s', 'body MB'))
+    for name, batch_size in (('built', 0), ('streamed', 500)):
+        output = subprocess.check_output(
+            [sys.executable, __file__, '--members', str(args.members),
+             '--batch-size', str(batch_size)])
+        base_rss, peak_rss, first_byte, total, size = (
+            float(value) for value in output.split()[-5:])
+        print('%-9s %12.1f %12.1f %10.2f %10.2f %8.1f' % (
+            name, base_rss, peak_rss, first_byte, total, size / 1048576.0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+# Copyright 2016 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Compares the complete and shallow data model conversions.
+
+A load balancer with one listener, one pool and many members is created in
+an in-memory SQLite database, then single members and the load balancer
+are fetched through the repositories with both conversions. The session is
+cleared before each fetch so the relationships are loaded from the
+database every time. The last line is the time to convert the loaded
+graph of the load balancer, without any database access.
+
+Usage: python tools/benchmarks/data_model_conversion.py [--members 1000]
+"""
+
+from __future__ import print_function
+
+import argparse
+import time
+import uuid
+
+from oslo_config import cfg
+from oslo_db import options as db_options
+
+from octavia.common import constants
+from octavia.db import api as db_api
+from octavia.db import base_models
+from octavia.db import models
+from octavia.db import repositories
+
+LOOKUP_TABLES = (
+    (constants.SUPPORTED_PROVISIONING_STATUSES, models.ProvisioningStatus),
+    (constants.SUPPORTED_OPERATING_STATUSES, models.OperatingStatus),
+    (constants.SUPPORTED_PROTOCOLS, models.Protocol),
+    (constants.SUPPORTED_LB_ALGORITHMS, models.Algorithm),
+)
+
+
+def create_lb(session, repos, member_count):
+    for names, model_class in LOOKUP_TABLES:
+        for name in names:
+            session.add(model_class(name=name))
+    lb_id = str(uuid.uuid4())
+    # Pools and members have no provisioning status
+    common = {'project_id': str(uuid.uuid4()),
+              'operating_status': constants.ONLINE,
+              'enabled': True}
+    repos.load_balancer.create(session, id=lb_id,
+                               provisioning_status=constants.ACTIVE,
+                               **common)
+    repos.vip.create(session, load_balancer_id=lb_id, ip_address='10.0.0.1')
+    pool_id = str(uuid.uuid4())
+    repos.pool.create(session, id=pool_id, load_balancer_id=lb_id,
+                      protocol=constants.PROTOCOL_HTTP,
+                      lb_algorithm=constants.LB_ALGORITHM_ROUND_ROBIN,
+                      **common)
+    repos.listener.create(session, id=str(uuid.uuid4()),
+                          load_balancer_id=lb_id, default_pool_id=pool_id,
+                          protocol=constants.PROTOCOL_HTTP, protocol_port=80,
+                          provisioning_status=constants.ACTIVE, **common)
+    member_ids = []
+    with session.begin(subtransactions=True):
+        for i in range(member_count):
+            member_id = str(uuid.uuid4())
+            session.add(models.Member(
+                id=member_id, pool_id=pool_id,
+                ip_address='10.1.%d.%d' % (i // 250, i % 250),
+                protocol_port=80, weight=1, **common))
+            member_ids.append(member_id)
+    return lb_id, member_ids
+
+
+def timed(session, iterations, fetch):
+    start = time.time()
+    for i in range(iterations):
+        session.expunge_all()
+        fetch(i)
+    return (time.time() - start) / iterations
+
+
+def conversion_time(session, lb_id, iterations):
+    """Time the conversion of an object graph that is already loaded"""
+    session.expunge_all()
+    lb = session.query(models.LoadBalancer).filter_by(id=lb_id).one()
+    lb.to_data_model()
+    start = time.time()
+    for i in range(iterations):
+        lb.to_data_model()
+    return (time.time() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=1000)
+    parser.add_argument('--iterations', type=int, default=20)
+    args = parser.parse_args()
+    cfg.CONF([], project='octavia')
+    cfg.CONF.register_opts(db_options.database_opts, 'database')
+    cfg.CONF.set_override('connection', 'sqlite://', group='database')
+    base_models.BASE.metadata.create_all(db_api.get_engine())
+    session = db_api.get_session()
+    repos = repositories.Repositories()
+    lb_id, member_ids = create_lb(session, repos, args.members)
+
+    cases = (
+        ('member get', repos.member,
+         lambda i: {'id': member_ids[i % len(member_ids)]}, ()),
+        ('lb get', repos.load_balancer, lambda i: {'id': lb_id}, ('vip',)),
+    )
+    print('%-12s %12s %12s %8s' % ('', 'complete ms', 'shallow ms',
+                                   'speedup'))
+    for name, repo, filters, shallow in cases:
+        complete_time = timed(
+            session, args.iterations,
+            lambda i: repo.get(session, **filters(i)))
+        shallow_time = timed(
+            session, args.iterations,
+            lambda i: repo.get(session, relationships=shallow, **filters(i)))
+        print('%-12s %12.2f %12.2f %7.1fx' % (
+            name, complete_time * 1000, shallow_time * 1000,
+            complete_time / shallow_time))
+    print('%-12s %12.2f' % ('lb convert', conversion_time(
+        session, lb_id, args.iterations) * 1000))
+
+
+if __name__ == '__main__':
+    main()
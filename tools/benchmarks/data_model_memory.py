@@ -0,0 +1,111 @@
+# Copyright 2016 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Compares the memory used by regular and compact member data models.
+
+The members of a pool are created in an in-memory SQLite database and
+listed through MemberRepository.get_all, once as regular data models
+converted without their relationships and once as compact data models.
+The memory still held by the returned list and the peak memory of the call
+are measured with tracemalloc, so this needs Python 3.
+
+Usage: python tools/benchmarks/data_model_memory.py [--members 100000]
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import time
+import tracemalloc
+import uuid
+
+from oslo_config import cfg
+from oslo_db import options as db_options
+
+from octavia.common import constants
+from octavia.db import api as db_api
+from octavia.db import base_models
+from octavia.db import models
+from octavia.db import repositories
+
+
+def create_members(session, member_count):
+    for name in constants.SUPPORTED_OPERATING_STATUSES:
+        session.add(models.OperatingStatus(name=name))
+    for name in constants.SUPPORTED_PROTOCOLS:
+        session.add(models.Protocol(name=name))
+    for name in constants.SUPPORTED_LB_ALGORITHMS:
+        session.add(models.Algorithm(name=name))
+    session.flush()
+    pool_id = str(uuid.uuid4())
+    project_id = str(uuid.uuid4())
+    session.add(models.Pool(id=pool_id, project_id=project_id,
+                            protocol=constants.PROTOCOL_HTTP,
+                            lb_algorithm=constants.LB_ALGORITHM_ROUND_ROBIN,
+                            operating_status=constants.ONLINE, enabled=True))
+    session.flush()
+    session.execute(models.Member.__table__.insert(), [
+        {'id': str(uuid.uuid4()), 'project_id': project_id,
+         'pool_id': pool_id, 'subnet_id': str(uuid.uuid4()),
+         'ip_address': '10.%d.%d.%d' % (i // 65536, i // 256 % 256, i % 256),
+         'protocol_port': 80, 'weight': 1,
+         'operating_status': constants.ONLINE, 'enabled': True}
+        for i in range(member_count)])
+    return pool_id
+
+
+def measure(session, get_all):
+    session.expunge_all()
+    gc.collect()
+    tracemalloc.start()
+    start = time.time()
+    members = get_all()
+    elapsed = time.time() - start
+    session.expunge_all()
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(members), retained, peak, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--members', type=int, default=100000)
+    args = parser.parse_args()
+    cfg.CONF([], project='octavia')
+    cfg.CONF.register_opts(db_options.database_opts, 'database')
+    cfg.CONF.set_override('connection', 'sqlite://', group='database')
+    base_models.BASE.metadata.create_all(db_api.get_engine())
+    session = db_api.get_session()
+    member_repo = repositories.MemberRepository()
+    with session.begin():
+        pool_id = create_members(session, args.members)
+
+    cases = (
+        ('regular', lambda: member_repo.get_all(
+            session, relationships=(), pool_id=pool_id)),
+        ('compact', lambda: member_repo.get_all(
+            session, compact=True, pool_id=pool_id)),
+    )
+    print('%-8s %8s %12s %12s %10s' % ('', 'members', 'retained MB',
+                                       'peak MB', 'seconds'))
+    for name, get_all in cases:
+        count, retained, peak, elapsed = measure(session, get_all)
+        print('%-8s %8d %12.1f %12.1f %10.2f' % (
+            name, count, retained / 1048576.0, peak / 1048576.0, elapsed))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+# Copyright 2016 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Compares the JSON and binary heartbeat formats.
+
+Reports the encode and decode time and the packet size of both formats
+for heartbeats with a growing number of members.
+
+Usage: python tools/benchmarks/heartbeat_encoding.py [--iterations 200]
+"""
+
+from __future__ import print_function
+
+import argparse
+import timeit
+import uuid
+
+from octavia.amphorae.backends.health_daemon import status_message
+
+KEY = 'benchmark'
+MEMBER_COUNTS = (1, 10, 100, 500, 1000)
+
+
+def build_heartbeat(members):
+    return {'id': str(uuid.uuid4()), 'seq': 123456, 'listeners': {
+        str(uuid.uuid4()): {
+            'status': 'OPEN',
+            'stats': {'conns': 1500, 'totconns': 98765432,
+                      'rx': 1234567890, 'tx': 9876543210},
+            'pools': {str(uuid.uuid4()): {
+                'status': 'UP',
+                'members': dict((str(uuid.uuid4()), 'UP')
+                                for i in range(members))}}}}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    print('%8s %8s %10s %12s %12s' % ('members', 'format', 'bytes',
+                                      'encode (us)', 'decode (us)'))
+    for members in MEMBER_COUNTS:
+        health = build_heartbeat(members)
+        for name, version in (('json', status_message.JSON_VERSION),
+                              ('binary', status_message.BINARY_VERSION)):
+            envelope = status_message.wrap_envelope(health, KEY, version)
+            encode = timeit.timeit(
+                lambda: status_message.wrap_envelope(health, KEY, version),
+                number=args.iterations)
+            decode = timeit.timeit(
+                lambda: status_message.unwrap_envelope(envelope, KEY),
+                number=args.iterations)
+            print('%8d %8s %10d %12.1f %12.1f' % (
+                members, name, len(envelope),
+                encode * 1e6 / args.iterations,
+                decode * 1e6 / args.iterations))
+
+
+if __name__ == '__main__':
+    main()
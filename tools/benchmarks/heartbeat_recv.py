@@ -0,0 +1,101 @@
+# Copyright 2016 Hewlett-Packard Development Company, L.P.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Compares the heartbeat receive rate of the one-by-one and batch modes.
+
+A flood generator process sends heartbeats of a given size to a local UDP
+port as fast as it can, while UDPStatusGetter receives, verifies and
+decodes them without writing anything to the database.
+
+Usage: python tools/benchmarks/heartbeat_recv.py [--seconds 5] [--members 50]
+"""
+
+from __future__ import print_function
+
+import argparse
+import multiprocessing
+import socket
+import time
+import uuid
+
+from oslo_config import cfg
+
+from octavia.amphorae.backends.health_daemon import status_message
+from octavia.amphorae.drivers.health import heartbeat_udp
+
+KEY = 'benchmark'
+IP = '127.0.0.1'
+
+
+def build_heartbeat(members):
+    return {'id': str(uuid.uuid4()), 'seq': 1, 'listeners': {
+        str(uuid.uuid4()): {
+            'status': 'OPEN',
+            'stats': {'conns': 0, 'totconns': 0, 'rx': 0, 'tx': 0},
+            'pools': {str(uuid.uuid4()): {
+                'status': 'UP',
+                'members': dict((str(uuid.uuid4()), 'UP')
+                                for i in range(members))}}}}}
+
+
+def flood(port, members, stop):
+    envelope = status_message.wrap_envelope(build_heartbeat(members), KEY)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    while not stop.is_set():
+        for i in range(100):
+            sock.sendto(envelope, (IP, port))
+
+
+def run(mode, batch_size, seconds, members, port):
+    cfg.CONF.set_override('heartbeat_key', KEY, group='health_manager')
+    cfg.CONF.set_override('bind_ip', IP, group='health_manager')
+    cfg.CONF.set_override('bind_port', port, group='health_manager')
+    cfg.CONF.set_override('sock_rlimit', 8 * 1024 * 1024,
+                          group='health_manager')
+    cfg.CONF.set_override('heartbeat_recv_batch_size', batch_size,
+                          group='health_manager')
+    getter = heartbeat_udp.UDPStatusGetter(None, None)
+    getter.sock.settimeout(1)
+
+    stop = multiprocessing.Event()
+    sender = multiprocessing.Process(target=flood,
+                                     args=(port, members, stop))
+    sender.start()
+    try:
+        start = time.time()
+        while time.time() - start < seconds:
+            getter.check()
+        elapsed = time.time() - start
+    finally:
+        stop.set()
+        sender.join()
+        getter.sock.close()
+        getter.executor.shutdown()
+    print('%-8s %10.0f packets/s' % (mode, getter.packets_received / elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--members', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--port', type=int, default=15555)
+    args = parser.parse_args()
+    cfg.CONF([], project='octavia')
+    run('single', 0, args.seconds, args.members, args.port)
+    run('batch', args.batch_size, args.seconds, args.members, args.port + 1)
+
+
+if __name__ == '__main__':
+    main()